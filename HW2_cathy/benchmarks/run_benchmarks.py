@@ -0,0 +1,361 @@
+"""Time and memory-profile every pipeline stage on synthetic data, and compare with a baseline.
+
+Run from the directory of `pipeline.py`:
+
+    python -m benchmarks.run_benchmarks --rows 10000 100000 1000000
+    python -m benchmarks.run_benchmarks --rows 10000 100000 --save-baseline
+    python -m benchmarks.run_benchmarks --rows 10000 100000 \
+        --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+import sklearn
+import yaml
+from sklearn.metrics import accuracy_score, roc_auc_score
+
+import src.analysis as eda
+import src.aws_utils as aws
+import src.create_dataset as cd
+import src.evaluate_performance as ep
+import src.generate_features as gf
+import src.score_model as sm
+import src.train_model as tm
+from src.flat_forest import FlatForest
+from benchmarks.synthetic import generate_clouds
+from src.profiling import MB, _peak_rss, _reset_peak_rss
+from tests.fake_s3 import FakeS3Client
+
+logger = logging.getLogger("clouds")
+
+STAGES = [
+    "create_dataset", "generate_features", "save_figures", "train_model",
+    "load_model", "score_model", "flat_forest", "low_memory",
+    "evaluate_performance", "upload_artifacts",
+]
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def measure(fn: Callable[[], object], repeat: int) -> tuple[dict, object]:
+    """Time a call `repeat` times, then trace the memory of one more call.
+
+    Allocations are only traced in the last call, so that tracing does not
+    slow down the timed ones.
+
+    Args:
+        fn (Callable[[], object]): Stage call, without arguments.
+        repeat (int): Number of timed calls.
+
+    Returns:
+        tuple[dict, object]: Statistics of the calls and the result of the last one.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+        del result
+    gc.collect()
+    rss_reset = _reset_peak_rss()
+    rss_before = _peak_rss()
+    tracemalloc.start()
+    try:
+        result = fn()
+        traced_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    stats = {
+        "repeat": repeat,
+        "seconds_min": round(min(times), 6),
+        "seconds_median": round(statistics.median(times), 6),
+        "tracemalloc_peak_mb": round(traced_peak / MB, 3),
+        # Only the growth of the peak RSS is attributable to the stage when the peak can be reset
+        "peak_rss_mb": round(_peak_rss() - (0 if rss_reset else rss_before), 3),
+    }
+    return stats, result
+
+
+def latency(fn: Callable[[object], object], rows: list, repeat: int) -> float:
+    """Median seconds of `fn` over single rows, the best of `repeat` passes."""
+    best = []
+    for row in rows:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(row)
+            times.append(time.perf_counter() - start)
+        best.append(min(times))
+    return statistics.median(best)
+
+
+def compare_predictors(
+    model: object, forest: FlatForest, x: pd.DataFrame, repeat: int, n_rows: int = 100
+) -> dict:
+    """Per-row latency and batch throughput of a forest and of its flattened arrays.
+
+    Args:
+        model (object): Fitted forest.
+        forest (FlatForest): The forest, flattened.
+        x (pd.DataFrame): Rows to score, with the features of the model.
+        repeat (int): Timed calls of every measure.
+        n_rows (int): Rows whose single-row latency is measured.
+
+    Returns:
+        dict: Latencies in microseconds and throughputs in rows per second.
+    """
+    frames = [x.iloc[[i]] for i in range(min(n_rows, len(x)))]
+    rows = [frame.to_numpy()[0] for frame in frames]
+    values = x.to_numpy()
+    sklearn_batch, _ = measure(lambda: model.predict_proba(x), repeat)
+    flat_batch, _ = measure(lambda: forest.predict_proba(values), repeat)
+    return {
+        "sklearn_row_us": round(latency(model.predict_proba, frames, repeat) * 1e6, 2),
+        "flat_row_us": round(latency(forest.predict_row, rows, repeat) * 1e6, 2),
+        "sklearn_rows_per_s": round(len(x) / max(sklearn_batch["seconds_min"], 1e-9)),
+        "flat_rows_per_s": round(len(x) / max(flat_batch["seconds_min"], 1e-9)),
+    }
+
+
+def compare_low_memory(raw: Path, config: dict, repeat: int) -> dict:
+    """Memory peaks and metrics of the stages up to scoring, in the default and low-memory modes.
+
+    Args:
+        raw (Path): Synthetic clouds file.
+        config (dict): Configuration of the benchmarked stages.
+        repeat (int): Timed runs of every mode.
+
+    Returns:
+        dict: Statistics of the low-memory mode, with the peaks of the default mode
+            and the metric differences.
+    """
+    def stages(low_memory: bool) -> tuple[float, float]:
+        dataset_config = {**config["create_dataset"], "low_memory": low_memory}
+        train_config = {**config["train_model"], "low_memory": low_memory}
+        data = cd.create_dataset(raw, dataset_config)
+        features = gf.generate_features(data, config["generate_features"])
+        del data
+        model, _, test = tm.train_model(features, train_config)
+        del features
+        proba, classes = sm.predict(model, test[config["score_model"]["initial_features"]])
+        target = test[train_config["target"]]
+        return roc_auc_score(target, proba), accuracy_score(target, classes)
+
+    default, (default_auc, default_accuracy) = measure(lambda: stages(False), repeat)
+    low_memory, (auc, accuracy) = measure(lambda: stages(True), repeat)
+    return {
+        **low_memory,
+        "default_seconds_min": default["seconds_min"],
+        "default_tracemalloc_peak_mb": default["tracemalloc_peak_mb"],
+        "default_peak_rss_mb": default["peak_rss_mb"],
+        "peak_ratio": round(
+            low_memory["tracemalloc_peak_mb"] / max(default["tracemalloc_peak_mb"], 1e-3), 3
+        ),
+        "roc_auc_delta": round(auc - default_auc, 6),
+        "accuracy_delta": round(accuracy - default_accuracy, 6),
+    }
+
+
+def bench_config(config_path: Path, data_prep: dict) -> dict:
+    """Configuration of the benchmarked stages, without any cache."""
+    with open(config_path) as file:
+        config = yaml.safe_load(file)
+    config["create_dataset"]["data_prep"] = data_prep
+    config.setdefault("eda", {}).setdefault("render", {})["cache_dir"] = None
+    config["aws"].update(bucket_name="bucket", prefix="benchmark")
+    return config
+
+
+def run_size(n_rows: int, config_path: Path, stages: list, repeat: int, work_dir: Path) -> dict:
+    """Benchmark every stage on a synthetic file of `n_rows` rows.
+
+    Each stage is run on the output of the previous one, as in the pipeline.
+
+    Returns:
+        dict: Statistics of every stage, by stage name.
+    """
+    raw = work_dir / f"clouds_{n_rows}.data"
+    start = time.perf_counter()
+    data_prep = generate_clouds(raw, n_rows)
+    logger.info("Generated %d rows in %.2fs", n_rows, time.perf_counter() - start)
+    config = bench_config(config_path, data_prep)
+    run_dir = work_dir / f"run_{n_rows}"
+    (run_dir / "figures").mkdir(parents=True, exist_ok=True)
+    (run_dir / "model").mkdir(exist_ok=True)
+
+    results = {}
+
+    def run(stage: str, fn: Callable[[], object], n: Optional[int] = None):
+        # Stages that are not selected are run once, to feed the next ones
+        if stage not in stages:
+            return fn()
+        stats, result = measure(fn, repeat)
+        results[stage] = {"rows": n_rows if n is None else n, **stats}
+        logger.info(
+            "%s on %d rows: %.3fs, %.1f MB traced",
+            stage, n_rows, stats["seconds_min"], stats["tracemalloc_peak_mb"],
+        )
+        return result
+
+    data = run("create_dataset", lambda: cd.create_dataset(raw, config["create_dataset"]))
+    cd.save_dataset(
+        data, run_dir / "clouds", config["create_dataset"].get("artifact_format", "csv")
+    )
+    features = run(
+        "generate_features", lambda: gf.generate_features(data, config["generate_features"])
+    )
+    del data
+    run("save_figures", lambda: eda.save_figures(features, run_dir / "figures", config))
+    model, train, test = run("train_model", lambda: tm.train_model(features, config["train_model"]))
+    model_path = run_dir / "model" / "trained_model_object.pkl"
+    saved = tm.save_model(model, model_path, config["train_model"].get("serialization"))
+    # The cold start of a scoring process, with the size of the binary it loads
+    run("load_model", lambda: sm.load_model(model_path))
+    if "load_model" in results:
+        results["load_model"]["artifact_bytes"] = saved["bytes"]
+    del features, train
+    scores = run(
+        "score_model", lambda: sm.score_model(test, model, config["score_model"]), len(test)
+    )
+    if "flat_forest" in stages:
+        # Flattening, and the latency and throughput of its predictors against the ones of sklearn
+        forest = run("flat_forest", lambda: FlatForest.from_model(model), len(test))
+        x_test = test[config["score_model"]["initial_features"]]
+        results["flat_forest"].update(compare_predictors(model, forest, x_test, repeat))
+    if "low_memory" in stages:
+        # Both modes end to end, from the raw file to the scores of the test rows
+        results["low_memory"] = {"rows": n_rows, **compare_low_memory(raw, config, repeat)}
+        logger.info(
+            "low_memory on %d rows: %.1f MB traced instead of %.1f MB", n_rows,
+            results["low_memory"]["tracemalloc_peak_mb"],
+            results["low_memory"]["default_tracemalloc_peak_mb"],
+        )
+    sm.save_scores(scores, run_dir / "scores", config["score_model"].get("artifact_format", "csv"))
+    run(
+        "evaluate_performance",
+        lambda: ep.evaluate_performance(test, scores, config["evaluate_performance"]),
+        len(test),
+    )
+
+    def upload():
+        # A new bucket every call, so every file is uploaded
+        client = FakeS3Client(tempfile.mkdtemp(dir=work_dir))
+        return aws.upload_artifacts(run_dir, config["aws"], client)
+
+    run("upload_artifacts", upload)
+    return results
+
+
+def environment() -> dict:
+    """Versions and machine the benchmarks ran on, stored with the results."""
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Compare the results of a run with a baseline run.
+
+    Args:
+        results (dict): Results of the run.
+        baseline (dict): Results of the baseline run.
+        threshold (float): Relative increase of time or traced memory counted as a regression.
+
+    Returns:
+        list[dict]: Comparison of every stage and size present in both runs.
+    """
+    rows = []
+    for key, stats in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(key)
+        if base is None:
+            continue
+        time_ratio = stats["seconds_min"] / max(base["seconds_min"], 1e-9)
+        memory_ratio = stats["tracemalloc_peak_mb"] / max(base["tracemalloc_peak_mb"], 1e-3)
+        rows.append({
+            "benchmark": key,
+            "seconds": stats["seconds_min"],
+            "baseline_seconds": base["seconds_min"],
+            "time_ratio": round(time_ratio, 3),
+            "memory_ratio": round(memory_ratio, 3),
+            "regression": time_ratio > 1 + threshold or memory_ratio > 1 + threshold,
+        })
+    return rows
+
+
+def main(args) -> int:
+    stages = args.stages or STAGES
+    unknown = sorted(set(stages) - set(STAGES))
+    if unknown:
+        raise SystemExit(f"Unknown stages {unknown}, expected some of {STAGES}")
+
+    results = {"environment": environment(), "benchmarks": {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for n_rows in args.rows:
+            measured = run_size(n_rows, Path(args.config), stages, args.repeat, Path(work_dir))
+            for stage, stats in measured.items():
+                results["benchmarks"][f"{stage}@{n_rows}"] = stats
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(pd.DataFrame.from_dict(results["benchmarks"], orient="index").to_string())
+    print(f"Results saved to {output}")
+    if args.save_baseline:
+        (RESULTS_DIR / "baseline.json").write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {RESULTS_DIR / 'baseline.json'}")
+
+    if args.baseline:
+        rows = compare(results, json.loads(Path(args.baseline).read_text()), args.threshold)
+        if rows:
+            print(pd.DataFrame(rows).set_index("benchmark").to_string())
+        regressions = [row["benchmark"] for row in rows if row["regression"]]
+        if regressions:
+            print(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data.")
+    parser.add_argument(
+        "--config", default="config/config.yaml", help="Base configuration of the stages"
+    )
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000], help="Rows of the synthetic files"
+    )
+    parser.add_argument(
+        "--stages", nargs="+", help=f"Stages to measure, among {STAGES} (default: all)"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Timed calls of every stage")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--baseline", help="Results file to compare with")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="Relative slowdown reported as a regression"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Also save the results as the baseline"
+    )
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,70 @@
+"""Synthetic `clouds.data` files of any size, for the benchmarks."""
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+COLUMNS = [
+    "visible_mean", "visible_max", "visible_min", "visible_mean_distribution", "visible_contrast",
+    "visible_entropy", "visible_second_angular_momentum", "IR_mean", "IR_max", "IR_min",
+]
+
+# Mean and standard deviation of every column in each cloud of the real data
+CLOUD_STATS = {
+    "first_cloud": (
+        [6.367, 127.544, 40.536, 0.057, 538.815, 0.123, 3.139, 186.080, 243.143, 223.390],
+        [7.181, 60.036, 30.852, 0.035, 474.420, 0.197, 1.014, 33.343, 8.593, 21.617],
+    ),
+    "second_cloud": (
+        [27.272, 90.946, 51.202, 4.549, 61.052, 0.205, 2.220, -41.866, 0.887, -19.995],
+        [27.536, 28.893, 28.443, 3.186, 65.950, 0.195, 0.802, 47.181, 47.132, 48.662],
+    ),
+}
+
+BANNER = ";" * 76
+
+
+def _write_rows(file, cloud: str, n_rows: int, rng: np.random.Generator, chunk_rows: int) -> None:
+    means, stds = (np.array(values) for values in CLOUD_STATS[cloud])
+    for start in range(0, n_rows, chunk_rows):
+        n = min(chunk_rows, n_rows - start)
+        values = rng.normal(means, stds, size=(n, len(COLUMNS)))
+        # Columns the features take the log of, or divide by, stay positive
+        values[:, [3, 4, 5, 6]] = np.abs(values[:, [3, 4, 5, 6]]) + 1e-4
+        # Rounded values are written in their shortest form, at most 4 decimals
+        table = pa.table({column: np.round(values[:, i], 4) for i, column in enumerate(COLUMNS)})
+        pa_csv.write_csv(table, file, pa_csv.WriteOptions(include_header=False, delimiter=" "))
+
+
+def generate_clouds(path: Path, n_rows: int, seed: int = 423, chunk_rows: int = 1_000_000) -> dict:
+    """Write a file laid out like `clouds.data`, with `n_rows` rows split between both clouds.
+
+    Rows are drawn from a normal distribution per cloud and column, with the
+    moments of the real data, and written `chunk_rows` at a time by the Arrow
+    CSV writer, so files of 10^8 rows are generated quickly in bounded memory.
+
+    Args:
+        path (Path): File to write.
+        n_rows (int): Total number of rows of both clouds.
+        seed (int): Seed of the random generator.
+        chunk_rows (int): Rows generated and written at once.
+
+    Returns:
+        dict: `create_dataset.data_prep` section locating both clouds in the file.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = {"first_cloud": n_rows // 2, "second_cloud": n_rows - n_rows // 2}
+    data_prep = {}
+    line = 0
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as file:
+        for number, (cloud, size) in enumerate(sizes.items(), start=1):
+            file.write(f"\n{BANNER}\n;;; CLOUD COVER DB #{number}\n{BANNER}\n\n".encode())
+            line += 5
+            _write_rows(file, cloud, size, rng, chunk_rows)
+            data_prep[cloud] = {"left": line, "right": line + size}
+            line += size
+        file.write(f"{BANNER}\n;;; END OF DBS\n{BANNER}\n".encode())
+    return data_prep
@@ -0,0 +1,65 @@
+import argparse
+import logging.config
+import pandas as pd
+import yaml
+
+from src.blob_store import create_store
+from src.run_catalog import RunCatalog
+
+logging.config.fileConfig("config/logging/local.conf", disable_existing_loggers=False)
+logger = logging.getLogger("clouds")
+
+
+def main(args):
+    """ Query the catalog of the runs of the pipeline. """
+    with open(args.config, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    runs_dir = config["run_config"]["output"]["runs"]
+
+    with RunCatalog(config.get("run_catalog", {}).get("path", ".cache/catalog.sqlite")) as catalog:
+        if args.command == "index":
+            print(f"Recorded {len(catalog.index(runs_dir))} runs of {runs_dir}")
+        elif args.command == "list":
+            runs = catalog.list_runs(args.model_type, args.days, args.limit)
+            print(pd.DataFrame(runs).to_string(index=False) if runs else "No runs")
+        elif args.command == "best":
+            best = catalog.best(args.metric, args.model_type, args.days, args.lowest)
+            print(pd.Series(best).to_string() if best else f"No run with {args.metric}")
+        elif args.command == "diff":
+            for section, changes in catalog.diff(args.run_a, args.run_b).items():
+                if changes:
+                    table = pd.DataFrame.from_dict(changes, orient="index", columns=[args.run_a, args.run_b])
+                    print(f"{section}:\n{table.to_string(max_colwidth=60)}\n")
+        elif args.command == "prune":
+            pruned = catalog.prune(args.keep, args.older_than, args.delete_files)
+            store = create_store(config.get("blob_store", {}))
+            if args.delete_files and store is not None:
+                # Blobs of the deleted runs that no other run shares
+                store.prune(runs_dir)
+            print(f"Pruned {len(pruned)} runs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List, compare and prune the runs recorded in the run catalog.")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to configuration file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("index", help="Record the runs of the runs directory missing from the catalog")
+    for name, description in [("list", "List the latest runs with their metrics"), ("best", "Show the run with the best metric")]:
+        command = commands.add_parser(name, help=description)
+        command.add_argument("--model-type", help="Only runs of this model type, such as RandomForestClassifier")
+        command.add_argument("--days", type=float, help="Only runs finished in the last DAYS days")
+        if name == "list":
+            command.add_argument("--limit", type=int, default=20, help="Number of runs")
+        else:
+            command.add_argument("--metric", default="roc_auc_score", help="Scalar metric to rank the runs by")
+            command.add_argument("--lowest", action="store_true", help="Lower values of the metric are better")
+    command = commands.add_parser("diff", help="Show the configuration, metrics, timings and artifacts that differ")
+    command.add_argument("run_a")
+    command.add_argument("run_b")
+    command = commands.add_parser("prune", help="Remove old runs from the catalog")
+    command.add_argument("--keep", type=int, help="Keep the KEEP latest runs")
+    command.add_argument("--older-than", type=float, help="Remove the runs older than OLDER_THAN days")
+    command.add_argument("--delete-files", action="store_true", help="Also delete the run directories and their unshared blobs")
+
+    main(parser.parse_args())
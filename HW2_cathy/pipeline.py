@@ -1,36 +1,26 @@
 import argparse
 import datetime
 import logging.config
+import pickle
 from pathlib import Path
 import yaml
-import botocore
 
-# Assuming all these are implemented and available under the src directory.
-import src.acquire_data as ad
-import src.analysis as eda
-import src.aws_utils as aws
-import src.create_dataset as cd
-import src.evaluate_performance as ep
-import src.generate_features as gf
-import src.score_model as sm
-import src.train_model as tm
-
-import logging
-
-# Setup logging as configured in local.conf
-logging.config.fileConfig('config/logging/local.conf', disable_existing_loggers=False)
-
-# Adjusting logging levels for external libraries
-logging.getLogger('botocore').setLevel(logging.WARNING)
-logging.getLogger('urllib3').setLevel(logging.WARNING)
+# Stage modules, and the heavy libraries they use, are imported by the stages that run them
+from src.blob_store import create_store
+from src.profiling import StageProfiler
+from src.scheduler import Scheduler
+from src.stage_cache import StageCache, file_digest
 
 logger = logging.getLogger("clouds")
-logger.info("Logging is configured.")
 
 def setup_logging():
     """ Setup logging configuration. """
     logging.config.fileConfig("config/logging/local.conf", disable_existing_loggers=False)
-    return logging.getLogger("clouds")
+    # Adjusting logging levels for external libraries
+    logging.getLogger('botocore').setLevel(logging.WARNING)
+    logging.getLogger('urllib3').setLevel(logging.WARNING)
+    logger.info("Logging is configured.")
+    return logger
 
 def load_config(path):
     """ Load configuration from YAML file. """
@@ -41,12 +31,9 @@ def load_config(path):
         logger.error(f"Error loading configuration from {path}: {e}")
         exit(1)
 
-def create_directories(base_path, config):
-    """ Create directories based on configuration settings. """
-    now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    artifacts_path = Path(base_path) / f"run_{now}"
-    artifacts_path.mkdir(parents=True, exist_ok=True)
-
+def run_directories(artifacts_path, config):
+    """ Paths of the output directories of a run, created if needed. """
+    artifacts_path = Path(artifacts_path)
     raw_data_dir = artifacts_path / Path(config["run_config"]["data_dir"]["raw"])
     processed_data_dir = artifacts_path / Path(config["run_config"]["data_dir"]["processed"])
     figure_dir = artifacts_path / Path(config["run_config"]["figure_dir"])
@@ -60,38 +47,509 @@ def create_directories(base_path, config):
 
     return raw_data_dir, processed_data_dir, figure_dir, model_data_dir, model_dir, score_dir, metric_dir, artifacts_path
 
-def main(config_path):
-    """ Main execution function. """
+def create_directories(base_path, config):
+    """ Create directories based on configuration settings. """
+    now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    artifacts_path = Path(base_path) / f"run_{now}"
+    artifacts_path.mkdir(parents=True, exist_ok=True)
+    return run_directories(artifacts_path, config)
+
+STAGES = ["acquire", "create_dataset", "generate_features", "analysis", "train", "score", "evaluate"]
+
+
+class StageRunner:
+    """ Runs pipeline stages through the stage cache and the stage profiler. """
+
+    def __init__(self, cache, profiler, artifacts_path, force_stages=()):
+        self.cache = cache
+        self.profiler = profiler
+        self.artifacts_path = artifacts_path
+        self.force_stages = force_stages
+        # Stage outputs pickled for their digest, by cache key, until `save` stores them
+        self._pickled = {}
+
+    def compute(self, name, config, upstream, stage, inputs=None):
+        """ Compute a stage, or restore its output and files from the stage cache when its inputs did not change.
+
+        `stage` is called without arguments and returns the stage output.
+        Returns the stage output, its digest, on which the downstream stages are keyed,
+        and the cache key under which `save` stores it (None when it was restored from the cache).
+        """
+        with self.profiler.stage(name, inputs) as record:
+            key = self.cache.stage_key(name, config, upstream)
+            cached = None if name in self.force_stages else self.cache.load(key, self.artifacts_path)
+            if cached is not None:
+                logger.info("Stage %s restored from cache entry %s", name, key[:12])
+                record["cached"] = True
+                record["outputs"] = cached[0]
+                return cached[0], cached[1], None
+            payload = stage()
+            record["outputs"] = payload
+            self._pickled[key] = self.cache.serialize(payload)
+            return payload, self.cache.digest(key, payload, self._pickled[key]), key
+
+    def save(self, name, computed, save):
+        """ Write the files of a computed stage with `save(payload)`, and store both in the stage cache.
+
+        Returns the files written, none when the stage was restored from the cache.
+        """
+        payload, _, key = computed
+        if key is None:
+            return []
+        with self.profiler.stage(f"save_{name}", payload) as record:
+            files = save(payload)
+            record["outputs"] = files
+            self.cache.store(key, payload, files, self.artifacts_path, self._pickled.pop(key, None))
+        return files
+
+
+def export_flat_forest(model, model_dir, train_config):
+    """ Save the forest as flat node arrays in model_dir/flat_forest when `flat_forest` is enabled.
+
+    Returns the files written, none when it is disabled or the model is not a tree ensemble.
+    """
+    if not train_config.get("flat_forest", False):
+        return []
+    from src.flat_forest import FlatForest
+
+    try:
+        return FlatForest.from_model(model).save(model_dir / "flat_forest")
+    except NotImplementedError:
+        logger.warning("The model is not a forest of trees, it is not exported as flat node arrays")
+        return []
+
+
+def main(config_path, force_stages=(), profile=False):
+    """ Main execution function.
+
+    The stages are tasks of a dependency graph. Writing the output of a stage, drawing the
+    figures and uploading finished artifacts overlap with the next CPU-bound stages.
+    """
     logger = setup_logging()
     config = load_config(config_path)
+    import src.generate_features as gf
+
+    # Unknown operations and parameters of feature_eng are rejected before any stage runs
+    gf.compile_features(config["generate_features"]["feature_eng"])
 
     base_path = config["run_config"]["output"]["runs"]
     raw_data_dir, processed_data_dir, figure_dir, model_data_dir, model_dir, score_dir, metric_dir, artifacts_path = create_directories(base_path, config)
+    profiler = StageProfiler(metric_dir / "profiles" if profile else None, trace_memory=profile)
+    cache_config = dict(config.get("stage_cache", {}))
+    remote_config = cache_config.pop("remote", {})
+    remote = None
+    if remote_config.get("enabled", False):
+        from src.remote_cache import create_remote
+
+        remote = create_remote(remote_config, config["aws"])
+    runner = StageRunner(StageCache(**cache_config, remote=remote), profiler, artifacts_path, force_stages)
+    scheduler_config = config.get("scheduler", {})
+    if profile:
+        # cProfile only sees the thread of a stage, and the CPU and memory of a stage are
+        # measured for the whole process: profiled stages run one after another
+        scheduler_config = {**scheduler_config, "max_workers": 1}
+    scheduler = Scheduler(**scheduler_config)
+    store = create_store(config.get("blob_store", {}))
+
+    def acquire():
+        import src.acquire_data as ad
+
+        # The source is always checked: the conditional download is a no-op when it did not change
+        download_config = config["run_config"].get("download", {})
+        with profiler.stage("acquire") as record:
+            ad.acquire_data(
+                config["run_config"]["data_source"], raw_data_dir / "clouds.data",
+                download_config.get("cache_dir"), download_config, force="acquire" in force_stages,
+            )
+            record["outputs"] = raw_data_dir / "clouds.data"
+        # Downstream stages depend on the downloaded content, not on where it came from
+        return file_digest(raw_data_dir / "clouds.data")
+
+    def create_dataset(raw_digest):
+        import src.create_dataset as cd
+
+        return runner.compute(
+            "create_dataset", config["create_dataset"], [raw_digest],
+            lambda: cd.create_dataset(raw_data_dir / "clouds.data", config["create_dataset"]),
+            raw_data_dir / "clouds.data",
+        )
+
+    def save_dataset(computed):
+        import src.create_dataset as cd
+
+        return runner.save("create_dataset", computed, lambda data: [cd.save_dataset(
+            data, processed_data_dir / "clouds", config["create_dataset"].get("artifact_format", "csv")
+        )])
+
+    def generate_features(dataset):
+        import src.generate_features as gf
+
+        data, data_digest, _ = dataset
+
+        plan = gf.compile_features(config["generate_features"]["feature_eng"])
+        features_config = config["generate_features"]
+        if not plan.fitted:
+            # Fitted operations are fitted on the train rows of the split `train` makes
+            features_config = {**features_config, "train_test_split": config["train_model"]["train_test_split"]}
+
+        def compute():
+            import src.train_model as tm
+
+            # The fitted plan is kept with the features, to be saved next to the model
+            train_rows = None if plan.fitted else tm.fit_rows(len(data), config["train_model"])
+            return gf.generate_features(data, config["generate_features"], plan, train_rows), plan
+
+        # Nothing is saved: the features are cached with their digest only
+        computed = runner.compute("generate_features", features_config, [data_digest], compute, data)
+        runner.save("generate_features", computed, lambda features: [])
+        return computed
+
+    def analysis(computed):
+        (features, _), features_digest, _ = computed
+        eda_config = {"mpl_config": config.get("mpl_config"), "generate_features": config["generate_features"], "eda": config.get("eda")}
+
+        def draw():
+            import src.analysis as eda
+
+            return eda.save_figures(features, figure_dir, config)
 
-    ad.acquire_data(config["run_config"]["data_source"], raw_data_dir / "clouds.data")
+        figures = runner.compute("analysis", eda_config, [features_digest], draw, features)
+        runner.save("analysis", figures, lambda paths: paths)
 
-    data = cd.create_dataset(raw_data_dir / "clouds.data", config["create_dataset"])
-    cd.save_dataset(data, processed_data_dir / "clouds.csv")
+    def train(computed):
+        (features, _), features_digest, _ = computed
 
-    features = gf.generate_features(data, config["generate_features"])
-    eda.save_figures(features, figure_dir, config)
+        def fit():
+            import src.train_model as tm
 
-    model, train, test = tm.train_model(features, config["train_model"])
-    tm.save_data(train, test, model_data_dir)
-    tm.save_model(model, model_dir / "trained_model_object.pkl")
+            train_config = config["train_model"]
+            leaderboard = None
+            if train_config.get("search", {}).get("enabled", False):
+                import src.tune_model as tune
 
+                hyperparam, leaderboard = tune.search_hyperparameters(features, train_config)
+                train_config = {**train_config, "model_config": {**train_config["model_config"], "hyperparam": hyperparam}}
+            model, train, test = tm.train_model(features, train_config)
+            return model, train, test, leaderboard
+
+        return runner.compute("train", config["train_model"], [features_digest], fit, features)
+
+    def save_train(computed, features):
+        (_, plan), _, _ = features
+
+        def save(trained):
+            import src.train_model as tm
+            from src.feature_transform import FeatureTransform, save_transform
+
+            model, train, test, leaderboard = trained
+            files = []
+            if leaderboard is not None:
+                import src.tune_model as tune
+
+                tune.save_leaderboard(leaderboard, model_dir / "leaderboard.csv")
+                files.append(model_dir / "leaderboard.csv")
+            files += tm.save_data(train, test, model_data_dir, config["train_model"].get("artifact_format", "csv"))
+            tm.save_model(model, model_dir / "trained_model_object.pkl", config["train_model"].get("serialization"))
+            files.append(model_dir / "trained_model_object.pkl")
+            transform = FeatureTransform(plan, config["train_model"]["initial_features"])
+            files.append(save_transform(transform, model_dir / "feature_transform.pkl"))
+            files += export_flat_forest(model, model_dir, config["train_model"])
+            return files
+
+        return runner.save("train", computed, save)
+
+    def score(trained):
+        import src.score_model as sm
+
+        (model, _, test, _), train_digest, _ = trained
+        return runner.compute(
+            "score", config["score_model"], [train_digest], lambda: sm.score_model(test, model, config["score_model"]), test
+        )
+
+    def save_scores(computed):
+        import src.score_model as sm
+
+        return runner.save("score", computed, lambda scores: [sm.save_scores(
+            scores, score_dir / "scores", config["score_model"].get("artifact_format", "csv")
+        )])
+
+    def evaluate(trained, scored):
+        import src.evaluate_performance as ep
+
+        (_, _, test, _), train_digest, _ = trained
+        scores, scores_digest, _ = scored
+        computed = runner.compute(
+            "evaluate", config["evaluate_performance"], [train_digest, scores_digest],
+            lambda: ep.evaluate_performance(test, scores, config["evaluate_performance"]), (test, scores),
+        )
+
+        def save(metrics):
+            ep.save_metrics(metrics, metric_dir / "metrics.yaml")
+            return [metric_dir / "metrics.yaml"]
+
+        runner.save("evaluate", computed, save)
+
+    scheduler.add("acquire", acquire, kind="io")
+    scheduler.add("create_dataset", create_dataset, ["acquire"])
+    scheduler.add("save_dataset", save_dataset, ["create_dataset"], kind="io")
+    scheduler.add("generate_features", generate_features, ["create_dataset"])
+    scheduler.add("analysis", analysis, ["generate_features"], kind="io")
+    scheduler.add("train", train, ["generate_features"])
+    scheduler.add("save_train", save_train, ["train", "generate_features"], kind="io")
+    scheduler.add("score", score, ["train"])
+    scheduler.add("save_scores", save_scores, ["score"], kind="io")
+    scheduler.add("evaluate", evaluate, ["train", "score"])
+
+    upload = config["aws"].get("upload", False)
+    if upload:
+        import src.aws_utils as aws
+
+        s3_client = aws.create_client(config["aws"])
+
+        def check_bucket():
+            aws.check_bucket_exists(config["aws"]["bucket_name"], s3_client)
+
+        def add_upload(name, directories, after):
+            # Every group is uploaded as soon as the stage that writes it is done
+            def upload_group(*_):
+                files = [path for directory in directories for path in Path(directory).rglob("*") if path.is_file()]
+                with profiler.stage(name, files) as record:
+                    if store is not None:
+                        # Files are final once their stage is done: they are linked into the store and only new blobs are sent
+                        digests = [store.put(path) for path in files]
+                        record["outputs"] = aws.upload_blobs(digests, store, config["aws"], s3_client)
+                    else:
+                        record["outputs"] = aws.upload_files(files, artifacts_path, config["aws"], s3_client)
+
+            scheduler.add(name, upload_group, ["check_bucket", after], kind="io")
+
+        scheduler.add("check_bucket", check_bucket, kind="io")
+        add_upload("upload_raw", [raw_data_dir], "acquire")
+        add_upload("upload_dataset", [processed_data_dir], "save_dataset")
+        add_upload("upload_figures", [figure_dir], "analysis")
+        add_upload("upload_model", [model_dir, model_data_dir], "save_train")
+        add_upload("upload_scores", [score_dir], "save_scores")
+
+    scheduler.run()
+    # Written once every stage is done, then uploaded with the metrics
+    scheduler.save_report(metric_dir / "schedule.yaml")
+    profiler.save(metric_dir / "timings.yaml")
+    if store is not None:
+        # Once every file of the run is written: the run keeps hardlinks to the blobs, and the manifest
+        manifest = store.ingest(artifacts_path)
+        if upload:
+            aws.upload_run(manifest, store, config["aws"], s3_client)
+    elif upload:
+        files = [path for path in metric_dir.rglob("*") if path.is_file()]
+        with profiler.stage("upload_performance", files) as record:
+            record["outputs"] = aws.upload_files(files, artifacts_path, config["aws"], s3_client)
+        profiler.save(metric_dir / "timings.yaml")
+    profiler.close()
+    catalog_config = config.get("run_catalog", {})
+    if catalog_config.get("enabled", False):
+        from src.run_catalog import RunCatalog
+
+        with RunCatalog(catalog_config.get("path", ".cache/catalog.sqlite")) as catalog:
+            catalog.record_run(artifacts_path, config)
+
+def latest_run(base_path):
+    """ Most recent run directory under the runs directory. """
+    runs = sorted(Path(base_path).glob("run_*"))
+    if not runs:
+        logger.error(f"No run directory found in {base_path}")
+        exit(1)
+    return runs[-1]
+
+def open_run(config, run_dir=None, new=False, writes=True):
+    """ Directories of the run a single stage works in: a new run, the given one or the latest one.
+
+    The files of an existing run that was added to the blob store are copied out of it
+    when the stage `writes` to the run, so the blobs shared with other runs are not overwritten.
+    """
+    base_path = config["run_config"]["output"]["runs"]
+    if run_dir is None and new:
+        return create_directories(base_path, config)
+    run_dir = Path(run_dir) if run_dir is not None else latest_run(base_path)
+    logger.info(f"Running in {run_dir}")
+    store = create_store(config.get("blob_store", {}))
+    if writes and store is not None:
+        store.detach(run_dir)
+    return run_directories(run_dir, config)
+
+def run_acquire(config, run_dir=None, force=False):
+    """ Download the source into a new run, or into `run_dir`. """
+    import src.acquire_data as ad
+
+    raw_data_dir, *_, artifacts_path = open_run(config, run_dir, new=True)
+    download_config = config["run_config"].get("download", {})
+    ad.acquire_data(
+        config["run_config"]["data_source"], raw_data_dir / "clouds.data",
+        download_config.get("cache_dir"), download_config, force=force,
+    )
+    return artifacts_path
+
+def run_features(config, run_dir=None):
+    """ Clean the source of a run and save the dataset and its features.
+
+    Both are written block by block as the source is read, so memory does not grow
+    with the dataset; npy artifacts, whose header holds the number of rows, are
+    written from the full dataset.
+    """
+    import src.create_dataset as cd
+    import src.generate_features as gf
+    import src.train_model as tm
+    from src.artifact_io import FrameWriter, save_frame
+
+    raw_data_dir, processed_data_dir, *_ = open_run(config, run_dir)
+    fmt = config["create_dataset"].get("artifact_format", "csv")
+    plan = gf.compile_features(config["generate_features"]["feature_eng"])
+    if fmt == "npy":
+        data = cd.create_dataset(raw_data_dir / "clouds.data", config["create_dataset"])
+        cd.save_dataset(data, processed_data_dir / "clouds", fmt)
+        train_rows = None if plan.fitted else tm.fit_rows(len(data), config["train_model"])
+        features = gf.generate_features(data, config["generate_features"], plan, train_rows)
+        path = save_frame(features, processed_data_dir / "features", fmt)
+    else:
+        if not plan.fitted:
+            # A first pass over the source fits the statistics on the train rows, as in memory
+            plan.fit_blocks(
+                lambda: cd.iter_dataset(raw_data_dir / "clouds.data", config["create_dataset"]),
+                lambda n_rows: tm.fit_rows(n_rows, config["train_model"]),
+            )
+        with FrameWriter(processed_data_dir / "clouds", fmt) as dataset:
+            def blocks():
+                for block in cd.iter_dataset(raw_data_dir / "clouds.data", config["create_dataset"]):
+                    dataset.write(block)
+                    yield block
+
+            path = gf.write_features(blocks(), config["generate_features"], processed_data_dir / "features", fmt, plan)
+    # The fitted plan is saved with the features, for `train` to save the feature transform next to the model
+    with open(processed_data_dir / "feature_plan.pkl", "wb") as file:
+        pickle.dump(plan, file, protocol=pickle.HIGHEST_PROTOCOL)
+    logger.info(f"Features saved to {path}")
+    return path
+
+def run_train(config, run_dir=None):
+    """ Train the model on the saved features of a run and save it with its train and test sets. """
+    import src.train_model as tm
+    from src.artifact_io import artifact_path, load_frame
+
+    _, processed_data_dir, _, model_data_dir, model_dir, *_ = open_run(config, run_dir)
+    features = load_frame(artifact_path(
+        processed_data_dir / "features", config["create_dataset"].get("artifact_format", "csv")
+    ))
+    train_config = config["train_model"]
+    if train_config.get("search", {}).get("enabled", False):
+        import src.tune_model as tune
+
+        hyperparam, leaderboard = tune.search_hyperparameters(features, train_config)
+        tune.save_leaderboard(leaderboard, model_dir / "leaderboard.csv")
+        train_config = {**train_config, "model_config": {**train_config["model_config"], "hyperparam": hyperparam}}
+    model, train, test = tm.train_model(features, train_config)
+    tm.save_data(train, test, model_data_dir, config["train_model"].get("artifact_format", "csv"))
+    tm.save_model(model, model_dir / "trained_model_object.pkl", config["train_model"].get("serialization"))
+    if (processed_data_dir / "feature_plan.pkl").exists():
+        from src.feature_transform import FeatureTransform, save_transform
+
+        with open(processed_data_dir / "feature_plan.pkl", "rb") as file:
+            plan = pickle.load(file)
+        save_transform(FeatureTransform(plan, train_config["initial_features"]), model_dir / "feature_transform.pkl")
+    else:
+        logger.warning("No feature plan was saved with the features, the model is saved without its feature transform")
+    export_flat_forest(model, model_dir, train_config)
+    return model_dir / "trained_model_object.pkl"
+
+def run_score(config, run_dir=None):
+    """ Score the saved test set of a run with its saved model. """
+    import src.score_model as sm
+    from src.artifact_io import artifact_path, load_frame
+
+    *_, model_data_dir, model_dir, score_dir, _, _ = open_run(config, run_dir)
+    test = load_frame(artifact_path(model_data_dir / "test", config["train_model"].get("artifact_format", "csv")))
+    model = sm.load_model(model_dir / "trained_model_object.pkl")
     scores = sm.score_model(test, model, config["score_model"])
-    sm.save_scores(scores, score_dir / "scores.csv")
+    return sm.save_scores(scores, score_dir / "scores", config["score_model"].get("artifact_format", "csv"))
+
+def run_evaluate(config, run_dir=None):
+    """ Evaluate the saved scores of a run, streaming them with its test set. """
+    import src.evaluate_performance as ep
+    from src.artifact_io import artifact_path
 
-    metrics = ep.evaluate_performance(test, scores, config["evaluate_performance"])
+    *_, model_data_dir, _, score_dir, metric_dir, _ = open_run(config, run_dir)
+    metrics = ep.evaluate_files(
+        artifact_path(model_data_dir / "test", config["train_model"].get("artifact_format", "csv")),
+        artifact_path(score_dir / "scores", config["score_model"].get("artifact_format", "csv")),
+        config["evaluate_performance"],
+    )
     ep.save_metrics(metrics, metric_dir / "metrics.yaml")
+    return metrics
+
+def run_upload(config, run_dir=None):
+    """ Upload every file of a run to S3, as the blobs the bucket does not have when the blob store is enabled. """
+    import src.aws_utils as aws
+
+    *_, artifacts_path = open_run(config, run_dir, writes=False)
+    store = create_store(config.get("blob_store", {}))
+    if store is None:
+        return aws.upload_artifacts(artifacts_path, config["aws"])
+    return aws.upload_run(store.ingest(artifacts_path), store, config["aws"])
+
+def run_update(config, run_dir=None):
+    """ Update the incremental model with the rows of a run added since the last update.
+
+    The updated model and the transform of its frozen feature plan are saved apart from
+    the batch model, transform, scores and metrics of the run, which are left unchanged.
+    """
+    import src.incremental as inc
+    import src.train_model as tm
+    from src.feature_transform import FeatureTransform, save_transform
+
+    raw_data_dir, *_, model_dir, _, metric_dir, _ = open_run(config, run_dir)
+    model, report = inc.incremental_update(raw_data_dir / "clouds.data", config)
+    if model is not None:
+        _, _, plan = inc.load_state(inc.state_directory(config), inc.state_key(config))
+        tm.save_model(model, model_dir / "incremental_model.pkl", config["train_model"].get("serialization"))
+        save_transform(FeatureTransform(plan, config["train_model"]["initial_features"]),
+                       model_dir / "incremental_transform.pkl")
+    with open(metric_dir / "incremental.yaml", "w") as file:
+        yaml.safe_dump(report, file, sort_keys=False)
+    return report
 
-    if config["aws"].get("upload", False):
-        aws.upload_artifacts(artifacts_path, config["aws"])
+COMMANDS = {
+    "acquire": ("Download the source into a new run (or --run-dir)", run_acquire),
+    "features": ("Clean the source of a run and save its features", run_features),
+    "train": ("Train and save the model on the features of a run", run_train),
+    "score": ("Score the test set of a run with its model", run_score),
+    "evaluate": ("Compute the metrics of the scores of a run", run_evaluate),
+    "upload": ("Upload the artifacts of a run to S3", run_upload),
+    "update": ("Update the incremental model with the new rows of a run", run_update),
+}
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the full pipeline for model training and evaluation.")
     parser.add_argument("--config", default="config/config.yaml", help="Path to configuration file")
+    parser.add_argument(
+        "--force-stage", action="append", default=[], choices=STAGES,
+        help="Recompute a stage even if its output is in the stage cache (can be repeated)"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Dump the cProfile statistics of every stage to performance/profiles/<stage>.prof"
+    )
+    commands = parser.add_subparsers(dest="command", help="Stage to run on its own (default: run every stage)")
+    commands.add_parser("run", help="Run every stage as a dependency graph")
+    for command, (description, _) in COMMANDS.items():
+        command_parser = commands.add_parser(command, help=description)
+        command_parser.add_argument("--run-dir", help="Run directory (default: the latest run)")
     args = parser.parse_args()
 
-    main(args.config)
+    if args.command in COMMANDS:
+        setup_logging()
+        config = load_config(args.config)
+        run_command = COMMANDS[args.command][1]
+        if args.command == "acquire":
+            run_command(config, args.run_dir, force="acquire" in args.force_stage)
+        else:
+            run_command(config, args.run_dir)
+    else:
+        main(args.config, args.force_stage, args.profile)
@@ -0,0 +1,61 @@
+import argparse
+import logging.config
+from pathlib import Path
+import yaml
+
+import src.score_model as sm
+
+logging.config.fileConfig("config/logging/local.conf", disable_existing_loggers=False)
+logger = logging.getLogger("clouds")
+
+
+def main(args):
+    """ Score a file in blocks, or serve online predictions, with a model loaded once. """
+    with open(args.config, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)["score_model"]
+    if args.chunksize:
+        config["chunksize"] = args.chunksize
+
+    model = sm.load_model(args.model)
+    transform = None
+    if args.raw:
+        from src.feature_transform import load_transform
+
+        transform = load_transform(args.transform or Path(args.model).with_name("feature_transform.pkl"))
+
+    if args.serve or args.socket:
+        from src.model_server import create_server
+
+        if args.port:
+            config.setdefault("server", {})["port"] = args.port
+        server = create_server(model, config, args.socket, transform)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Scoring server stopped")
+        finally:
+            server.server_close()
+            server.batcher.close()
+    else:
+        if not args.input or not args.output:
+            raise SystemExit("--input and --output are required unless serving")
+        sm.score_file(model, Path(args.input), Path(args.output), config, transform)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score data with a trained model.")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to configuration file")
+    parser.add_argument("--model", required=True, help="Path to trained_model_object.pkl, or to its flat_forest directory")
+    parser.add_argument("--input", help="CSV or Parquet file with the model features")
+    parser.add_argument("--output", help="CSV file the scores are written to")
+    parser.add_argument(
+        "--raw", action="store_true",
+        help="Inputs hold raw cloud columns, turned into the model features by the saved feature transform"
+    )
+    parser.add_argument("--transform", help="Path to feature_transform.pkl (default: next to the model)")
+    parser.add_argument("--chunksize", type=int, help="Rows scored at once (overrides score_model.chunksize)")
+    parser.add_argument("--serve", action="store_true", help="Serve predictions over HTTP")
+    parser.add_argument("--port", type=int, help="Port of the HTTP server (overrides score_model.server.port)")
+    parser.add_argument("--socket", help="Serve predictions on this Unix socket instead of a TCP port")
+
+    main(parser.parse_args())
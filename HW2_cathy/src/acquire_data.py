@@ -1,35 +1,191 @@
+import hashlib
+import json
 import logging
+import os
+import shutil
 from pathlib import Path
 import sys
 import time
+import zlib
+from typing import Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("clouds")
 
-def get_data(url: str, retries: int = 4, base_delay: int = 3, delay_factor: int = 2) -> bytes:
-    """Fetches data from a specified URL with retries and exponential backoff.
+MB = 1024 * 1024
+
+
+class IncompleteDownload(requests.exceptions.RequestException):
+    """The connection closed before the whole response body was received."""
+
+
+def create_session(pool_size: int = 4) -> requests.Session:
+    """Creates a session whose pooled connections are reused across requests.
+
+    Parameters:
+        pool_size (int): Number of connections kept open per host. Defaults to 4.
+
+    Returns:
+        requests.Session: Session with a pooled adapter for HTTP and HTTPS.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _meta_path(path: Path) -> Path:
+    return path.with_name(path.name + ".meta.json")
+
+
+def _read_meta(path: Path) -> dict:
+    try:
+        return json.loads(_meta_path(path).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path: Path, meta: dict) -> None:
+    tmp = _meta_path(path).with_suffix(".tmp")
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, _meta_path(path))
+
+
+def _validators(response: requests.Response) -> dict:
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def _decode(part: Path, encoding: Optional[str], chunk_size: int) -> Path:
+    """Decodes a complete gzip or deflate body, returns the path of the file to keep."""
+    if encoding in (None, "identity"):
+        return part
+    if encoding not in ("gzip", "x-gzip", "deflate"):
+        logger.error(f"Unsupported Content-Encoding: {encoding}")
+        raise NotImplementedError(f"Unsupported Content-Encoding: {encoding}")
+    decoded = part.with_name(part.name + ".decoded")
+    # 32 + MAX_WBITS detects both the gzip and the zlib header
+    decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+    with open(part, "rb") as source, open(decoded, "wb") as file:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            file.write(decompressor.decompress(chunk))
+        file.write(decompressor.flush())
+    return decoded
+
+
+def _fetch(session: requests.Session, url: str, destination: Path, part: Path,
+           conditional: bool, chunk_size: int, timeout: float) -> bool:
+    """Runs one download attempt, resuming the partial file left by a failed attempt.
+
+    Returns:
+        bool: Whether the file was downloaded, False when the source did not change.
+    """
+    meta = _read_meta(destination) if destination.exists() and conditional else {}
+    part_meta = _read_meta(part) if part.exists() else {}
+    # Ranges and Content-Length count the bytes of the encoded body, so the body is
+    # asked for unencoded, and kept encoded until complete if the server encodes it anyway
+    headers = {"Accept-Encoding": "identity"}
+    if meta.get("url") == url:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    offset = part.stat().st_size if part_meta.get("url") == url else 0
+    etag = part_meta.get("etag")
+    # If-Range only accepts strong ETags
+    validator = etag if etag and not etag.startswith("W/") else part_meta.get("last_modified")
+    if offset and validator:
+        # The server only honours the range if the partial file is still current
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return False
+        if response.status_code == 416:
+            # The partial file is not a prefix of the source any more
+            part.unlink(missing_ok=True)
+        response.raise_for_status()
+        if response.status_code == 206:
+            mode = "ab"
+            logger.info(f"Resuming download of {url} at byte {offset}")
+        else:
+            mode, offset = "wb", 0
+            part_meta = {"url": url, **_validators(response), "encoding": response.headers.get("Content-Encoding")}
+            _write_meta(part, part_meta)
+        expected = response.headers.get("Content-Length")
+        received = 0
+        with open(part, mode) as file:
+            for chunk in response.raw.stream(chunk_size, decode_content=False):
+                file.write(chunk)
+                received += len(chunk)
+        if expected is not None and received < int(expected):
+            raise IncompleteDownload(f"Received {received} of {expected} bytes")
+
+    complete = _decode(part, part_meta.get("encoding"), chunk_size)
+    # The validators are only recorded once the file they describe is in place, so an
+    # interrupted rename is downloaded again rather than answered with a 304
+    os.replace(complete, destination)
+    _write_meta(destination, {"url": url, **_validators(response)})
+    if complete != part:
+        part.unlink()
+    _meta_path(part).unlink(missing_ok=True)
+    return True
+
+
+def download(url: str, destination: Path, session: Optional[requests.Session] = None, retries: int = 4,
+             base_delay: int = 3, delay_factor: int = 2, chunk_size: int = MB, timeout: float = 10,
+             conditional: bool = True) -> bool:
+    """Streams a URL to a file, with retries, resumption and conditional requests.
+
+    The body is written in chunks to `<destination>.part`, which is renamed to
+    `destination` once complete, so `destination` is never left half written. A
+    failed attempt is resumed from the end of the partial file with an HTTP Range
+    request. The body is asked for without Content-Encoding, as ranges count
+    encoded bytes; a gzip or deflate body is still stored as received and only
+    decoded once complete. The ETag and Last-Modified of the source are kept next to the file,
+    and sent as If-None-Match and If-Modified-Since, so an unchanged source is
+    not downloaded again.
 
     Parameters:
         url (str): URL to fetch data from.
-        retries (int): Maximum number of retry attempts. Defaults to 4.
+        destination (Path): File path where data will be saved.
+        session (Optional[requests.Session]): Session to reuse. Defaults to a new pooled session.
+        retries (int): Maximum number of attempts. Defaults to 4.
         base_delay (int): Base delay between retries in seconds. Defaults to 3.
         delay_factor (int): Multiplicative factor for delay. Defaults to 2.
+        chunk_size (int): Bytes written at once. Defaults to 1 MB.
+        timeout (float): Connection and read timeout in seconds. Defaults to 10.
+        conditional (bool): Whether to skip the download when the source did not change.
 
     Returns:
-        bytes: Retrieved data.
+        bool: Whether the file was downloaded, False when it was already up to date.
 
     Raises:
         NotImplementedError: If all attempts to fetch data fail.
     """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    part = destination.with_name(destination.name + ".part")
+    session = session or create_session()
     delay = base_delay
     for attempt in range(retries):
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()  # Checks for HTTP error responses
-            return response.content
+            start = time.perf_counter()
+            downloaded = _fetch(session, url, destination, part, conditional, chunk_size, timeout)
+            if downloaded:
+                size = destination.stat().st_size
+                elapsed = time.perf_counter() - start
+                logger.info(f"Downloaded {url} to {destination} ({size} bytes in {elapsed:.2f}s)")
+            else:
+                logger.info(f"{destination} is up to date with {url}")
+            return downloaded
         except requests.exceptions.RequestException as error:
             logger.warning(f"Attempt {attempt + 1}/{retries} failed: {error}")
             if attempt < retries - 1:
@@ -40,38 +196,46 @@ def get_data(url: str, retries: int = 4, base_delay: int = 3, delay_factor: int
                 logger.error("All attempts to retrieve data have failed.")
                 raise NotImplementedError from error
 
-def write_data(data: bytes, destination: Path) -> None:
-    """Writes data to the specified file path.
-
-    Parameters:
-        data (bytes): Data to write.
-        destination (Path): File path where data will be saved.
 
-    Raises:
-        NotImplementedError: If data writing fails.
-    """
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    try:
-        with open(destination, 'wb') as file:
-            file.write(data)
-        logger.info(f"Data successfully written to {destination}")
-    except Exception as exc:
-        logger.error(f"Failed to write data: {exc}")
-        raise NotImplementedError from exc
-
-def acquire_data(url: str, file_path: Path) -> None:
+def acquire_data(url: str, file_path: Path, cache_dir: Optional[Path] = None, config: Optional[dict] = None,
+                 session: Optional[requests.Session] = None, force: bool = False) -> bool:
     """Orchestrates the data fetching and writing process.
 
+    With `cache_dir`, the source is kept in a download cache shared by all runs
+    and only fetched again when it changed, then copied to `file_path`.
+
     Parameters:
         url (str): URL of the data source.
         file_path (Path): Path to save the fetched data.
+        cache_dir (Optional[Path]): Directory of the download cache. Defaults to no cache.
+        config (Optional[dict]): Download settings: retries, base_delay, delay_factor,
+            chunk_size_kb and timeout.
+        session (Optional[requests.Session]): Session to reuse. Defaults to a new pooled session.
+        force (bool): Whether to download the source even if it did not change.
+
+    Returns:
+        bool: Whether the source was downloaded, False when the cached copy was up to date.
 
     Raises:
         SystemExit: If there is an error related to file operations.
     """
+    config = config or {}
+    settings = {
+        "retries": config.get("retries", 4),
+        "base_delay": config.get("base_delay", 3),
+        "delay_factor": config.get("delay_factor", 2),
+        "chunk_size": int(config.get("chunk_size_kb", 1024) * 1024),
+        "timeout": config.get("timeout", 10),
+    }
     try:
-        data = get_data(url)
-        write_data(data, file_path)
+        if cache_dir is None:
+            return download(url, file_path, session, conditional=False, **settings)
+        cached = Path(cache_dir) / hashlib.sha256(url.encode()).hexdigest()[:16] / file_path.name
+        downloaded = download(url, cached, session, conditional=not force, **settings)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(cached, file_path)
+        logger.info(f"Data successfully written to {file_path}")
+        return downloaded
     except FileNotFoundError:
         logger.error("Invalid file path provided.")
         sys.exit(1)
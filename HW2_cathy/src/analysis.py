@@ -1,29 +1,34 @@
+import hashlib
 import logging
 import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 from pathlib import Path
-import matplotlib.pyplot as plt
 import matplotlib as mpl
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
 import pandas as pd
 from cycler import cycler
 
+from src.scheduler import process_context
+
 # Configure logging
 logger = logging.getLogger("clouds")
 
-def save_figures(data: pd.DataFrame, fig_dir: Path, config: dict) -> List[Path]:
-    """Generate and save exploratory data analysis figures.
+
+def _rc_params(config: dict) -> dict:
+    """Build the matplotlib settings of the figures from the user settings.
 
     Args:
-        data (pd.DataFrame): DataFrame containing features and the response variable.
-        fig_dir (Path): Directory where figures will be saved.
         config (dict): Configuration settings for figure attributes.
 
     Returns:
-        List[Path]: A list of paths where figures have been saved.
+        dict: rcParams applied while the figures are drawn.
     """
-    # Apply matplotlib configurations from user settings.
     mpl_settings = config.get('mpl_config', {})
-    mpl.rcParams.update({
+    return {
         'font.size': mpl_settings.get('font.size', 12),
         'axes.prop_cycle': cycler('color', mpl_settings.get('cycle_colors', ['b', 'g', 'r', 'c'])),
         'xtick.labelsize': mpl_settings.get('xtick.labelsize', 'medium'),
@@ -37,33 +42,145 @@ def save_figures(data: pd.DataFrame, fig_dir: Path, config: dict) -> List[Path]:
         'text.color': mpl_settings.get('text.color', 'black'),
         'font.family': mpl_settings.get('font.family', 'sans-serif'),
         'font.sans-serif': mpl_settings.get('font.sans-serif', ['DejaVu Sans'])
-    })
+    }
+
+
+def histograms(features: pd.DataFrame, target: pd.Series, bins: int = 10) -> tuple[np.ndarray, np.ndarray]:
+    """Compute the histogram of every feature for both classes at once.
+
+    Bins are the ones `np.histogram` (and so `Axes.hist`) uses for the values of
+    both classes: `bins` equal-width bins between the minimum and maximum of the
+    feature, the last one including its right edge.
+
+    Args:
+        features (pd.DataFrame): Features to plot.
+        target (pd.Series): Class of every row, 0 or 1.
+        bins (int): Number of bins per feature.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Bin edges of shape (features, bins + 1) and
+            counts of shape (2, features, bins).
+    """
+    values = features.to_numpy(dtype=np.float64)
+    finite = np.isfinite(values)
+    low = np.where(finite, values, np.inf).min(axis=0)
+    high = np.where(finite, values, -np.inf).max(axis=0)
+    low, high = np.where(np.isfinite(low), low, 0.0), np.where(np.isfinite(high), high, 1.0)
+    # np.histogram widens an empty range by 0.5 on both sides
+    constant = low == high
+    low, high = np.where(constant, low - 0.5, low), np.where(constant, high + 0.5, high)
+    edges = np.linspace(low, high, bins + 1, axis=1)
+
+    # Same bin search as np.histogram for equal-width bins, for all features at once
+    columns = np.arange(values.shape[1])
+    safe = np.where(finite, values, low)
+    indices = ((safe - low) * (bins / (high - low))).astype(np.intp)
+    indices = np.clip(indices, 0, bins - 1)
+    indices[safe < edges[columns, indices]] -= 1
+    increment = (safe >= edges[columns, np.minimum(indices + 1, bins)]) & (indices != bins - 1)
+    indices[increment] += 1
+
+    flat = indices + columns * bins
+    label = np.asarray(target) == 1
+    counts = np.stack([
+        np.bincount(flat[finite & ~label[:, None]], minlength=len(columns) * bins),
+        np.bincount(flat[finite & label[:, None]], minlength=len(columns) * bins),
+    ]).reshape(2, len(columns), bins)
+    return edges, counts
+
+
+def _render(task: tuple) -> None:
+    """Draw and save the histogram of one feature, in a worker process.
+
+    Args:
+        task (tuple): Feature name, bin edges, counts per class, rcParams and figure path.
+    """
+    feature, edges, counts, rc, figure_path = task
+    with mpl.rc_context(rc):
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+        # Pre-binned counts are drawn as weights on the left edge of every bin
+        ax.hist([edges[:-1], edges[:-1]], bins=edges, weights=list(counts), label=['Class 0', 'Class 1'])
+        ax.set_xlabel(feature.replace('_', ' ').title())
+        ax.set_ylabel('Frequency')
+        ax.legend()
+        fig.savefig(figure_path, bbox_inches='tight')
+
+
+def _figure_digest(feature: str, edges: np.ndarray, counts: np.ndarray, rc: dict) -> str:
+    """Hash everything a figure is drawn from."""
+    digest = hashlib.sha256()
+    for part in (feature, repr(sorted(rc.items(), key=str)), mpl.__version__):
+        digest.update(part.encode())
+    digest.update(edges.tobytes())
+    digest.update(counts.tobytes())
+    return digest.hexdigest()
+
+
+def save_figures(data: pd.DataFrame, fig_dir: Path, config: dict) -> List[Path]:
+    """Generate and save exploratory data analysis figures.
+
+    Histograms of all features are binned in one vectorized pass and drawn with
+    the Agg backend in a pool of `eda.render.n_jobs` processes, without touching
+    the global matplotlib settings. Figures whose data and settings were already
+    drawn are copied from `eda.render.cache_dir` instead of being drawn again.
+
+    Args:
+        data (pd.DataFrame): DataFrame containing features and the response variable.
+        fig_dir (Path): Directory where figures will be saved.
+        config (dict): Configuration settings for figure attributes.
+
+    Returns:
+        List[Path]: A list of paths where figures have been saved.
+    """
+    render_config = config.get("eda", {}).get("render", {})
+    rc = _rc_params(config)
 
     # Data preparation based on configuration
     feature_col_names = config["generate_features"]["feature_col"]
     target_column = config["generate_features"]["target_col"]
     features = data[feature_col_names]
     target = data[target_column]
-    figure_paths = []
+    edges, counts = histograms(features, target, render_config.get("bins", 10))
 
-    # Figure creation and saving
-    for feature in features.columns:
-        fig, ax = plt.subplots()
-        ax.hist([features.loc[target == 0, feature], features.loc[target == 1, feature]], label=['Class 0', 'Class 1'])
-        ax.set_xlabel(feature.replace('_', ' ').title())
-        ax.set_ylabel('Frequency')
-        ax.legend()
+    cache_dir = render_config.get("cache_dir")
+    if cache_dir:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
 
-        # Saving figure
+    figure_paths = []
+    tasks = []
+    for i, feature in enumerate(features.columns):
         figure_filename = f"{feature}_eda_plot.png"
         figure_path = fig_dir / figure_filename
-        try:
-            fig.savefig(figure_path, bbox_inches='tight')
-            logger.info(f"Figure {figure_filename} saved at {figure_path}")
-        except Exception as exc:
-            logger.error(f"Failed to save figure {figure_filename} at {figure_path}: {exc}")
-            raise NotImplementedError from exc
         figure_paths.append(figure_path)
-        plt.close(fig)  # Close the figure to release memory
+        cached = None
+        if cache_dir:
+            cached = Path(cache_dir) / f"{_figure_digest(feature, edges[i], counts[:, i], rc)}.png"
+            if cached.exists():
+                shutil.copyfile(cached, figure_path)
+                logger.info(f"Figure {figure_filename} unchanged, copied to {figure_path}")
+                continue
+        tasks.append(((feature, edges[i], counts[:, i], rc, figure_path), cached))
+
+    # Figure creation and saving
+    n_jobs = min(render_config.get("n_jobs", 1), max(len(tasks), 1))
+    try:
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=process_context()) as pool:
+                list(pool.map(_render, [task for task, _ in tasks]))
+        else:
+            for task, _ in tasks:
+                _render(task)
+    except Exception as exc:
+        logger.error(f"Failed to save figures in {fig_dir}: {exc}")
+        raise NotImplementedError from exc
+
+    for (feature, _, _, _, figure_path), cached in tasks:
+        logger.info(f"Figure {figure_path.name} saved at {figure_path}")
+        if cached is not None:
+            tmp = cached.with_suffix(f".{os.getpid()}.tmp")
+            shutil.copyfile(figure_path, tmp)
+            os.replace(tmp, cached)
 
     return figure_paths
@@ -0,0 +1,206 @@
+import json
+import logging
+from pathlib import Path
+from typing import Iterator, Optional
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("clouds")
+
+# Supported artifact formats and their file suffix
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather", "npy": ".npy"}
+
+
+def artifact_path(path: Path, fmt: str) -> Path:
+    """Give `path` the suffix of an artifact format.
+
+    Args:
+        path (Path): Path of the artifact, with or without suffix.
+        fmt (str): One of FORMATS.
+
+    Returns:
+        Path: Path of the artifact in that format.
+
+    Raises:
+        NotImplementedError: If the format is not supported.
+    """
+    if fmt not in FORMATS:
+        logger.error("Unsupported artifact format %s, expected one of %s", fmt, list(FORMATS))
+        raise NotImplementedError(f"Unsupported artifact format {fmt}")
+    return Path(path).with_suffix(FORMATS[fmt])
+
+
+def _format_of(path: Path) -> str:
+    for fmt, suffix in FORMATS.items():
+        if Path(path).suffix == suffix:
+            return fmt
+    logger.error("Unsupported artifact file %s", path)
+    raise NotImplementedError(f"Unsupported artifact file {path}")
+
+
+def _columns_path(path: Path) -> Path:
+    return Path(path).with_suffix(".columns.json")
+
+
+def save_frame(data: pd.DataFrame, path: Path, fmt: Optional[str] = None) -> Path:
+    """Save a dataframe, without its index, in a CSV or binary columnar format.
+
+    Feather files are written uncompressed and npy files as one array, so that
+    both can be memory-mapped by `load_frame`. npy stores frames with a single
+    dtype as a 2D array and its column names in a `.columns.json` sidecar, and
+    other frames as a structured array.
+
+    Args:
+        data (pd.DataFrame): Dataframe to save.
+        path (Path): Path of the artifact; its suffix is replaced by the one of `fmt`.
+        fmt (Optional[str]): One of FORMATS. Defaults to the format of the suffix of `path`.
+
+    Returns:
+        Path: Path the artifact was written to.
+    """
+    fmt = fmt or _format_of(path)
+    path = artifact_path(path, fmt)
+    if fmt == "csv":
+        data.to_csv(path, index=False)
+    elif fmt == "parquet":
+        data.to_parquet(path, index=False)
+    elif fmt == "feather":
+        data.reset_index(drop=True).to_feather(path, compression="uncompressed")
+    elif data.dtypes.nunique() == 1:
+        np.save(path, np.ascontiguousarray(data.to_numpy()))
+        _columns_path(path).write_text(json.dumps([str(column) for column in data.columns]))
+    else:
+        np.save(path, data.to_records(index=False))
+    return path
+
+
+def load_frame(path: Path, columns: Optional[list] = None, mmap: bool = True) -> pd.DataFrame:
+    """Load a dataframe saved by `save_frame`, in the format given by its suffix.
+
+    With `mmap`, Feather files are memory-mapped and 2D npy files are wrapped
+    without copy around a read-only memory map, so only the pages that are used
+    are read from disk.
+
+    Args:
+        path (Path): Path of the artifact.
+        columns (Optional[list]): Columns to load. Defaults to all of them.
+        mmap (bool): Whether to memory-map the file when the format allows it.
+
+    Returns:
+        pd.DataFrame: The loaded dataframe.
+    """
+    fmt = _format_of(path)
+    if fmt == "csv":
+        return pd.read_csv(path, usecols=columns)
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns, memory_map=mmap)
+    if fmt == "feather":
+        import pyarrow.feather as feather
+
+        return feather.read_table(path, columns=columns, memory_map=mmap).to_pandas()
+
+    array = np.load(path, mmap_mode="r" if mmap else None)
+    if array.dtype.names:
+        data = pd.DataFrame.from_records(array)
+    else:
+        names = json.loads(_columns_path(path).read_text())
+        data = pd.DataFrame(array, columns=names, copy=False)
+    return data if columns is None else data[columns]
+
+
+def iter_frame(path: Path, columns: Optional[list], chunksize: int) -> Iterator[pd.DataFrame]:
+    """Read an artifact in blocks of at most `chunksize` rows.
+
+    Args:
+        path (Path): Path of the artifact.
+        columns (Optional[list]): Columns to read. Defaults to all of them.
+        chunksize (int): Maximum number of rows per block.
+
+    Yields:
+        pd.DataFrame: Block of the artifact.
+    """
+    fmt = _format_of(path)
+    if fmt == "csv":
+        with pd.read_csv(path, usecols=columns, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk if columns is None else chunk[columns]
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif fmt == "feather":
+        import pyarrow as pa
+
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for start in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(start, chunksize).to_pandas()
+    else:
+        data = load_frame(path, columns, mmap=True)
+        for start in range(0, len(data), chunksize):
+            yield data.iloc[start : start + chunksize]
+
+
+class FrameWriter:
+    """Write a dataframe to an artifact block by block, without holding it in memory.
+
+    CSV blocks are appended to the file, Parquet blocks are written as row
+    groups and Feather blocks as record batches of an Arrow IPC file, which
+    `load_frame` and `iter_frame` read like the files written by `save_frame`.
+    The index of the blocks is not written. npy files are not supported, since
+    their header holds the number of rows.
+    """
+
+    def __init__(self, path: Path, fmt: Optional[str] = None):
+        fmt = fmt or _format_of(path)
+        self.path = artifact_path(path, fmt)
+        if fmt == "npy":
+            logger.error("npy artifacts cannot be written block by block")
+            raise NotImplementedError("npy artifacts cannot be written block by block")
+        self.fmt = fmt
+        self.rows = 0
+        self._writer = None
+
+    def write(self, data: pd.DataFrame) -> None:
+        """Append a block, with the same columns and dtypes as the first one.
+
+        Args:
+            data (pd.DataFrame): Block to append.
+        """
+        if self.fmt == "csv":
+            data.to_csv(self.path, index=False, mode="a" if self.rows else "w", header=not self.rows)
+        else:
+            import pyarrow as pa
+
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            if self._writer is None:
+                if self.fmt == "parquet":
+                    import pyarrow.parquet as pq
+
+                    self._writer = pq.ParquetWriter(self.path, table.schema)
+                else:
+                    self._writer = pa.ipc.new_file(str(self.path), table.schema)
+            self._writer.write_table(table)
+        self.rows += len(data)
+
+    def close(self) -> Path:
+        """Finish the artifact.
+
+        Returns:
+            Path: Path the artifact was written to.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        return self.path
+
+    def __enter__(self) -> "FrameWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
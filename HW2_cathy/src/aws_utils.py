@@ -1,12 +1,23 @@
 import os
+import hashlib
+import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List
 from pathlib import Path
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from s3transfer.utils import ChunksizeAdjuster
 
 # Configure logging
 logger = logging.getLogger("clouds")
 
+MB = 1024 * 1024
+
+
 def check_bucket_exists(bucket_name: str, s3_client):
     """Verify the existence of an S3 bucket.
 
@@ -29,40 +40,246 @@ def check_bucket_exists(bucket_name: str, s3_client):
             logger.error("Error checking bucket '%s': %s", bucket_name, e)
             raise NotImplementedError from e
 
-def upload_artifacts(artifacts: Path, config: dict) -> List[str]:
-    """Uploads local files as artifacts to an AWS S3 bucket.
+
+def create_client(config: dict):
+    """Create an S3 client whose connection pool can serve every upload thread.
 
     Args:
-        artifacts (Path): The local directory containing files to upload.
-        config (dict): Configuration including the bucket name and prefix.
+        config (dict): AWS configuration, with the optional number of upload workers.
 
     Returns:
-        List[str]: A list of S3 URIs to the uploaded artifacts.
+        The S3 client instance.
+    """
+    max_workers = config.get("max_workers", 8)
+    concurrency = config.get("multipart_concurrency", 4)
+    return boto3.client("s3", config=Config(max_pool_connections=max_workers * concurrency))
+
+
+def transfer_config(config: dict) -> TransferConfig:
+    """Build the multipart settings of the uploads from the AWS configuration.
+
+    Args:
+        config (dict): AWS configuration.
+
+    Returns:
+        TransferConfig: Multipart threshold, part size and concurrency of every file upload.
+    """
+    return TransferConfig(
+        multipart_threshold=int(config.get("multipart_threshold_mb", 8) * MB),
+        multipart_chunksize=int(config.get("multipart_chunksize_mb", 8) * MB),
+        max_concurrency=config.get("multipart_concurrency", 4),
+    )
+
+
+def local_etag(path: Path, transfer: TransferConfig) -> str:
+    """Compute the ETag S3 gives to a file uploaded with the given transfer settings.
+
+    Single part uploads are tagged with the MD5 of the file, multipart uploads with
+    the MD5 of the concatenated part MD5s followed by the number of parts.
+
+    Args:
+        path (Path): Local file.
+        transfer (TransferConfig): Settings the file is uploaded with.
+
+    Returns:
+        str: Quoted ETag, as returned by head_object.
+    """
+    size = path.stat().st_size
+    if size < transfer.multipart_threshold:
+        part_size = max(size, 1)
+    else:
+        part_size = ChunksizeAdjuster().adjust_chunksize(transfer.multipart_chunksize, size)
+    parts = []
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(part_size), b""):
+            parts.append(hashlib.md5(chunk).digest())
+    if size < transfer.multipart_threshold:
+        return f'"{(parts[0] if parts else hashlib.md5().digest()).hex()}"'
+    return f'"{hashlib.md5(b"".join(parts)).hexdigest()}-{len(parts)}"'
+
+
+def upload_file(
+    s3_client, local_file_path: Path, bucket_name: str, s3_key: str, transfer: TransferConfig,
+    content_addressed: bool = False,
+) -> dict:
+    """Upload one file, unless the remote object already has the same content.
+
+    Args:
+        s3_client: The S3 client instance used to communicate with AWS S3.
+        local_file_path (Path): File to upload.
+        bucket_name (str): The name of the S3 bucket.
+        s3_key (str): Key of the uploaded object.
+        transfer (TransferConfig): Multipart settings of the upload.
+        content_addressed (bool): Whether the key is the digest of the content, so an
+            existing object is the same content and its ETag is not compared.
+
+    Returns:
+        dict: S3 URI, size in bytes, duration in seconds and whether the upload was skipped.
+    """
+    start = time.perf_counter()
+    size = local_file_path.stat().st_size
+    s3_uri = f"s3://{bucket_name}/{s3_key}"
+    try:
+        remote_etag = s3_client.head_object(Bucket=bucket_name, Key=s3_key)["ETag"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchKey", "NotFound"):
+            raise
+        remote_etag = None
+
+    skipped = remote_etag is not None and (content_addressed or remote_etag == local_etag(local_file_path, transfer))
+    if not skipped:
+        s3_client.upload_file(str(local_file_path), bucket_name, s3_key, Config=transfer)
+    return {"uri": s3_uri, "bytes": size, "seconds": time.perf_counter() - start, "skipped": skipped}
+
+
+def upload_files(files: List[Path], artifacts: Path, config: dict, s3_client=None) -> List[dict]:
+    """Upload files concurrently, keyed by their path relative to the artifacts directory.
+
+    Args:
+        files (List[Path]): Files to upload.
+        artifacts (Path): The local directory the S3 keys are relative to.
+        config (dict): Configuration including the bucket name, prefix and upload settings.
+        s3_client: Client shared by the upload threads. Defaults to a new pooled client.
+
+    Returns:
+        List[dict]: Upload report of every file, in the order of `files`.
 
     Raises:
-        NotImplementedError: If the upload fails.
+        NotImplementedError: If an upload fails.
     """
-    s3_client = boto3.client("s3")
-    bucket_name = config["bucket_name"]
     prefix = config.get("prefix", "")  # Using .get for safer access
+    keys = [f"{prefix}/{Path(local_file_path).relative_to(artifacts).as_posix()}" for local_file_path in files]
+    return _upload_all([Path(local_file_path) for local_file_path in files], keys, config, s3_client)
 
-    check_bucket_exists(bucket_name, s3_client)
 
-    s3_uris = []
-    for root, _, files in os.walk(artifacts):
-        for file in files:
-            local_file_path = Path(root) / file
-            s3_key = local_file_path.relative_to(artifacts).as_posix()
-            s3_uri = f"s3://{bucket_name}/{prefix}/{s3_key}"
+def _upload_all(files: List[Path], keys: List[str], config: dict, s3_client=None, content_addressed: bool = False) -> List[dict]:
+    """Upload every file to its key with a bounded pool of threads, see `upload_files`."""
+    s3_client = s3_client or create_client(config)
+    bucket_name = config["bucket_name"]
+    transfer = transfer_config(config)
 
+    reports = {}
+    with ThreadPoolExecutor(max_workers=config.get("max_workers", 8)) as pool:
+        futures = {
+            pool.submit(
+                upload_file, s3_client, local_file_path, bucket_name, key, transfer, content_addressed
+            ): local_file_path
+            for local_file_path, key in zip(files, keys)
+        }
+        for future in as_completed(futures):
+            local_file_path = futures[future]
             try:
-                with open(local_file_path, "rb") as file_data:
-                    s3_client.put_object(Bucket=bucket_name, Key=f"{prefix}/{s3_key}", Body=file_data)
-                    logger.info("Successfully uploaded '%s' to '%s'.", local_file_path, s3_uri)
+                report = future.result()
             except Exception as e:
-                logger.error("Failed to upload '%s' to '%s': %s", local_file_path, s3_uri, e)
+                logger.error("Failed to upload '%s': %s", local_file_path, e)
                 raise NotImplementedError from e
+            if report["skipped"]:
+                logger.info("Skipped '%s', '%s' is up to date.", local_file_path, report["uri"])
+            else:
+                logger.info(
+                    "Successfully uploaded '%s' to '%s' (%d bytes in %.3fs, %.2f MB/s).",
+                    local_file_path, report["uri"], report["bytes"], report["seconds"],
+                    report["bytes"] / MB / max(report["seconds"], 1e-9),
+                )
+            reports[local_file_path] = report
+
+    return [reports[local_file_path] for local_file_path in files]
+
+
+def blob_key(config: dict, digest: str) -> str:
+    """S3 key of a blob of the blob store, shared by every run."""
+    return f"{config.get('prefix', '')}/blobs/{digest[:2]}/{digest}"
+
+
+def upload_blobs(digests: List[str], store, config: dict, s3_client=None) -> List[dict]:
+    """Upload the blobs of a blob store the bucket does not have yet.
+
+    Blobs are keyed by their digest, so a blob already in the bucket, uploaded by
+    this run or any earlier one, is skipped after a single head_object call.
+
+    Args:
+        digests (List[str]): Digests of the blobs, as returned by `BlobStore.put`.
+        store (BlobStore): Local blob store holding the blobs.
+        config (dict): Configuration including the bucket name, prefix and upload settings.
+        s3_client: Client shared by the upload threads. Defaults to a new pooled client.
+
+    Returns:
+        List[dict]: Upload report of every distinct blob.
+
+    Raises:
+        NotImplementedError: If an upload fails.
+    """
+    digests = list(dict.fromkeys(digests))
+    keys = [blob_key(config, digest) for digest in digests]
+    return _upload_all([store.path(digest) for digest in digests], keys, config, s3_client, content_addressed=True)
+
+
+def upload_run(manifest: dict, store, config: dict, s3_client=None) -> List[str]:
+    """Upload a run ingested in a blob store: its missing blobs, then its manifest.
+
+    The manifest is written last, so every blob it refers to is in the bucket.
+
+    Args:
+        manifest (dict): Manifest written by `BlobStore.ingest`.
+        store (BlobStore): Local blob store holding the blobs of the run.
+        config (dict): Configuration including the bucket name, prefix and upload settings.
+        s3_client: Client used for the uploads. Defaults to a new pooled client.
+
+    Returns:
+        List[str]: S3 URIs of the blobs of the run and of its manifest.
+
+    Raises:
+        NotImplementedError: If an upload fails.
+    """
+    s3_client = s3_client or create_client(config)
+    start = time.perf_counter()
+    reports = upload_blobs([entry["digest"] for entry in manifest["files"].values()], store, config, s3_client)
+    key = f"{config.get('prefix', '')}/manifests/{manifest['run']}.json"
+    try:
+        s3_client.put_object(Bucket=config["bucket_name"], Key=key, Body=json.dumps(manifest, indent=2).encode())
+    except Exception as e:
+        logger.error("Failed to upload the manifest of run %s: %s", manifest["run"], e)
+        raise NotImplementedError from e
+    elapsed = time.perf_counter() - start
+    uploaded_bytes = sum(report["bytes"] for report in reports if not report["skipped"])
+    total_bytes = sum(entry["bytes"] for entry in manifest["files"].values())
+    logger.info(
+        "Uploaded run %s: %d of %d blobs (%d of %d bytes) in %.2fs.",
+        manifest["run"], sum(not report["skipped"] for report in reports), len(reports),
+        uploaded_bytes, total_bytes, elapsed,
+    )
+    return [report["uri"] for report in reports] + [f"s3://{config['bucket_name']}/{key}"]
+
+
+def upload_artifacts(artifacts: Path, config: dict, s3_client=None) -> List[str]:
+    """Uploads local files as artifacts to an AWS S3 bucket.
+
+    Files are uploaded by a bounded pool of threads sharing one client, large files
+    in parallel parts, and files whose content is already in the bucket are skipped.
+
+    Args:
+        artifacts (Path): The local directory containing files to upload.
+        config (dict): Configuration including the bucket name and prefix.
+        s3_client: Client used for the uploads. Defaults to a new pooled client.
+
+    Returns:
+        List[str]: A list of S3 URIs to the uploaded artifacts.
+
+    Raises:
+        NotImplementedError: If the upload fails.
+    """
+    s3_client = s3_client or create_client(config)
+    check_bucket_exists(config["bucket_name"], s3_client)
 
-            s3_uris.append(s3_uri)
+    files = [Path(root) / file for root, _, names in os.walk(artifacts) for file in names]
+    start = time.perf_counter()
+    reports = upload_files(files, Path(artifacts), config, s3_client)
+    elapsed = time.perf_counter() - start
 
-    return s3_uris
+    uploaded = [report for report in reports if not report["skipped"]]
+    uploaded_bytes = sum(report["bytes"] for report in uploaded)
+    logger.info(
+        "Uploaded %d of %d artifacts (%d bytes in %.2fs, %.2f MB/s).",
+        len(uploaded), len(reports), uploaded_bytes, elapsed, uploaded_bytes / MB / max(elapsed, 1e-9),
+    )
+    return [report["uri"] for report in reports]
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import shutil
+import stat
+import threading
+from pathlib import Path
+from typing import Optional
+
+from src.stage_cache import file_digest
+
+logger = logging.getLogger("clouds")
+
+MANIFEST = "manifest.json"
+
+
+class BlobStore:
+    """Local store of files addressed by the SHA-256 digest of their content.
+
+    Every file of a run is written once to `root/<digest[:2]>/<digest>`, and the
+    file of the run directory is replaced by a hardlink to the blob, so runs
+    whose artifacts did not change share them on disk. Blobs are made read-only:
+    a file of an ingested run must be replaced, not rewritten in place, which
+    `detach` does before a run is written to again. The `manifest.json` of a run
+    maps every file to its digest, so the run can be restored from the store,
+    and uploaded as the blobs the bucket does not have yet.
+
+    When the store and the run are on different filesystems, blobs are copies
+    and the files of the run are left as they are.
+    """
+
+    def __init__(self, root: str = ".cache/blobs"):
+        self.root = Path(root)
+        # Digests of the inodes already hashed by this process, so linked files are not hashed again
+        self._digests: dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self.added_bytes = 0
+
+    def path(self, digest: str) -> Path:
+        """Path of the blob of a digest."""
+        return self.root / digest[:2] / digest
+
+    def put(self, path: Path) -> str:
+        """Add a file to the store and replace it with a hardlink to its blob.
+
+        Args:
+            path (Path): File to add.
+
+        Returns:
+            str: Digest of the file content.
+        """
+        path = Path(path)
+        info = path.stat()
+        digest = self._digests.get(_identity(info)) or file_digest(path)
+        blob = self.path(digest)
+        temporary = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            staging = blob.with_name(digest + temporary)
+            try:
+                # The blob takes the inode of the file: nothing is copied
+                os.link(path, staging)
+            except OSError:
+                shutil.copyfile(path, staging)
+            os.chmod(staging, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(staging, blob)
+            with self._lock:
+                self.added_bytes += info.st_size
+        if not os.path.samefile(path, blob):
+            staging = path.with_name(path.name + temporary)
+            try:
+                os.link(blob, staging)
+                os.replace(staging, path)
+            except OSError as e:
+                logger.debug("Keeping %s as a copy of blob %s: %s", path, digest[:12], e)
+        with self._lock:
+            self._digests[_identity(blob.stat())] = digest
+        return digest
+
+    def ingest(self, run_dir: Path) -> dict:
+        """Add every file of a run to the store and write the manifest of the run.
+
+        Args:
+            run_dir (Path): Run directory.
+
+        Returns:
+            dict: The manifest: the run name and the digest and size of every file, by relative path.
+        """
+        run_dir = Path(run_dir)
+        files = {}
+        added = self.added_bytes
+        for path in sorted(run_dir.rglob("*")):
+            if path.is_file() and path.name != MANIFEST:
+                digest = self.put(path)
+                files[path.relative_to(run_dir).as_posix()] = {"digest": digest, "bytes": path.stat().st_size}
+        manifest = {"run": run_dir.name, "files": files}
+        (run_dir / MANIFEST).write_text(json.dumps(manifest, indent=2))
+        total = sum(entry["bytes"] for entry in files.values())
+        logger.info(
+            "Run %s added to the blob store: %d files, %d of %d bytes new",
+            run_dir.name, len(files), self.added_bytes - added, total,
+        )
+        return manifest
+
+    def detach(self, run_dir: Path) -> int:
+        """Give the files of an ingested run their own copy, before they are written to again.
+
+        Args:
+            run_dir (Path): Run directory.
+
+        Returns:
+            int: Number of files copied out of the store.
+        """
+        run_dir = Path(run_dir)
+        if not (run_dir / MANIFEST).exists():
+            return 0
+        copied = 0
+        for path in run_dir.rglob("*"):
+            if path.is_file() and path.name != MANIFEST and path.stat().st_nlink > 1:
+                staging = path.with_name(path.name + f".{os.getpid()}.tmp")
+                shutil.copyfile(path, staging)
+                os.replace(staging, path)
+                copied += 1
+        # The manifest no longer describes the run once it is written to
+        (run_dir / MANIFEST).unlink()
+        logger.info("Detached %d files of run %s from the blob store", copied, run_dir.name)
+        return copied
+
+    def materialize(self, manifest: dict, destination: Path) -> list[Path]:
+        """Restore the files of a run from the store, as hardlinks to their blobs.
+
+        Args:
+            manifest (dict): Manifest written by `ingest`.
+            destination (Path): Directory the files are restored into.
+
+        Returns:
+            list[Path]: Paths of the restored files.
+
+        Raises:
+            NotImplementedError: If a blob of the manifest is missing from the store.
+        """
+        paths = []
+        for relative, entry in manifest["files"].items():
+            blob = self.path(entry["digest"])
+            if not blob.exists():
+                logger.error("Blob %s of %s is missing from the blob store", entry["digest"][:12], relative)
+                raise NotImplementedError(f"Blob of {relative} is missing from the blob store")
+            target = Path(destination) / relative
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.unlink(missing_ok=True)
+            try:
+                os.link(blob, target)
+            except OSError:
+                shutil.copyfile(blob, target)
+            paths.append(target)
+        return paths
+
+    def prune(self, runs_dir: Optional[Path] = None, keep: Optional[set] = None) -> int:
+        """Delete the blobs no manifest refers to.
+
+        Args:
+            runs_dir (Optional[Path]): Directory of the run directories whose manifests are kept.
+            keep (Optional[set]): Further digests to keep.
+
+        Returns:
+            int: Bytes freed.
+        """
+        referenced = set(keep or ())
+        if runs_dir is not None:
+            for manifest in Path(runs_dir).glob(f"*/{MANIFEST}"):
+                referenced.update(entry["digest"] for entry in json.loads(manifest.read_text())["files"].values())
+        freed = 0
+        for blob in self.root.glob("*/*"):
+            if blob.name not in referenced and not blob.name.endswith(".tmp"):
+                freed += blob.stat().st_size
+                blob.unlink()
+        logger.info("Pruned %d bytes of blobs from %s", freed, self.root)
+        return freed
+
+
+def _identity(info: os.stat_result) -> tuple:
+    """Inode, size and modification time of a file, to recognize a file already hashed."""
+    return info.st_dev, info.st_ino, info.st_size, info.st_mtime_ns
+
+
+def create_store(config: dict) -> Optional[BlobStore]:
+    """Blob store of the `blob_store` configuration, None when it is disabled."""
+    if not config.get("enabled", False):
+        return None
+    return BlobStore(config.get("root", ".cache/blobs"))
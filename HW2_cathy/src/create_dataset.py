@@ -1,102 +1,231 @@
+import csv
 import logging
 from pathlib import Path
+from typing import Iterator
 import pandas as pd
 import numpy as np
 
+from src.artifact_io import save_frame
+
 logger = logging.getLogger("clouds")
 
+# Clouds in the order they are stacked in the clean dataset; the position is the class label
+CLOUDS = ["first_cloud", "second_cloud"]
 
-def create_dataset(path_of_raw: Path, config: dict) -> pd.DataFrame:
-    """Create pandas dataframe from path
+
+def _cloud_rows(config: dict) -> list[tuple[str, int, int]]:
+    """List the configured row range of every cloud
     Args:
-        Args:
-        path_of_raw (Path): the path where raw data is
         config (dict): config file for dataset creation
 
     Returns:
-        pd.Dataframe: clean dataset
+        list[tuple[str, int, int]]: cloud name, left and right line index of every cloud
     """
-    # Dataset column names
-    columns = config["data"]["columns"]
-    with open(path_of_raw, "r") as f:
-        data = [[s for s in line.split(" ") if s != ""] for line in f.readlines()]
-
-    # Select first cloud
-    first_cloud_data_left = config["data_prep"]["first_cloud"]["left"]
-    first_cloud_data_right = config["data_prep"]["first_cloud"]["right"]
+    return [
+        (cloud, config["data_prep"][cloud]["left"], config["data_prep"][cloud]["right"])
+        for cloud in CLOUDS
+    ]
 
-    if len(data[first_cloud_data_left]) != len(columns):
-        logger.warning(
-            "The %sth row of the first dataset does not have the same number of values as the columns",
-            first_cloud_data_left,
-        )
 
-    if len(data[first_cloud_data_right - 1]) != len(columns):
-        logger.warning(
-            "The %sth row of the first dataset does not have the same number of values as the columns",
-            first_cloud_data_right,
-        )
+def read_cloud(
+    path_of_raw: Path, left: int, right: int, columns: list, chunksize: int
+) -> Iterator[np.ndarray]:
+    """Stream the lines [left, right) of the raw file as float64 blocks
+    Args:
+        path_of_raw (Path): the path where raw data is
+        left (int): index of the first line of the cloud
+        right (int): index one past the last line of the cloud
+        columns (list): names of the values on every line
+        chunksize (int): maximum number of lines parsed at once
 
-    first_cloud = data[first_cloud_data_left:first_cloud_data_right]
+    Yields:
+        np.ndarray: float64 array of shape (lines in chunk, len(columns))
+    """
+    if right <= left:
+        return
+    # Lines before `left` are skipped by the C tokenizer without being parsed. Blank
+    # lines are kept so that line numbers match the config, and "round_trip" parses
+    # every token exactly like `float` does.
+    reader = pd.read_csv(
+        path_of_raw,
+        sep=r"\s+",
+        header=None,
+        names=columns,
+        index_col=False,
+        skiprows=left,
+        nrows=right - left,
+        chunksize=chunksize,
+        dtype=np.float64,
+        float_precision="round_trip",
+        quoting=csv.QUOTE_NONE,
+        skip_blank_lines=False,
+    )
     try:
-        first_cloud = [
-            [float(s.replace("/n", "")) for s in cloud] for cloud in first_cloud
-        ]
-    except ValueError as e:
+        with reader:
+            for chunk in reader:
+                yield chunk.to_numpy(dtype=np.float64, copy=False)
+    except (ValueError, pd.errors.ParserError) as e:
         logger.error(e)
         raise NotImplementedError from e
 
-    first_cloud = pd.DataFrame(first_cloud, columns=columns)
-    first_cloud["class"] = np.zeros(len(first_cloud))
-
-    # Select second cloud
-    second_cloud_data_left = config["data_prep"]["second_cloud"]["left"]
-    second_cloud_data_right = config["data_prep"]["second_cloud"]["right"]
 
-    if len(data[second_cloud_data_left]) != len(columns):
+def _check_cloud(values: np.ndarray, cloud: str, left: int, right: int, offset: int) -> None:
+    """Validate a block of parsed lines of a cloud
+    Args:
+        values (np.ndarray): parsed values of the block
+        cloud (str): name of the cloud in the config
+        left (int): index of the first line of the cloud
+        right (int): index one past the last line of the cloud
+        offset (int): position of the block within the cloud
+
+    Raises:
+        NotImplementedError: If a line of the block has no values
+    """
+    if len(values) == 0:
+        return
+    missing = np.isnan(values)
+    # A line without any value (blank line, or separator) cannot be converted
+    empty = missing.all(axis=1)
+    if empty.any():
+        message = f"Line {left + offset + int(np.argmax(empty))} of the {cloud} has no values"
+        logger.error(message)
+        raise NotImplementedError(message)
+    if offset == 0 and missing[0].any():
         logger.warning(
-            "The %sth row of the second dataset does not have the same number of values as the columns",
-            second_cloud_data_left,
+            "The %sth row of the %s does not have the same number of values as the columns",
+            left,
+            cloud,
         )
-
-    if len(data[second_cloud_data_right - 1]) != len(columns):
+    if left + offset + len(values) == right and missing[-1].any():
         logger.warning(
-            "The %sth row of the second dataset does not have the same number of values as the columns",
-            second_cloud_data_right,
+            "The %sth row of the %s does not have the same number of values as the columns",
+            right,
+            cloud,
         )
 
-    second_cloud = data[second_cloud_data_left:second_cloud_data_right]
-    try:
-        second_cloud = [
-            [float(s.replace("/n", "")) for s in cloud] for cloud in second_cloud
-        ]
-    except ValueError as e:
-        logger.error(e)
-        raise NotImplementedError from e
-    second_cloud = pd.DataFrame(second_cloud, columns=columns)
-    second_cloud["class"] = np.ones(len(second_cloud))
 
-    # Create final
-    data = pd.concat([first_cloud, second_cloud])
+def _compact(values: np.ndarray, cloud: str, left: int, offset: int) -> np.ndarray:
+    """Cast a block of parsed lines of a cloud to float32, for the low-memory mode
+    Args:
+        values (np.ndarray): parsed float64 values of the block
+        cloud (str): name of the cloud in the config
+        left (int): index of the first line of the cloud
+        offset (int): position of the block within the cloud
+
+    Returns:
+        np.ndarray: float32 values of the block
+
+    Raises:
+        NotImplementedError: If a value is out of the float32 range
+    """
+    with np.errstate(over="ignore"):
+        compact = values.astype(np.float32)
+    overflow = np.isinf(compact) & np.isfinite(values)
+    if overflow.any():
+        message = (
+            f"Line {left + offset + int(np.argmax(overflow.any(axis=1)))} of the {cloud} has values "
+            "out of the float32 range, set low_memory to False"
+        )
+        logger.error(message)
+        raise NotImplementedError(message)
+    return compact
+
+
+def iter_dataset(path_of_raw: Path, config: dict) -> Iterator[pd.DataFrame]:
+    """Stream the clean dataset in blocks of at most `chunksize` rows
+    Args:
+        path_of_raw (Path): the path where raw data is
+        config (dict): config file for dataset creation
+
+    Yields:
+        pd.DataFrame: block of the clean dataset, with the class column
+    """
+    columns = config["data"]["columns"]
+    chunksize = config["data"]["import"].get("chunksize", 100_000)
+    low_memory = config.get("low_memory", False)
+    for label, (cloud, left, right) in enumerate(_cloud_rows(config)):
+        offset = 0
+        for values in read_cloud(path_of_raw, left, right, columns, chunksize):
+            _check_cloud(values, cloud, left, right, offset)
+            if low_memory:
+                values = _compact(values, cloud, left, offset)
+            offset += len(values)
+            block = pd.DataFrame(values, columns=columns, copy=False)
+            block["class"] = np.full(len(block), label, dtype=np.int8 if low_memory else np.float64)
+            yield block
+
+
+def create_dataset(path_of_raw: Path, config: dict) -> pd.DataFrame:
+    """Create pandas dataframe from path
+    Args:
+        path_of_raw (Path): the path where raw data is
+        config (dict): config file for dataset creation
+
+    Returns:
+        pd.Dataframe: clean dataset
+    """
+    # Dataset column names
+    columns = config["data"]["columns"]
+    chunksize = config["data"]["import"].get("chunksize", 100_000)
+    clouds = _cloud_rows(config)
+    low_memory = config.get("low_memory", False)
+
+    # Every chunk is written straight into one float64 block holding all clouds and the
+    # class column, so the text is never held in memory as Python objects. In low-memory
+    # mode the block is float32, and the class is an int8 column of its own.
+    n_rows = sum(max(right - left, 0) for _, left, right in clouds)
+    block = np.empty(
+        (n_rows, len(columns) + (not low_memory)),
+        dtype=np.float32 if low_memory else np.float64,
+    )
+    labels = np.empty(n_rows, dtype=np.int8) if low_memory else block[:, -1]
+    index = []
+    filled = 0
+    for label, (cloud, left, right) in enumerate(clouds):
+        start = filled
+        for values in read_cloud(path_of_raw, left, right, columns, chunksize):
+            _check_cloud(values, cloud, left, right, filled - start)
+            if low_memory:
+                values = _compact(values, cloud, left, filled - start)
+            block[filled : filled + len(values), : len(columns)] = values
+            filled += len(values)
+        labels[start:filled] = label
+        if not low_memory:
+            # Keep the per-cloud index produced by concatenating the clouds
+            index.append(np.arange(filled - start))
+
+    if low_memory:
+        # A RangeIndex holds no array, unlike the per-cloud index
+        data = pd.DataFrame(block[:filled], columns=columns, copy=False)
+        data["class"] = labels[:filled]
+    else:
+        data = pd.DataFrame(
+            block[:filled],
+            columns=columns + ["class"],
+            index=pd.Index(np.concatenate(index)),
+            copy=False,
+        )
 
     logger.info("Clean dataset created")
 
     return data
 
 
-def save_dataset(data: pd.DataFrame, path_of_clean: Path) -> None:
-    """Save dataframe to csv in path
+def save_dataset(data: pd.DataFrame, path_of_clean: Path, fmt: str = "csv") -> Path:
+    """Save dataframe to path in the given artifact format
     Args:
-        Args:
         data (pd.Dataframe): pandas dataframe to save
-        path_of_clean (Path): paht to save cleaned dataset
+        path_of_clean (Path): path to save cleaned dataset, its suffix is set by `fmt`
+        fmt (str): csv, or parquet, feather or npy for fast binary artifacts
 
     Returns:
-        None
+        Path: path the dataset was saved to
     """
     try:
-        data.to_csv(path_of_clean)
-        logger.info("Saved dataset to %s", path_of_clean)
+        # The per-cloud index carries no information and is not saved
+        path = save_frame(data, path_of_clean, fmt)
+        logger.info("Saved dataset to %s", path)
     except Exception as e:
         logger.error("Failed to save dataset due to: %s", e)
         raise NotImplementedError from e
+    return path
@@ -5,6 +5,9 @@ import yaml
 import pandas as pd
 import numpy as np
 
+from src.artifact_io import iter_frame
+from src.metrics_engine import FUSED_METRICS, MetricsAccumulator
+
 logger = logging.getLogger("clouds")
 
 
@@ -20,22 +23,85 @@ def numpy_to_native(obj):
 def evaluate_performance(
     test: pd.DataFrame, scores: pd.DataFrame, config: dict
 ) -> dict:
-   
+    """Compute the configured metrics of the scores of the test set.
+
+    Metrics in FUSED_METRICS are all derived from one pass over the scores by
+    the metrics engine; the others are called from `metrics_lib`.
+
+    Args:
+        test (pd.DataFrame): Test set holding the actual classes.
+        scores (pd.DataFrame): Predicted probabilities of the positive class and predicted classes.
+        config (dict): Target column, metrics library and metric names.
+
+    Returns:
+        dict: Value of every metric, as native Python types.
+    """
     y_test = test[config["target"]]
-    metrics_lib = import_module(config["metrics_lib"])
+    engine = MetricsAccumulator(config.get("score_decimals")).update(y_test, scores[0], scores[1])
+    metrics_lib = None
     metric_dict = {}
     for metric in config["metrics"]:
-        metric_type = getattr(metrics_lib, metric)
-        if metric == "roc_auc_score":
-            value = metric_type(y_test, scores[0])
+        if metric in FUSED_METRICS:
+            value = engine.metric(metric)
         else:
-            value = metric_type(y_test, scores[1])
+            metrics_lib = metrics_lib or import_module(config["metrics_lib"])
+            metric_type = getattr(metrics_lib, metric)
+            if metric == "roc_auc_score":
+                value = metric_type(y_test, scores[0])
+            else:
+                value = metric_type(y_test, scores[1])
         metric_dict[metric] = numpy_to_native(value)
 
     logger.info("Dic with metrics created")
     return metric_dict
 
 
+def evaluate_files(test_path: Path, scores_path: Path, config: dict, chunksize: int = 100_000) -> dict:
+    """Compute the configured metrics of a scores file, block by block.
+
+    The test set and the scores are read in blocks of `chunksize` rows and
+    accumulated by the metrics engine, so neither has to fit in memory.
+
+    Args:
+        test_path (Path): Artifact holding the actual classes, row for row with the scores.
+        scores_path (Path): Artifact with the Probability and Class columns written by the scoring.
+        config (dict): Target column, metric names and the decimals scores are rounded to.
+        chunksize (int): Rows read at once.
+
+    Returns:
+        dict: Value of every metric, as native Python types.
+
+    Raises:
+        NotImplementedError: If a metric is not supported by the metrics engine,
+            or the files do not have the same number of rows.
+    """
+    unsupported = [metric for metric in config["metrics"] if metric not in FUSED_METRICS]
+    if unsupported:
+        logger.error("Metrics %s cannot be computed block by block", unsupported)
+        raise NotImplementedError(f"Metrics {unsupported} cannot be computed block by block")
+
+    engine = MetricsAccumulator(config.get("score_decimals"))
+    truth = iter_frame(test_path, [config["target"]], chunksize)
+    pending = np.empty(0)
+    for block in iter_frame(scores_path, ["Probability", "Class"], chunksize):
+        # Blocks of both files may not line up, the actual classes are buffered until they do
+        while len(pending) < len(block):
+            chunk = next(truth, None)
+            if chunk is None:
+                logger.error("%s has fewer rows than %s", test_path, scores_path)
+                raise NotImplementedError(f"{test_path} has fewer rows than {scores_path}")
+            pending = np.concatenate([pending, chunk[config["target"]].to_numpy()])
+        y_true, pending = pending[:len(block)], pending[len(block):]
+        engine.update(y_true, block["Probability"].to_numpy(), block["Class"].to_numpy())
+    if len(pending) or next(truth, None) is not None:
+        logger.error("%s has more rows than %s", test_path, scores_path)
+        raise NotImplementedError(f"{test_path} has more rows than {scores_path}")
+
+    metrics = {metric: numpy_to_native(engine.metric(metric)) for metric in config["metrics"]}
+    logger.info("Metrics of %d rows of %s computed", engine.n_rows, scores_path)
+    return metrics
+
+
 def save_metrics(metrics: dict, path: Path) -> None:
 
     try:
@@ -0,0 +1,137 @@
+import logging
+import pickle
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+from src.generate_features import FeaturePlan
+
+logger = logging.getLogger("clouds")
+
+
+class FeatureTransform:
+    """The features a model uses, computed from raw columns, saved next to the model.
+
+    The fitted feature plan is pruned to the nodes the model features depend
+    on, and flattened into a list of kernel calls on NumPy arrays, so rows are
+    scored from raw records without building a DataFrame or computing the
+    features the model does not use.
+    """
+
+    def __init__(self, plan: FeaturePlan, features: list[str]):
+        """Prune a fitted plan to the given features.
+
+        Args:
+            plan (FeaturePlan): Fitted plan of the feature_eng config.
+            features (list[str]): Features of the model, in its order: targets of the plan or raw columns.
+
+        Raises:
+            NotImplementedError: If the plan is not fitted.
+        """
+        if not plan.fitted:
+            logger.error("The feature plan must be fitted before it is saved with the model")
+            raise NotImplementedError("The feature plan must be fitted before it is saved with the model")
+        self.features = list(features)
+        roots = {}
+        for feature in self.features:
+            # Like in generate_features, a target shadows the raw column of the same name
+            roots[feature] = plan.targets.get(feature, ("column", feature))
+
+        needed = set()
+        stack = [root for root in roots.values() if isinstance(root, int)]
+        while stack:
+            node_id = stack.pop()
+            if node_id not in needed:
+                needed.add(node_id)
+                function, payload = plan.nodes[node_id]
+                if function is not None:
+                    stack.extend(payload)
+
+        # Raw columns come first, then the kernels in the order of the plan, which is topological
+        self.columns: list[str] = []
+        column_slots: dict[str, int] = {}
+        for name in [plan.nodes[i][1] for i in sorted(needed) if plan.nodes[i][0] is None] + [
+            root[1] for root in roots.values() if not isinstance(root, int)
+        ]:
+            if name not in column_slots:
+                column_slots[name] = len(self.columns)
+                self.columns.append(name)
+        slots = {("column", name): slot for name, slot in column_slots.items()}
+        self.steps: list[tuple] = []  # (function, input slots, fitted state, dtype)
+        for node_id in sorted(needed):
+            function, payload = plan.nodes[node_id]
+            if function is None:
+                slots[node_id] = column_slots[payload]
+            else:
+                operation = plan.operations[node_id]
+                self.steps.append((function, tuple(slots[i] for i in payload), plan.state.get(node_id, {}), operation.dtype))
+                slots[node_id] = len(self.columns) + len(self.steps) - 1
+        self.outputs = [slots[root] for root in roots.values()]
+
+    def transform(self, x: np.ndarray) -> np.ndarray:
+        """Compute the model features of raw rows.
+
+        Args:
+            x (np.ndarray): Raw rows, of shape (n_rows, len(columns)), in the order of `columns`.
+
+        Returns:
+            np.ndarray: float64 features of shape (n_rows, len(features)), in the order of the model.
+        """
+        x = np.asarray(x, dtype=np.float64).reshape(-1, len(self.columns))
+        values = [x[:, i] for i in range(len(self.columns))]
+        with np.errstate(all="ignore"):
+            for function, inputs, state, dtype in self.steps:
+                value = function(*(values[i] for i in inputs), **state)
+                values.append(value if dtype is None else np.asarray(value).astype(dtype, copy=False))
+        out = np.empty((len(x), len(self.outputs)), dtype=np.float64)
+        for column, slot in enumerate(self.outputs):
+            out[:, column] = values[slot]
+        return out
+
+    def transform_row(self, row: Sequence[float]) -> np.ndarray:
+        """Compute the model features of one raw record.
+
+        Args:
+            row (Sequence[float]): Raw values, in the order of `columns`.
+
+        Returns:
+            np.ndarray: Array of shape (1, len(features)), ready to be scored.
+        """
+        return self.transform(np.asarray(row, dtype=np.float64)[np.newaxis])
+
+
+def save_transform(transform: FeatureTransform, path: Path) -> Path:
+    """Save a feature transform, next to its model.
+
+    Args:
+        transform (FeatureTransform): Transform of the model features.
+        path (Path): Path of the transform binary.
+
+    Returns:
+        Path: Path the transform was saved to.
+    """
+    with open(path, "wb") as file:
+        pickle.dump(transform, file, protocol=pickle.HIGHEST_PROTOCOL)
+    logger.info("Feature transform of %s saved to %s", transform.features, path)
+    return Path(path)
+
+
+def load_transform(path: Path) -> FeatureTransform:
+    """Load a feature transform saved with `save_transform`.
+
+    Args:
+        path (Path): Path of the transform binary.
+
+    Returns:
+        FeatureTransform: The transform.
+
+    Raises:
+        NotImplementedError: If the transform cannot be loaded.
+    """
+    try:
+        with open(path, "rb") as file:
+            return pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError) as e:
+        logger.error("Failed to load feature transform from %s due to %s", path, e)
+        raise NotImplementedError from e
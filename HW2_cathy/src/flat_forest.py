@@ -0,0 +1,204 @@
+import logging
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+logger = logging.getLogger("clouds")
+
+ARRAYS = ["feature", "threshold", "left", "right", "value", "roots", "classes", "n_features"]
+
+
+class FlatForest:
+    """A fitted forest of decision trees flattened into contiguous node arrays.
+
+    The nodes of every tree are stored one after the other: the feature and
+    threshold of every split, the global indices of its children and the class
+    probabilities of every leaf, normalized as in `predict_proba`. Leaves point
+    to themselves, so every row takes one step per level of the deepest tree
+    without a leaf test. Rows are cast to float32 before they are compared, as
+    sklearn does, so the probabilities are the same as the ones of the forest.
+
+    Batches are scored with vectorized NumPy steps, all trees at once. Single
+    rows take a pure Python path over lists of the arrays, without the input
+    validation and the dispatch across trees of sklearn.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+        self.depth = self._depth()
+        self._lists = None
+
+    @classmethod
+    def from_model(cls, model: object) -> "FlatForest":
+        """Flatten a fitted forest, or a single decision tree, of sklearn.
+
+        Args:
+            model (object): Fitted RandomForestClassifier, ExtraTreesClassifier or DecisionTreeClassifier.
+
+        Returns:
+            FlatForest: The flattened forest.
+
+        Raises:
+            NotImplementedError: If the model is not a fitted tree classifier.
+        """
+        trees = [model] if hasattr(model, "tree_") else getattr(model, "estimators_", None)
+        if not trees or not all(hasattr(tree, "tree_") for tree in trees) or not hasattr(model, "classes_") \
+                or np.ndim(model.classes_) != 1:
+            logger.error("%s is not a fitted single-output tree classifier, it cannot be flattened", type(model).__name__)
+            raise NotImplementedError(f"{type(model).__name__} cannot be flattened")
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            tree = tree.tree_
+            n_nodes = tree.node_count
+            nodes = np.arange(offset, offset + n_nodes)
+            leaf = tree.children_left == -1
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            left.append(np.where(leaf, nodes, tree.children_left + offset))
+            right.append(np.where(leaf, nodes, tree.children_right + offset))
+            # The normalization of DecisionTreeClassifier.predict_proba, applied once to every node
+            proba = tree.value[:, 0, : len(model.classes_)].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value.append(proba / normalizer)
+            roots.append(offset)
+            offset += n_nodes
+        return cls(
+            np.concatenate(feature).astype(np.int32),
+            np.concatenate(threshold).astype(np.float64),
+            np.concatenate(left).astype(np.int32),
+            np.concatenate(right).astype(np.int32),
+            np.concatenate(value).astype(np.float64),
+            np.asarray(roots, dtype=np.int32),
+            np.asarray(model.classes_),
+            trees[0].n_features_in_,
+        )
+
+    def _depth(self) -> int:
+        """Number of steps from the roots to the deepest leaf."""
+        node = self.roots.copy()
+        depth = 0
+        while len(node):
+            node = node[self.left[node] != node]
+            node = np.concatenate([self.left[node], self.right[node]])
+            depth += len(node) > 0
+        return depth
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    def apply(self, x: np.ndarray) -> np.ndarray:
+        """Leaf reached by every row in every tree.
+
+        Args:
+            x (np.ndarray): Rows of shape (n_rows, n_features).
+
+        Returns:
+            np.ndarray: Global leaf indices of shape (n_rows, n_trees).
+        """
+        x = np.asarray(x, dtype=np.float32)
+        node = np.repeat(self.roots[np.newaxis], len(x), axis=0)
+        rows = np.arange(len(x))[:, np.newaxis]
+        for _ in range(self.depth):
+            # float32 values compared with float64 thresholds, as in the trees of sklearn
+            go_left = x[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict_proba(self, x, block_size: int = 65536) -> np.ndarray:
+        """Class probabilities of a batch of rows, the mean over the trees.
+
+        Args:
+            x: Rows of shape (n_rows, n_features), in the order of the features the forest was fitted on.
+            block_size (int): Rows traversed at once, to bound the memory of the node indices.
+
+        Returns:
+            np.ndarray: Probabilities of shape (n_rows, n_classes).
+        """
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.n_features_in_)
+        proba = np.zeros((len(x), len(self.classes_)))
+        for start in range(0, len(x), block_size):
+            leaves = self.apply(x[start:start + block_size])
+            out = proba[start:start + block_size]
+            # Trees are summed one after the other, in the order of the forest, as sklearn does
+            for tree in range(leaves.shape[1]):
+                out += self.value[leaves[:, tree]]
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, x) -> np.ndarray:
+        """Class of the highest probability of every row."""
+        return self.classes_.take(np.argmax(self.predict_proba(x), axis=1))
+
+    def predict_row(self, row: Sequence[float]) -> list[float]:
+        """Class probabilities of one row, without NumPy calls per node.
+
+        Args:
+            row (Sequence[float]): Values of the features the forest was fitted on.
+
+        Returns:
+            list[float]: Probability of every class.
+        """
+        if self._lists is None:
+            self._lists = (self.feature.tolist(), self.threshold.tolist(), self.left.tolist(),
+                           self.right.tolist(), self.value.tolist(), self.roots.tolist())
+        feature, threshold, left, right, value, roots = self._lists
+        row = np.asarray(row, dtype=np.float32).tolist()
+        proba = [0.0] * len(self.classes_)
+        for node in roots:
+            while left[node] != node:
+                node = left[node] if row[feature[node]] <= threshold[node] else right[node]
+            leaf = value[node]
+            for k in range(len(proba)):
+                proba[k] += leaf[k]
+        return [p / len(roots) for p in proba]
+
+    def save(self, directory: Path) -> list[Path]:
+        """Save the node arrays as npy files, to be memory-mapped by `load`.
+
+        Args:
+            directory (Path): Directory of the arrays, created if needed.
+
+        Returns:
+            list[Path]: Paths of the arrays.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        attributes = {"classes": "classes_", "n_features": "n_features_in_"}
+        paths = []
+        for name in ARRAYS:
+            paths.append(directory / f"{name}.npy")
+            np.save(paths[-1], getattr(self, attributes.get(name, name)))
+        logger.info("Flattened forest of %d trees and %d nodes saved to %s", len(self.roots), len(self.feature), directory)
+        return paths
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "FlatForest":
+        """Load a forest saved with `save`.
+
+        Args:
+            directory (Path): Directory of the arrays.
+            mmap (bool): Whether to memory-map the arrays read-only rather than read them.
+
+        Returns:
+            FlatForest: The forest.
+
+        Raises:
+            NotImplementedError: If the arrays cannot be loaded.
+        """
+        try:
+            arrays = [np.load(Path(directory) / f"{name}.npy", mmap_mode="r" if mmap else None) for name in ARRAYS]
+        except (OSError, ValueError) as e:
+            logger.error("Failed to load flattened forest from %s due to %s", directory, e)
+            raise NotImplementedError from e
+        return cls(*arrays)
@@ -1,63 +1,446 @@
+import inspect
 import logging
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
 import pandas as pd
 import numpy as np
 
+from src.artifact_io import FrameWriter
+
 logger = logging.getLogger("clouds")
 
+# Keys of a feature_eng entry that are not parameters of its operation
+ENTRY_KEYS = {"operation", "target", "source1", "source2"}
 
-def recursive_operation(operation: dict, features: pd.DataFrame) -> pd.Series:
-    """Create features
+
+class Operation(NamedTuple):
+    """A feature_eng operation: a vectorized kernel and what the plan needs to know about it."""
+
+    kernel: Callable  # Called with the source arrays and the parameters (or fitted state)
+    arity: int  # Number of sources
+    dtype: Optional[type]  # dtype of the result, None when it follows the sources
+    elementwise: bool  # Whether every value only depends on the same row of the sources
+    fit: Optional[Callable]  # Called with the source arrays and the parameters, returns the kernel state
+
+
+# Operations of the feature_eng config, by name
+OPERATIONS: dict[str, Operation] = {}
+
+
+def register_operation(name: str, arity: int, dtype: Optional[type] = None, elementwise: bool = True,
+                       fit: Optional[Callable] = None) -> Callable:
+    """Register a kernel as a feature_eng operation
     Args:
-        operation (dict): dictionary of operations to complete
-        features (pd.DataFrame): feature dataframe to augment
+        name (str): name of the operation in the config
+        arity (int): number of sources, given as source1 and source2
+        dtype (Optional[type]): dtype of the result, None when it follows the sources
+        elementwise (bool): whether every value only depends on the same row of the sources,
+            so the operation can be evaluated block by block
+        fit (Optional[Callable]): for operations with fitted statistics, called once with the
+            sources and the parameters of the entry; the state it returns is passed to the kernel
 
     Returns:
-        pd.Series: series with complete operation values
+        Callable: decorator registering the kernel
     """
-    if isinstance(operation, str):
-        return features[operation]
-    curr_op = operation["operation"]
-    try:
-        source1 = recursive_operation(operation["source1"], features)
-        source2 = recursive_operation(operation["source2"], features)
-    except KeyError:
-        source1 = recursive_operation(operation["source1"], features)
-
-    if curr_op == "apply":
-        function = getattr(np, operation["function"])
-        return source1.apply(function)
-    elif curr_op == "multiply":
-        return source1.multiply(source2)
-    elif curr_op == "subtract":
-        return source1.subtract(source2)
-    elif curr_op == "divide":
-        return source1.divide(source2)
-    elif curr_op == "add":
-        return source1.add(source2)
-    else:
-        logger.error("Invalid operation %s supplied.", curr_op)
-        raise NotImplementedError
-
-
-def generate_features(data: pd.DataFrame, config: dict) -> pd.DataFrame:
+    def decorator(kernel: Callable) -> Callable:
+        OPERATIONS[name] = Operation(kernel, arity, dtype, elementwise, fit)
+        return kernel
+    return decorator
+
+
+for _name, _ufunc in {"multiply": np.multiply, "subtract": np.subtract, "divide": np.divide, "add": np.add}.items():
+    register_operation(_name, 2)(_ufunc)
+
+
+@register_operation("apply", 1)
+def apply(x: np.ndarray, function: str) -> np.ndarray:
+    """Any NumPy function of one array, by name."""
+    return getattr(np, function)(x)
+
+
+@register_operation("clip", 1)
+def clip(x: np.ndarray, lower: Optional[float] = None, upper: Optional[float] = None) -> np.ndarray:
+    """Values limited to [lower, upper]."""
+    return np.clip(x, lower, upper)
+
+
+@register_operation("rolling_mean", 1, dtype=np.float64, elementwise=False)
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """Mean of every value and the `window - 1` values before it, in the row order."""
+    return pd.Series(x).rolling(window, min_periods=1).mean().to_numpy()
+
+
+def _fit_standardize(x: np.ndarray) -> dict:
+    finite = x[np.isfinite(x)]
+    scale = float(finite.std()) if len(finite) else 1.0
+    return {"mean": float(finite.mean()) if len(finite) else 0.0, "scale": scale or 1.0}
+
+
+@register_operation("standardize", 1, dtype=np.float64, fit=_fit_standardize)
+def standardize(x: np.ndarray, mean: float, scale: float) -> np.ndarray:
+    """z-score of the values, with the mean and standard deviation of the fitted rows."""
+    return (x - mean) / scale
+
+
+def _fit_quantile_bin(x: np.ndarray, bins: int = 10) -> dict:
+    finite = x[np.isfinite(x)]
+    edges = np.quantile(finite, np.linspace(0, 1, bins + 1)[1:-1]) if len(finite) else np.empty(0)
+    return {"edges": np.unique(edges).tolist()}
+
+
+@register_operation("quantile_bin", 1, dtype=np.int64, fit=_fit_quantile_bin)
+def quantile_bin(x: np.ndarray, edges: list) -> np.ndarray:
+    """Bin of every value, between the quantiles of the fitted rows."""
+    return np.searchsorted(np.asarray(edges, dtype=np.float64), x, side="right")
+
+
+class FeaturePlan:
+    """feature_eng operations compiled into a deduplicated DAG of vectorized kernels.
+
+    Every node is either a column of the input (`function` is None) or one kernel
+    applied to earlier nodes. Identical subtrees, including the ones shared
+    between targets, are compiled into a single node and evaluated once. Nodes
+    of operations with fitted statistics keep the state of their last `fit`, so
+    the plan transforms any later rows the way it transformed the fitted ones.
+    """
+
+    def __init__(self):
+        self.nodes: list[tuple] = []  # (function, inputs) or (None, column name)
+        self.targets: dict[str, int] = {}
+        self.state: dict[int, dict] = {}  # Fitted state of the nodes of fitted operations
+        self._operations: list[Optional[Operation]] = []
+        self._fits: dict[int, Callable] = {}  # fit of the nodes of fitted operations, with their parameters
+        self._memo: dict[tuple, int] = {}
+
+    def _node(self, key: tuple, node: tuple, operation: Optional[Operation] = None) -> int:
+        """Return the id of the node with this key, adding it if it is new."""
+        if key not in self._memo:
+            self._memo[key] = len(self.nodes)
+            self.nodes.append(node)
+            self._operations.append(operation)
+        return self._memo[key]
+
+    def _compile(self, operation) -> int:
+        """Compile one operation tree and return the id of its root node."""
+        if isinstance(operation, str):
+            # Earlier targets can be used as sources, like columns of the features
+            if operation in self.targets:
+                return self.targets[operation]
+            return self._node(("column", operation), (None, operation))
+        curr_op = operation["operation"]
+        if curr_op not in OPERATIONS:
+            logger.error("Invalid operation %s supplied, expected one of %s.", curr_op, sorted(OPERATIONS))
+            raise NotImplementedError(f"Invalid operation {curr_op}")
+        registered = OPERATIONS[curr_op]
+        sources = [f"source{i + 1}" for i in range(registered.arity)]
+        params = {key: value for key, value in operation.items() if key not in ENTRY_KEYS}
+        try:
+            accepts = registered.fit or registered.kernel
+            if isinstance(accepts, np.ufunc):
+                # ufuncs take no parameters, and have no signature to check them against
+                if params:
+                    raise TypeError(f"unexpected parameters {sorted(params)}")
+            else:
+                inspect.signature(accepts).bind(*sources, **params)
+        except TypeError as e:
+            logger.error("Invalid parameters %s of operation %s: %s", params, curr_op, e)
+            raise NotImplementedError(f"Invalid parameters of operation {curr_op}") from e
+        missing = [source for source in sources if source not in operation]
+        if missing:
+            logger.error("Operation %s needs %s", curr_op, missing)
+            raise NotImplementedError(f"Operation {curr_op} needs {missing}")
+        inputs = tuple(self._compile(operation[source]) for source in sources)
+
+        if curr_op == "apply":
+            # NumPy functions are called directly, and ufuncs are elementwise
+            function = getattr(np, params["function"])
+            registered = registered._replace(elementwise=isinstance(function, np.ufunc))
+            key = (function, inputs)
+        elif registered.fit is None and not params:
+            function = registered.kernel
+            key = (function, inputs)
+        elif registered.fit is None:
+            function = partial(registered.kernel, **params)
+            key = (curr_op, tuple(sorted((name, repr(value)) for name, value in params.items())), inputs)
+        else:
+            # The parameters of fitted operations go to `fit`, and the kernel gets the fitted state
+            function = registered.kernel
+            key = (curr_op, tuple(sorted((name, repr(value)) for name, value in params.items())), inputs)
+        node_id = self._node(key, (function, inputs), registered)
+        if registered.fit is not None:
+            self._fits[node_id] = partial(registered.fit, **params)
+        return node_id
+
+    def add_target(self, operation: dict) -> None:
+        """Compile the operation of a feature_eng entry under its target name."""
+        self.targets[operation["target"]] = self._compile(operation)
+
+    @property
+    def columns(self) -> list[str]:
+        """Names of the input columns read by the plan."""
+        return [payload for function, payload in self.nodes if function is None]
+
+    @property
+    def elementwise(self) -> bool:
+        """Whether every node only combines values of the same row."""
+        return all(operation is None or operation.elementwise for operation in self._operations)
+
+    @property
+    def operations(self) -> list[Optional[Operation]]:
+        """Registered operation of every node, None for input columns."""
+        return self._operations
+
+    @property
+    def fitted(self) -> bool:
+        """Whether every node of a fitted operation has its state."""
+        return all(
+            operation is None or operation.fit is None or node_id in self.state
+            for node_id, operation in enumerate(self._operations)
+        )
+
+    def _run(self, columns: dict[str, np.ndarray], outputs: dict[int, np.ndarray] = None, fit: bool = False,
+             pending: Optional[dict[int, list]] = None) -> list:
+        """Evaluate every node on one block of the input columns.
+
+        Args:
+            columns (dict[str, np.ndarray]): block of every input column
+            outputs (dict[int, np.ndarray]): buffers the target nodes are written into
+            fit (bool): whether to fit the nodes of fitted operations on this block first
+            pending (Optional[dict[int, list]]): when given, the sources of every node of a fitted
+                operation without a state are copied into it, by node, instead of being evaluated,
+                and the nodes depending on them are skipped
+
+        Returns:
+            list: value of every node, None for the skipped ones
+        """
+        outputs = outputs or {}
+        values = []
+        for node_id, (function, payload) in enumerate(self.nodes):
+            if function is None:
+                values.append(columns[payload])
+                continue
+            operation = self._operations[node_id]
+            args = [values[i] for i in payload]
+            if pending is not None and (
+                any(arg is None for arg in args) or (node_id in self._fits and node_id not in self.state)
+            ):
+                if all(arg is not None for arg in args):
+                    # Copies, so the blocks the sources are views of are not kept alive
+                    pending.setdefault(node_id, []).append([np.array(arg) for arg in args])
+                values.append(None)
+                continue
+            if node_id in outputs and isinstance(function, np.ufunc):
+                values.append(function(*args, out=outputs[node_id]))
+                continue
+            if node_id in self._fits:
+                if fit:
+                    self.state[node_id] = self._fits[node_id](*args)
+                value = function(*args, **self.state[node_id])
+            else:
+                value = function(*args)
+            if operation.dtype is not None:
+                value = np.asarray(value).astype(operation.dtype, copy=False)
+            values.append(value)
+            if node_id in outputs:
+                outputs[node_id][...] = value
+        return values
+
+    def fit(self, data: pd.DataFrame, rows: Optional[np.ndarray] = None) -> "FeaturePlan":
+        """Fit the statistics of the fitted operations on the rows of `data`.
+
+        Args:
+            data (pd.DataFrame): frame holding every input column of the plan
+            rows (Optional[np.ndarray]): positions of the rows to fit on, such as the train rows.
+                Defaults to every row
+
+        Returns:
+            FeaturePlan: the plan, for chaining
+        """
+        columns = {name: data[name].to_numpy() for name in self.columns}
+        if rows is not None:
+            # In the order of the dataset, as `fit_blocks` reads them
+            rows = np.sort(rows)
+            columns = {name: column[rows] for name, column in columns.items()}
+        with np.errstate(all="ignore"):
+            self._run(columns, fit=True)
+        return self
+
+    def fit_blocks(
+        self, blocks: Callable[[], Iterable[pd.DataFrame]], select: Optional[Callable[[int], np.ndarray]] = None
+    ) -> "FeaturePlan":
+        """Fit the statistics of the fitted operations on a dataset streamed in blocks.
+
+        Every pass over the blocks keeps the sources of the fitted nodes that can be
+        computed, and fits them once the pass is over, so the statistics are the ones
+        `fit` computes on the whole dataset while only those sources are held. Fitted
+        operations applied to the output of other fitted operations take one more pass.
+
+        Args:
+            blocks (Callable[[], Iterable[pd.DataFrame]]): called once per pass, returns the blocks
+                of the dataset, in the same order every time
+            select (Optional[Callable[[int], np.ndarray]]): called with the number of rows, returns
+                the positions of the rows to fit on, such as the train rows. Defaults to every row
+
+        Returns:
+            FeaturePlan: the plan, for chaining
+
+        Raises:
+            NotImplementedError: If an operation combines values of different rows
+        """
+        if not self.elementwise:
+            logger.error("Features can only be fitted block by block with elementwise operations")
+            raise NotImplementedError("Features can only be fitted block by block with elementwise operations")
+        while not self.fitted:
+            pending: dict[int, list] = {}
+            n_rows = 0
+            with np.errstate(all="ignore"):
+                for block in blocks():
+                    self._run({name: block[name].to_numpy() for name in self.columns}, pending=pending)
+                    n_rows += len(block)
+            if not pending:
+                # No rows to fit on
+                break
+            rows = None if select is None else np.sort(select(n_rows))
+            for node_id, parts in pending.items():
+                args = [np.concatenate(arrays) for arrays in zip(*parts)]
+                if rows is not None:
+                    args = [arg[rows] for arg in args]
+                self.state[node_id] = self._fits[node_id](*args)
+        return self
+
+    def sources(self, data: pd.DataFrame) -> dict[int, list[np.ndarray]]:
+        """Sources of every node of a fitted operation, computed on the rows of `data`.
+
+        Args:
+            data (pd.DataFrame): frame holding every input column of the plan
+
+        Returns:
+            dict[int, list[np.ndarray]]: source values of the fitted nodes, by node id
+
+        Raises:
+            NotImplementedError: If the plan has fitted operations and was not fitted
+        """
+        if not self.fitted:
+            logger.error("The plan has fitted operations and must be fitted before it is evaluated")
+            raise NotImplementedError("The plan must be fitted before it is evaluated")
+        with np.errstate(all="ignore"):
+            values = self._run({name: data[name].to_numpy() for name in self.columns})
+        return {node_id: [values[i] for i in self.nodes[node_id][1]] for node_id in self._fits}
+
+    def evaluate(self, data: pd.DataFrame, block_size: int = 65536) -> dict[str, np.ndarray]:
+        """Compute every target on the columns of `data`.
+
+        Elementwise plans run block by block, so that intermediate nodes only ever hold
+        `block_size` rows and stay in cache, while targets are written in place into
+        their output arrays.
+
+        Args:
+            data (pd.DataFrame): frame holding every input column of the plan
+            block_size (int): number of rows evaluated at once
+
+        Returns:
+            dict[str, np.ndarray]: values of every target
+
+        Raises:
+            NotImplementedError: If the plan has fitted operations and was not fitted
+        """
+        if not self.fitted:
+            logger.error("The plan has fitted operations and must be fitted before it is evaluated")
+            raise NotImplementedError("The plan must be fitted before it is evaluated")
+        columns = {name: data[name].to_numpy() for name in self.columns}
+        n_rows = len(data)
+        with np.errstate(all="ignore"):
+            if not self.elementwise:
+                values = self._run(columns)
+                return {target: values[node] for target, node in self.targets.items()}
+
+            # The dtype of every target is found on an empty block
+            empty = self._run({name: column[:0] for name, column in columns.items()})
+            buffers = {
+                node: np.empty(n_rows, dtype=empty[node].dtype)
+                for node in set(self.targets.values())
+            }
+            for start in range(0, n_rows, block_size):
+                block = slice(start, start + block_size)
+                self._run(
+                    {name: column[block] for name, column in columns.items()},
+                    {node: buffer[block] for node, buffer in buffers.items()},
+                )
+        return {target: buffers[node] for target, node in self.targets.items()}
+
+
+def compile_features(feature_eng: list) -> FeaturePlan:
+    """Compile the feature_eng operations of the config
+    Args:
+        feature_eng (list): feature_eng entries, in the order their targets are created
+
+    Returns:
+        FeaturePlan: deduplicated plan computing every target
+    """
+    plan = FeaturePlan()
+    for operation in feature_eng:
+        plan.add_target(operation)
+    return plan
+
+
+def assemble_features(data: pd.DataFrame, config: dict, values: dict[str, np.ndarray]) -> pd.DataFrame:
+    """Build the features frame in one go
+    Args:
+        data (pd.Dataframe): clean dataset, or a block of it
+        config (dict): feature engineering configs
+        values (dict[str, np.ndarray]): values of every engineered feature
+
+    Returns:
+        pd.Dataframe: the feature columns, the target and the engineered features
+    """
+    # Every column is added to a dict first, so the frame is consolidated once and never
+    # gets the SettingWithCopy checks of columns inserted into a slice of `data`
+    if not isinstance(config["feature_col"], list):
+        raise KeyError(f"feature_col must be a list of columns, got {config['feature_col']!r}")
+    columns = {name: data[name].to_numpy() for name in config["feature_col"]}
+    target = data[config["target_col"]].to_numpy()
+    if any(column.dtype != target.dtype for column in [*columns.values(), *values.values()]):
+        # Columns are stacked into blocks by runs of the same dtype, so a target of its own
+        # dtype, such as the int8 class of the low-memory mode, is inserted afterwards rather
+        # than splitting the features into blocks that are stacked again when consolidated
+        features = pd.DataFrame({**columns, **values}, index=data.index)
+        features.insert(len(columns), config["target_col"], target)
+        return features
+    columns[config["target_col"]] = target
+    columns.update(values)
+    return pd.DataFrame(columns, index=data.index)
+
+
+def generate_features(
+    data: pd.DataFrame, config: dict, plan: Optional[FeaturePlan] = None, fit_rows: Optional[np.ndarray] = None
+) -> pd.DataFrame:
     """Create features
     Args:
         data (pd.Dataframe): original, clean, unmodified dataset
         config (dict): feature engineering configs
+        plan (Optional[FeaturePlan]): compiled plan, fitted on earlier rows, to transform `data`
+            the same way. Defaults to the plan of the config, fitted on `data`
+        fit_rows (Optional[np.ndarray]): positions of the rows an unfitted plan is fitted on,
+            such as the train rows, so no statistic is computed from the test rows. Defaults to every row
 
     Returns:
         pd.Dataframe: dataframe with additional engineered features
     """
 
-    columns = config["feature_col"]
-    response = config["target_col"]
-    features = data[columns]
-    features[config["target_col"]] = data[response]
-
+    target = None
     try:
-        for operation in config["feature_eng"]:
-            target = operation["target"]
-            features[target] = recursive_operation(operation, features)
+        if plan is None:
+            plan = FeaturePlan()
+            for operation in config["feature_eng"]:
+                target = operation["target"]
+                plan.add_target(operation)
+            target = None
+        if not plan.fitted:
+            plan.fit(data, fit_rows)
+        values = plan.evaluate(data, config.get("block_size", 65536))
+        features = assemble_features(data, config, values)
+        for target in values:
             logger.info("Feature %s created.", target)
     except Exception as e:
         logger.error(
@@ -67,3 +450,55 @@ def generate_features(data: pd.DataFrame, config: dict) -> pd.DataFrame:
         raise e
 
     return features
+
+
+def iter_features(
+    blocks: Iterable[pd.DataFrame], config: dict, plan: Optional[FeaturePlan] = None
+) -> Iterator[pd.DataFrame]:
+    """Create the features of a dataset streamed in blocks
+    Args:
+        blocks (Iterable[pd.Dataframe]): blocks of the clean dataset, such as the ones of `iter_dataset`
+        config (dict): feature engineering configs
+        plan (Optional[FeaturePlan]): compiled plan, fitted with `fit_blocks` if it has fitted
+            operations. Defaults to the plan of the config
+
+    Yields:
+        pd.Dataframe: features of every block
+
+    Raises:
+        NotImplementedError: If an operation combines values of different rows, or if the
+            plan has fitted operations and was not fitted
+    """
+    plan = plan or compile_features(config["feature_eng"])
+    if not plan.elementwise:
+        logger.error("Features can only be created block by block with elementwise operations")
+        raise NotImplementedError("Features can only be created block by block with elementwise operations")
+    if not plan.fitted:
+        # Statistics fitted on a single block would change with the block size
+        logger.error("The plan has fitted operations: fit it on every block with fit_blocks before streaming")
+        raise NotImplementedError("The plan must be fitted with fit_blocks before features are streamed")
+    block_size = config.get("block_size", 65536)
+    for block in blocks:
+        yield assemble_features(block, config, plan.evaluate(block, block_size))
+
+
+def write_features(
+    blocks: Iterable[pd.DataFrame], config: dict, path: Path, fmt: Optional[str] = None,
+    plan: Optional[FeaturePlan] = None,
+) -> Path:
+    """Create the features of a dataset streamed in blocks and write every block to an artifact
+    Args:
+        blocks (Iterable[pd.Dataframe]): blocks of the clean dataset
+        config (dict): feature engineering configs
+        path (Path): path of the artifact, its suffix is set by `fmt`
+        fmt (Optional[str]): csv, parquet or feather
+        plan (Optional[FeaturePlan]): compiled plan, fitted with `fit_blocks` if it has fitted operations
+
+    Returns:
+        Path: path the features were written to
+    """
+    with FrameWriter(path, fmt) as writer:
+        for features in iter_features(blocks, config, plan):
+            writer.write(features)
+    logger.info("%d rows of features written to %s", writer.rows, writer.path)
+    return writer.path
@@ -0,0 +1,317 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import yaml
+
+import src.create_dataset as cd
+import src.generate_features as gf
+import src.train_model as tm
+from src.score_model import load_model
+
+logger = logging.getLogger("clouds")
+
+STATE_FILE = "state.yaml"
+MODEL_FILE = "model.pkl"
+PLAN_FILE = "feature_plan.pkl"
+# Name of the version directory of the committed state, replaced atomically
+CURRENT_FILE = "CURRENT"
+
+
+class RunningStats:
+    """Count, mean, variance, minimum and maximum of columns, updated block by block.
+
+    Blocks are merged with the parallel form of Welford's algorithm (Chan et
+    al.), so the statistics of every row seen so far are kept without the rows,
+    and without the loss of precision of running sums of squares. Values that
+    are not finite (the log of a zero entropy) are left out, column by column.
+    """
+
+    def __init__(self, columns: list, count=None, mean=None, m2=None, minimum=None, maximum=None):
+        self.columns = list(columns)
+        n = len(self.columns)
+        self.count = np.zeros(n, dtype=np.int64) if count is None else np.asarray(count, dtype=np.int64)
+        self.mean = np.zeros(n) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.m2 = np.zeros(n) if m2 is None else np.asarray(m2, dtype=np.float64)
+        self.minimum = np.full(n, np.inf) if minimum is None else np.asarray(minimum, dtype=np.float64)
+        self.maximum = np.full(n, -np.inf) if maximum is None else np.asarray(maximum, dtype=np.float64)
+
+    def update(self, values) -> "RunningStats":
+        """Add a block of rows.
+
+        Args:
+            values: Rows of the block, with one column per statistics column.
+
+        Returns:
+            RunningStats: The statistics, for chaining.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.columns))
+        finite = np.isfinite(values)
+        count = finite.sum(axis=0)
+        mean = np.divide(np.where(finite, values, 0).sum(axis=0), count, out=np.zeros(len(count)), where=count > 0)
+        m2 = (np.where(finite, values - mean, 0) ** 2).sum(axis=0)
+        total = self.count + count
+        delta = mean - self.mean
+        weight = np.divide(count, total, out=np.zeros(len(count)), where=total > 0)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * weight
+        self.count = total
+        self.minimum = np.minimum(self.minimum, np.where(finite, values, np.inf).min(axis=0, initial=np.inf))
+        self.maximum = np.maximum(self.maximum, np.where(finite, values, -np.inf).max(axis=0, initial=-np.inf))
+        return self
+
+    def variance(self, ddof: int = 1) -> np.ndarray:
+        """Variance of every column, NaN for columns with at most `ddof` values."""
+        return np.divide(self.m2, self.count - ddof, out=np.full(len(self.m2), np.nan), where=self.count > ddof)
+
+    def to_dict(self) -> dict:
+        """Statistics as plain Python types, to be saved with the state."""
+        return {
+            "columns": self.columns,
+            "count": self.count.tolist(),
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+            "minimum": self.minimum.tolist(),
+            "maximum": self.maximum.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RunningStats":
+        """Statistics saved with `to_dict`."""
+        return cls(**state)
+
+
+def state_key(config: dict) -> str:
+    """Hash the configuration the incremental state depends on.
+
+    The line range of every cloud is left out: it grows as observations arrive,
+    and shifts when an earlier cloud grows. The watermark of a cloud counts its
+    rows from its first line. Any other change to the dataset, features or model
+    resets the state.
+    """
+    train_config = config["train_model"]
+    key = {
+        "columns": config["create_dataset"]["data"]["columns"],
+        "generate_features": config["generate_features"],
+        "model_config": train_config["model_config"],
+        "initial_features": train_config["initial_features"],
+        "target": train_config["target"],
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def state_directory(config: dict) -> Path:
+    """Directory of the incremental state of a configuration, `train_model.incremental.state_dir`."""
+    return Path(config["train_model"].get("incremental", {}).get("state_dir", ".cache/incremental"))
+
+
+def load_state(state_dir: Path, key: str) -> tuple[dict, Optional[object], Optional[gf.FeaturePlan]]:
+    """Load the state, the model and the feature plan of the previous updates.
+
+    Args:
+        state_dir (Path): Directory of the incremental state.
+        key (str): Hash of the current configuration.
+
+    Returns:
+        tuple[dict, Optional[object], Optional[gf.FeaturePlan]]: The state, the model and
+            the fitted feature plan, empty and None without a state or when the configuration changed.
+    """
+    try:
+        version = state_dir / (state_dir / CURRENT_FILE).read_text().strip()
+        state = yaml.safe_load((version / STATE_FILE).read_text()) or {}
+    except OSError:
+        return {}, None, None
+    if state.get("config") != key:
+        logger.warning("The configuration changed since the last update, the incremental state is reset")
+        return {}, None, None
+    with open(version / PLAN_FILE, "rb") as file:
+        plan = pickle.load(file)
+    # The model is refitted, so its arrays are loaded into memory rather than memory-mapped
+    return state, load_model(version / MODEL_FILE, mmap=False), plan
+
+
+def commit_state(state_dir: Path, state: dict, model: object, plan: gf.FeaturePlan, serialization: Optional[dict] = None) -> Path:
+    """Save the model, the plan and the state of an update as the new version of the state.
+
+    The files are written to a version directory of their own, which becomes the
+    current one when `CURRENT` is replaced, in one atomic rename. An update
+    interrupted before leaves the previous version current, and is redone from
+    its watermark with its model. Older versions are deleted once committed.
+
+    Args:
+        state_dir (Path): Directory of the incremental state.
+        state (dict): Configuration hash, watermarks, counts and statistics of the update.
+        model (object): The updated model.
+        plan (gf.FeaturePlan): The fitted feature plan.
+        serialization (Optional[dict]): Serialization settings of the model, as for `save_model`.
+
+    Returns:
+        Path: Directory of the committed version.
+    """
+    version = state_dir / f"update-{state['updates']:06d}"
+    # Left over by an update interrupted before its commit
+    shutil.rmtree(version, ignore_errors=True)
+    version.mkdir(parents=True)
+    tm.save_model(model, version / MODEL_FILE, serialization)
+    (version / PLAN_FILE).write_bytes(pickle.dumps(plan, protocol=pickle.HIGHEST_PROTOCOL))
+    (version / STATE_FILE).write_text(yaml.safe_dump(state, sort_keys=False))
+    tmp = state_dir / (CURRENT_FILE + ".tmp")
+    tmp.write_text(version.name)
+    os.replace(tmp, state_dir / CURRENT_FILE)
+    for previous in state_dir.glob("update-*"):
+        if previous != version:
+            shutil.rmtree(previous, ignore_errors=True)
+    return version
+
+
+def running_nodes(plan: gf.FeaturePlan) -> dict[int, str]:
+    """Nodes of the plan whose sources are followed by running statistics.
+
+    Standardized sources only need their count, mean and variance, which are
+    merged exactly across updates.
+
+    Returns:
+        dict[int, str]: Name of the statistics column of every node, by node id.
+    """
+    names = {node: name for name, node in plan.targets.items()}
+    return {
+        node: names.get(node, f"node_{node}")
+        for node, operation in enumerate(plan.operations)
+        if operation is not None and operation.kernel is gf.standardize
+    }
+
+
+def read_new_rows(path_of_raw: Path, config: dict, watermark: dict) -> tuple[pd.DataFrame, dict]:
+    """Read the rows of every cloud past its watermark.
+
+    The lines before the watermark are skipped by the tokenizer without being
+    parsed, so the cost grows with the new rows only.
+
+    Args:
+        path_of_raw (Path): The path where raw data is.
+        config (dict): Configuration for dataset creation.
+        watermark (dict): Number of rows already read, by cloud.
+
+    Returns:
+        tuple[pd.DataFrame, dict]: The new rows, with the class column, and the new watermark.
+
+    Raises:
+        NotImplementedError: If a cloud has fewer rows than were already read.
+    """
+    shifted = copy.deepcopy(config)
+    new_watermark = {}
+    for cloud, left, right in cd._cloud_rows(config):
+        rows = max(right - left, 0)
+        seen = watermark.get(cloud, 0)
+        if rows < seen:
+            logger.error("The %s has %d rows, but %d were already read", cloud, rows, seen)
+            raise NotImplementedError(f"The {cloud} has fewer rows than were already read")
+        shifted["data_prep"][cloud]["left"] = left + seen
+        new_watermark[cloud] = rows
+    blocks = list(cd.iter_dataset(path_of_raw, shifted))
+    if not blocks:
+        return pd.DataFrame(columns=config["data"]["columns"] + ["class"], dtype=np.float64), new_watermark
+    return pd.concat(blocks, ignore_index=True), new_watermark
+
+
+def update_model(model: Optional[object], x: pd.DataFrame, y: pd.Series, config: dict) -> object:
+    """Update a model with new rows only.
+
+    Estimators with `partial_fit` are updated in place. Forests keep their
+    trees and grow `incremental.trees_per_update` new ones, fitted on the new
+    rows, with `warm_start`.
+
+    Args:
+        model (Optional[object]): Model of the previous updates, None to build the configured one.
+        x (pd.DataFrame): Features of the new rows.
+        y (pd.Series): Target of the new rows.
+        config (dict): Configuration for model training.
+
+    Returns:
+        object: The updated model.
+
+    Raises:
+        NotImplementedError: If the model supports neither partial_fit nor warm_start.
+    """
+    fresh = model is None
+    if fresh:
+        model = tm.build_model(config["model_config"])
+    if hasattr(model, "partial_fit"):
+        model.partial_fit(x, y, classes=np.arange(len(cd.CLOUDS), dtype=np.float64))
+    elif "warm_start" in model.get_params():
+        trees = 0 if fresh else config.get("incremental", {}).get("trees_per_update", 10)
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + trees)
+        model.fit(x, y)
+    else:
+        logger.error("%s supports neither partial_fit nor warm_start", type(model).__name__)
+        raise NotImplementedError(f"{type(model).__name__} cannot be updated incrementally")
+    return model
+
+
+def incremental_update(path_of_raw: Path, config: dict, state_dir: Optional[Path] = None) -> tuple[Optional[object], dict]:
+    """Update the model and the feature statistics with the rows added since the last update.
+
+    The model, the fitted feature plan, the running statistics of the sources of
+    the standardized features and the watermark of every cloud are kept in
+    `state_dir` between runs, and committed together by `commit_state`, so an
+    interrupted update is redone from the previous watermark. The plan is fitted
+    on the rows of the first update and then frozen: the trees and coefficients
+    already fitted learned their thresholds on features scaled by it. The running
+    statistics cover every row so far, and the report gives the shift of their
+    mean from the frozen one, in frozen standard deviations, as `drift`; a large
+    drift calls for a new state. Updates wait until at least
+    `incremental.min_rows` new rows, of every class, arrived.
+
+    Args:
+        path_of_raw (Path): The path where raw data is.
+        config (dict): Full configuration.
+        state_dir (Optional[Path]): Directory of the incremental state. Defaults to `train_model.incremental.state_dir`.
+
+    Returns:
+        tuple[Optional[object], dict]: The model (None before the first update) and a report of the update.
+    """
+    train_config = config["train_model"]
+    incremental = train_config.get("incremental", {})
+    state_dir = Path(state_dir or state_directory(config))
+    state_dir.mkdir(parents=True, exist_ok=True)
+    key = state_key(config)
+    state, model, plan = load_state(state_dir, key)
+
+    data, watermark = read_new_rows(path_of_raw, config["create_dataset"], state.get("watermark", {}))
+    report = {"new_rows": len(data), "updated": False, "updates": state.get("updates", 0), "rows": state.get("rows", 0)}
+    if len(data) < incremental.get("min_rows", 1) or data["class"].nunique() < len(cd.CLOUDS):
+        logger.info("%d new rows, the update waits for more rows of every class", len(data))
+        return model, report
+
+    if plan is None:
+        plan = gf.compile_features(config["generate_features"]["feature_eng"]).fit(data)
+    nodes = running_nodes(plan)
+    stats = RunningStats.from_dict(state["stats"]) if state else RunningStats(list(nodes.values()))
+    if nodes:
+        sources = plan.sources(data)
+        stats.update(np.column_stack([sources[node][0] for node in nodes]))
+    features = gf.generate_features(data, config["generate_features"], plan)
+    x, y = features[train_config["initial_features"]], features[train_config["target"]]
+    model = update_model(model, x, y, train_config)
+
+    report.update(updated=True, updates=report["updates"] + 1, rows=report["rows"] + len(data))
+    state = {"config": key, "watermark": watermark, "updates": report["updates"], "rows": report["rows"],
+             "stats": stats.to_dict()}
+    commit_state(state_dir, state, model, plan, train_config.get("serialization"))
+    if hasattr(model, "n_estimators"):
+        report["n_estimators"] = model.n_estimators
+    if nodes:
+        report["drift"] = {
+            name: float((stats.mean[i] - plan.state[node]["mean"]) / plan.state[node]["scale"])
+            for i, (node, name) in enumerate(nodes.items())
+        }
+    logger.info("Model updated with %d new rows, %d rows over %d updates", len(data), report["rows"], report["updates"])
+    return model, report
@@ -0,0 +1,276 @@
+import logging
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("clouds")
+
+
+def _merge_counts(values: np.ndarray, counts: np.ndarray, new_values: np.ndarray,
+                  new_counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Add counts of distinct values to sorted distinct values and their counts."""
+    merged, inverse = np.unique(np.concatenate([values, new_values]), return_inverse=True)
+    return merged, np.bincount(inverse, weights=np.concatenate([counts, new_counts]), minlength=len(merged)).astype(np.int64)
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Divide, with 0 where the denominator is 0, as sklearn does with zero_division="warn"."""
+    result = np.zeros(np.shape(numerator), dtype=np.float64)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+class MetricsAccumulator:
+    """Classification metrics accumulated over blocks of predictions.
+
+    Each block only adds to the count of every (actual, predicted) class pair
+    and to the count of every distinct score per actual class, so files of any
+    size can be evaluated block by block. All metrics are derived from these
+    counts: the confusion matrix, accuracy and precision/recall/F1 from the
+    pairs, and the ROC and precision-recall curves from one sort of the distinct
+    scores, followed by cumulative sums. They reproduce the values of
+    sklearn.metrics for binary targets.
+
+    The pairs are bounded by the number of classes, but the exact curve metrics
+    keep one count per distinct score: for continuous scores, memory grows with
+    the rows. With `score_decimals`, scores are rounded to that many decimals
+    first, which bounds the counts at the cost of merging the scores that round
+    to the same value. Blocks of counts are merged once they outnumber the
+    counts already merged, so merging costs O(n log n) over n scores.
+    """
+
+    def __init__(self, score_decimals: Optional[int] = None):
+        """Start without predictions.
+
+        Args:
+            score_decimals (Optional[int]): Decimals the scores are rounded to. Defaults to exact scores.
+        """
+        self.score_decimals = score_decimals
+        self._pairs = np.empty((0, 2))
+        self._pair_counts = np.empty(0, dtype=np.int64)
+        self._merged: dict[float, tuple[np.ndarray, np.ndarray]] = {}
+        # Counts of the blocks not merged yet, by actual class
+        self._pending: dict[float, list[tuple[np.ndarray, np.ndarray]]] = {}
+        self._dtype = None  # Of the classes, which are counted as floats
+        self.n_rows = 0
+
+    def update(self, y_true, proba=None, pred=None) -> "MetricsAccumulator":
+        """Add a block of predictions.
+
+        Args:
+            y_true: Actual class of every row.
+            proba: Score of the positive class of every row, for the curve metrics.
+            pred: Predicted class of every row, for the confusion matrix based metrics.
+
+        Returns:
+            MetricsAccumulator: The accumulator, for chaining.
+        """
+        # Classes and scores are hashed, so only their distinct values are ever sorted
+        true_codes, true_labels = pd.factorize(np.asarray(y_true, dtype=np.float64), sort=True, use_na_sentinel=False)
+        if pred is not None:
+            dtypes = [np.asarray(y_true).dtype, np.asarray(pred).dtype]
+            self._dtype = np.result_type(*dtypes, *([self._dtype] if self._dtype is not None else []))
+            pred_codes, pred_labels = pd.factorize(np.asarray(pred, dtype=np.float64), sort=True, use_na_sentinel=False)
+            counts = np.bincount(
+                true_codes * len(pred_labels) + pred_codes, minlength=len(true_labels) * len(pred_labels)
+            )
+            pairs = np.column_stack([np.repeat(true_labels, len(pred_labels)), np.tile(pred_labels, len(true_labels))])
+            merged, inverse = np.unique(np.concatenate([self._pairs, pairs]), axis=0, return_inverse=True)
+            self._pair_counts = np.bincount(
+                inverse.ravel(), weights=np.concatenate([self._pair_counts, counts]), minlength=len(merged)
+            ).astype(np.int64)
+            self._pairs = merged
+        if proba is not None:
+            proba = np.asarray(proba, dtype=np.float64)
+            if self.score_decimals is not None:
+                proba = np.round(proba, self.score_decimals)
+            score_codes, scores = pd.factorize(proba, use_na_sentinel=False)
+            counts = np.bincount(
+                true_codes * len(scores) + score_codes, minlength=len(true_labels) * len(scores)
+            ).reshape(len(true_labels), len(scores))
+            for label, label_counts in zip(true_labels, counts):
+                present = label_counts > 0
+                pending = self._pending.setdefault(label, [])
+                pending.append((scores[present], label_counts[present]))
+                merged = self._merged.get(label, (np.empty(0),))[0]
+                if sum(len(values) for values, _ in pending) >= len(merged):
+                    self._merge(label)
+        self.n_rows += len(true_codes)
+        return self
+
+    def _merge(self, label: float) -> None:
+        """Merge the pending counts of the scores of a class into its merged ones."""
+        pending = self._pending.pop(label, [])
+        if pending:
+            values, counts = self._merged.get(label, (np.empty(0), np.empty(0, dtype=np.int64)))
+            self._merged[label] = _merge_counts(
+                values, counts, np.concatenate([v for v, _ in pending]), np.concatenate([c for _, c in pending])
+            )
+
+    @property
+    def _scores(self) -> dict[float, tuple[np.ndarray, np.ndarray]]:
+        """Sorted distinct scores of every actual class, and their counts."""
+        for label in list(self._pending):
+            self._merge(label)
+        return self._merged
+
+    # Metrics of the predicted classes
+    @property
+    def labels(self) -> np.ndarray:
+        """Sorted classes seen in the actual or predicted classes."""
+        return np.unique(self._pairs).astype(self._dtype if self._dtype is not None else np.float64)
+
+    def confusion_matrix(self) -> np.ndarray:
+        """Counts of actual (rows) and predicted (columns) classes, as sklearn.metrics.confusion_matrix."""
+        labels = self.labels
+        matrix = np.zeros((len(labels), len(labels)), dtype=np.int64)
+        rows, columns = np.searchsorted(labels, self._pairs[:, 0]), np.searchsorted(labels, self._pairs[:, 1])
+        np.add.at(matrix, (rows, columns), self._pair_counts)
+        return matrix
+
+    def accuracy(self) -> float:
+        """Fraction of rows whose predicted class is the actual one."""
+        return float(np.trace(self.confusion_matrix()) / self._pair_counts.sum())
+
+    def precision_recall_fscore_support(self, average: Optional[str] = None, pos_label: float = 1) -> tuple:
+        """Precision, recall, F1 score and support, as sklearn.metrics.precision_recall_fscore_support.
+
+        Args:
+            average (Optional[str]): None for every class, "binary" for `pos_label`,
+                or "micro", "macro" or "weighted".
+            pos_label (float): Positive class of the binary average.
+
+        Returns:
+            tuple: Precision, recall, F1 score and support (None for averages).
+        """
+        matrix = self.confusion_matrix()
+        tp_sum, pred_sum, true_sum = np.diag(matrix), matrix.sum(axis=0), matrix.sum(axis=1)
+        if average == "micro":
+            tp_sum, pred_sum, true_sum = tp_sum.sum(keepdims=True), pred_sum.sum(keepdims=True), true_sum.sum(keepdims=True)
+        elif average == "binary":
+            labels = self.labels
+            if len(labels) > 2 or pos_label not in labels:
+                logger.error("Binary average needs at most two classes including %s, got %s", pos_label, labels)
+                raise NotImplementedError(f"Binary average is not supported for classes {labels}")
+            index = np.searchsorted(labels, pos_label)
+            tp_sum, pred_sum, true_sum = tp_sum[[index]], pred_sum[[index]], true_sum[[index]]
+        precision = _divide(tp_sum, pred_sum)
+        recall = _divide(tp_sum, true_sum)
+        denominator = precision + recall
+        denominator[denominator == 0.0] = 1
+        f_score = 2 * precision * recall / denominator
+        if average == "weighted":
+            weights = true_sum
+        else:
+            weights = None
+        if average is not None:
+            return (
+                float(np.average(precision, weights=weights)),
+                float(np.average(recall, weights=weights)),
+                float(np.average(f_score, weights=weights)),
+                None,
+            )
+        return precision, recall, f_score, true_sum
+
+    def classification_report(self, digits: int = 2) -> str:
+        """Per-class and averaged precision, recall and F1, formatted as sklearn.metrics.classification_report."""
+        target_names = ["%s" % label for label in self.labels]
+        headers = ["precision", "recall", "f1-score", "support"]
+        precision, recall, f_score, support = self.precision_recall_fscore_support()
+        width = max(max(len(name) for name in target_names), len("weighted avg"), digits)
+        report = ("{:>{width}s} " + " {:>9}" * len(headers)).format("", *headers, width=width)
+        report += "\n\n"
+        row_fmt = "{:>{width}s} " + " {:>9.{digits}f}" * 3 + " {:>9}\n"
+        for row in zip(target_names, precision, recall, f_score, support):
+            report += row_fmt.format(*row, width=width, digits=digits)
+        report += "\n"
+        total = np.sum(support)
+        accuracy_fmt = "{:>{width}s} " + " {:>9.{digits}}" * 2 + " {:>9.{digits}f}" + " {:>9}\n"
+        report += accuracy_fmt.format(
+            "accuracy", "", "", self.precision_recall_fscore_support("micro")[2], total, width=width, digits=digits
+        )
+        for average in ("macro", "weighted"):
+            report += row_fmt.format(
+                average + " avg", *self.precision_recall_fscore_support(average)[:3], total, width=width, digits=digits
+            )
+        return report
+
+    # Metrics of the scores
+    def _curve(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """False and true positives at every distinct score, from the highest, as sklearn's _binary_clf_curve."""
+        labels = sorted(self._scores)
+        if len(labels) > 2:
+            logger.error("Curve metrics need a binary target, got classes %s", labels)
+            raise NotImplementedError(f"Curve metrics are not supported for classes {labels}")
+        empty = (np.empty(0), np.empty(0, dtype=np.int64))
+        # As sklearn, the greater class is the positive one
+        negatives = self._scores[labels[0]] if len(labels) == 2 else empty
+        positives = self._scores[labels[-1]] if labels else empty
+        thresholds, inverse = np.unique(np.concatenate([negatives[0], positives[0]]), return_inverse=True)
+        pos_counts = np.bincount(inverse[len(negatives[0]):], weights=positives[1], minlength=len(thresholds))
+        neg_counts = np.bincount(inverse[:len(negatives[0])], weights=negatives[1], minlength=len(thresholds))
+        tps = np.cumsum(pos_counts[::-1])
+        fps = np.cumsum(neg_counts[::-1])
+        return fps, tps, thresholds[::-1]
+
+    def roc_curve(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """False positive rate, true positive rate and thresholds, as sklearn.metrics.roc_curve."""
+        fps, tps, thresholds = self._curve()
+        # Points on a straight line between their neighbours do not change the curve
+        if len(fps) > 2:
+            keep = np.where(np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True])[0]
+            fps, tps, thresholds = fps[keep], tps[keep], thresholds[keep]
+        tps, fps = np.r_[0, tps], np.r_[0, fps]
+        thresholds = np.r_[thresholds[0] + 1, thresholds]
+        fpr = fps / fps[-1] if fps[-1] > 0 else np.full(fps.shape, np.nan)
+        tpr = tps / tps[-1] if tps[-1] > 0 else np.full(tps.shape, np.nan)
+        return fpr, tpr, thresholds
+
+    def roc_auc(self) -> float:
+        """Area under the ROC curve, as sklearn.metrics.roc_auc_score.
+
+        Raises:
+            NotImplementedError: If only one class is present.
+        """
+        if len(self._scores) != 2:
+            logger.error("ROC AUC is not defined when only one class is present")
+            raise NotImplementedError("ROC AUC is not defined when only one class is present")
+        fpr, tpr, _ = self.roc_curve()
+        return float(np.trapz(tpr, fpr))
+
+    def precision_recall_curve(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Precision, recall and thresholds, as sklearn.metrics.precision_recall_curve."""
+        fps, tps, thresholds = self._curve()
+        precision = _divide(tps, tps + fps)
+        recall = np.ones_like(precision) if tps[-1] == 0 else tps / tps[-1]
+        return np.r_[precision[::-1], 1], np.r_[recall[::-1], 0], thresholds[::-1]
+
+    def average_precision(self) -> float:
+        """Average precision, as sklearn.metrics.average_precision_score."""
+        precision, recall, _ = self.precision_recall_curve()
+        return float(-np.sum(np.diff(recall) * precision[:-1]))
+
+    def metric(self, name: str) -> object:
+        """Compute a metric by its sklearn.metrics name.
+
+        Args:
+            name (str): One of FUSED_METRICS.
+
+        Returns:
+            object: Value of the metric.
+        """
+        return FUSED_METRICS[name](self)
+
+
+# Metrics computed by the accumulator, by their sklearn.metrics name
+FUSED_METRICS = {
+    "roc_auc_score": MetricsAccumulator.roc_auc,
+    "average_precision_score": MetricsAccumulator.average_precision,
+    "confusion_matrix": MetricsAccumulator.confusion_matrix,
+    "accuracy_score": MetricsAccumulator.accuracy,
+    "precision_score": lambda acc: acc.precision_recall_fscore_support("binary")[0],
+    "recall_score": lambda acc: acc.precision_recall_fscore_support("binary")[1],
+    "f1_score": lambda acc: acc.precision_recall_fscore_support("binary")[2],
+    "classification_report": MetricsAccumulator.classification_report,
+}
@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+from src.score_model import predict
+
+logger = logging.getLogger("clouds")
+
+
+class MicroBatcher:
+    """Groups concurrent scoring requests into one model call.
+
+    Requests are queued and a single worker thread scores everything that arrived
+    within `max_wait_ms` of the first queued request, up to `max_batch_size` rows,
+    so the per-call overhead of the model is paid once per batch.
+    """
+
+    def __init__(self, model: object, features: list, max_batch_size: int = 256, max_wait_ms: float = 2.0,
+                 transform=None):
+        self.model = model
+        # With a feature transform, requests hold its raw columns and the features are computed per batch
+        self.transform = transform
+        self.features = transform.columns if transform is not None else features
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._requests: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, rows: np.ndarray) -> Future:
+        """Queue rows of features for scoring.
+
+        Args:
+            rows (np.ndarray): Array of shape (n_rows, len(features)).
+
+        Returns:
+            Future: Resolves to the positive class probabilities and classes of the rows.
+        """
+        future: Future = Future()
+        self._requests.put((np.atleast_2d(np.asarray(rows, dtype=np.float64)), future))
+        return future
+
+    def close(self) -> None:
+        """Stop the worker once the queued requests are scored."""
+        self._requests.put(None)
+        self._worker.join()
+
+    def _run(self) -> None:
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            batch = [request]
+            size = len(request[0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                try:
+                    request = self._requests.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._requests.put(None)
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._score(batch)
+
+    def _score(self, batch: list) -> None:
+        try:
+            x = np.concatenate([rows for rows, _ in batch])
+            x = self.transform.transform(x) if self.transform is not None else pd.DataFrame(x, columns=self.features)
+            proba, classes = predict(self.model, x)
+        except Exception as e:
+            logger.error("Failed to score a batch of %d requests: %s", len(batch), e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for rows, future in batch:
+            end = start + len(rows)
+            future.set_result((proba[start:end], classes[start:end]))
+            start = end
+
+
+def make_handler(batcher: MicroBatcher) -> type:
+    """Create the HTTP request handler scoring through `batcher`.
+
+    POST /score takes {"instances": [[...], ...]} with the features in the order of
+    the configuration (the raw columns of the feature transform, when the server has
+    one), or a list of {feature: value} records, and returns
+    {"probability": [...], "class": [...]}. GET /health returns {"status": "ok"}.
+    """
+
+    class ScoringHandler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: dict) -> None:
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok"})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                instances = body["instances"]
+                if instances and isinstance(instances[0], dict):
+                    instances = [[record[f] for f in batcher.features] for record in instances]
+                rows = np.asarray(instances, dtype=np.float64).reshape(-1, len(batcher.features))
+            except (ValueError, KeyError, TypeError) as e:
+                self._reply(400, {"error": f"invalid request: {e}"})
+                return
+            try:
+                proba, classes = batcher.submit(rows).result()
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+                return
+            self._reply(200, {"probability": proba.tolist(), "class": classes.tolist()})
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    return ScoringHandler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded HTTP server listening on a Unix domain socket."""
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("unix", 0)
+
+
+def create_server(model: object, config: dict, socket_path: Optional[str] = None, transform=None):
+    """Create the scoring server; call `serve_forever` on it to start serving.
+
+    Args:
+        model (object): Trained model, loaded once for the lifetime of the server.
+        config (dict): score_model configuration, with the optional `server` settings.
+        socket_path (Optional[str]): Listen on this Unix socket instead of host and port.
+        transform (Optional[FeatureTransform]): Feature transform saved with the model, to score raw records.
+
+    Returns:
+        The server, with the micro-batcher in its `batcher` attribute.
+    """
+    server_config = config.get("server", {})
+    batcher = MicroBatcher(
+        model,
+        config["initial_features"],
+        server_config.get("max_batch_size", 256),
+        server_config.get("max_wait_ms", 2.0),
+        transform,
+    )
+    handler = make_handler(batcher)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+        logger.info("Scoring server listening on unix socket %s", socket_path)
+    else:
+        server = ThreadingHTTPServer(
+            (server_config.get("host", "127.0.0.1"), server_config.get("port", 8080)), handler
+        )
+        logger.info("Scoring server listening on %s:%s", *server.server_address[:2])
+    server.batcher = batcher
+    return server
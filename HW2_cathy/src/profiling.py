@@ -0,0 +1,195 @@
+import cProfile
+import json
+import logging
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+import yaml
+
+logger = logging.getLogger("clouds")
+
+MB = 1024 * 1024
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak resident set size of the process, where the OS allows it (Linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss() -> float:
+    """Peak resident set size of the process in MB, since the last reset on Linux."""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024 / MB
+    except OSError:
+        pass
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / MB if sys.platform == "darwin" else maxrss * 1024 / MB
+
+
+def describe(obj: object) -> dict:
+    """Count the rows and bytes of a stage input or output.
+
+    Args:
+        obj (object): DataFrame, Series, array, file path, or a tuple/list/dict of them.
+
+    Returns:
+        dict: Number of rows and in-memory (or on-disk, for files) bytes.
+    """
+    if obj is None:
+        return {"rows": 0, "bytes": 0}
+    if isinstance(obj, (list, tuple, dict)):
+        parts = [describe(item) for item in (obj.values() if isinstance(obj, dict) else obj)]
+        return {"rows": sum(p["rows"] for p in parts), "bytes": sum(p["bytes"] for p in parts)}
+    if isinstance(obj, Path):
+        return {"rows": 0, "bytes": obj.stat().st_size if obj.is_file() else 0}
+    if hasattr(obj, "memory_usage"):  # pandas objects
+        usage = obj.memory_usage(index=True)
+        return {"rows": len(obj), "bytes": int(usage.sum() if hasattr(usage, "sum") else usage)}
+    if hasattr(obj, "nbytes") and hasattr(obj, "shape"):  # NumPy arrays
+        return {"rows": obj.shape[0] if obj.shape else 1, "bytes": int(obj.nbytes)}
+    return {"rows": 0, "bytes": 0}
+
+
+class StageProfiler:
+    """Measures every pipeline stage and writes a timing report.
+
+    Each stage records its wall and CPU time (of this process and of finished
+    worker processes), the peak resident set size of the process, and the rows
+    and bytes of its inputs and outputs. With `trace_memory`, which slows down
+    allocations, the peak of Python allocations traced by tracemalloc is also
+    recorded, and the peak resident set size is reset before every stage, so it
+    is the stage's own. With `profile_dir`, the cProfile statistics of every
+    stage are dumped to `<profile_dir>/<stage>.prof`.
+
+    The CPU time and the memory peaks are measured for the whole process. When
+    stages run at the same time on several threads, the record of each one lists
+    the stages it overlapped with and is marked `process_level`: its CPU time and
+    peaks then include theirs, and only its wall time is its own.
+    """
+
+    def __init__(self, profile_dir: Optional[Path] = None, trace_memory: bool = False):
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.trace_memory = trace_memory
+        self.records: dict[str, dict] = {}
+        # Stages running now, and the stages every stage overlapped with
+        self._running: set[str] = set()
+        self._overlaps: dict[str, set] = {}
+        self._span: list[float] = []
+        self._lock = threading.Lock()
+        self._started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def close(self) -> None:
+        """Stop tracing allocations, if this profiler started it."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name: str, inputs: object = None) -> Iterator[dict]:
+        """Measure the code run inside the context as the stage `name`.
+
+        The caller can set the `outputs` key of the yielded record to the stage
+        outputs, and the `cached` key when they were restored from the cache.
+
+        Args:
+            name (str): Name of the stage.
+            inputs (object): Inputs of the stage, counted in rows and bytes.
+
+        Yields:
+            dict: Record of the stage.
+        """
+        record = {"outputs": None, "cached": False}
+        with self._lock:
+            self._overlaps[name] = set(self._running)
+            for other in self._running:
+                self._overlaps[other].add(name)
+            self._running.add(name)
+        # Resetting the peak RSS clears the referenced bits of every page of the process
+        rss_reset = self.trace_memory and _reset_peak_rss()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        profiler = cProfile.Profile() if self.profile_dir else None
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+            wall_end = time.perf_counter()
+            wall = wall_end - wall_start
+            cpu = time.process_time() - cpu_start
+            with self._lock:
+                self._running.discard(name)
+                overlaps = sorted(self._overlaps.pop(name))
+                self._span = [min(self._span[:1] + [wall_start]), max(self._span[1:] + [wall_end])]
+            children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+            stats = {
+                "wall_seconds": round(wall, 6),
+                "cpu_seconds": round(cpu, 6),
+                "children_cpu_seconds": round(
+                    children_end.ru_utime + children_end.ru_stime - children.ru_utime - children.ru_stime, 6
+                ),
+                "peak_rss_mb": round(_peak_rss(), 3),
+                "peak_rss_is_stage_peak": rss_reset and not overlaps,
+                "process_level": bool(overlaps),
+                "overlapped_with": overlaps,
+                "cached": record["cached"],
+            }
+            if self.trace_memory:
+                stats["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / MB, 3)
+            inputs, outputs = describe(inputs), describe(record["outputs"])
+            stats.update(
+                rows_in=inputs["rows"], bytes_in=inputs["bytes"],
+                rows_out=outputs["rows"], bytes_out=outputs["bytes"],
+            )
+            if profiler:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(self.profile_dir / f"{name}.prof")
+            self.records[name] = stats
+            logger.info(
+                "Stage %s took %.3fs wall, %.3fs CPU, peak RSS %.1f MB%s",
+                name, wall, cpu, stats["peak_rss_mb"],
+                f" (process-level, overlapped with {', '.join(overlaps)})" if overlaps else "",
+            )
+
+    def save(self, path: Path) -> None:
+        """Write the record of every stage to a YAML (or, with a .json suffix, JSON) file.
+
+        Args:
+            path (Path): Path of the timing report.
+        """
+        report = {
+            # From the start of the first stage to the end of the last one, as stages can overlap
+            "total_wall_seconds": round(self._span[1] - self._span[0], 6) if self._span else 0.0,
+            "stage_wall_seconds": round(sum(r["wall_seconds"] for r in self.records.values()), 6),
+            "stages": self.records,
+        }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as file:
+            if path.suffix == ".json":
+                json.dump(report, file, indent=2)
+            else:
+                yaml.safe_dump(report, file, sort_keys=False)
+        logger.info("Stage timings saved to %s", path)
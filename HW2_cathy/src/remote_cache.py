@@ -0,0 +1,131 @@
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger("clouds")
+
+MB = 1024 * 1024
+
+
+class RemoteStageCache:
+    """Stage cache entries shared through an S3 bucket.
+
+    Every entry of the local `StageCache` is also stored as one uncompressed tar
+    object, `<prefix>/<key>.tar`, written through when the entry is stored. On
+    a local miss the object is downloaded with parallel ranged GETs of
+    `part_size_mb` into the local cache, which keeps it as any other entry and
+    evicts it least recently used first, so a fresh machine restores the stages
+    an identical run already computed instead of recomputing them.
+
+    Entries hold pickled stage outputs: the bucket must be trusted like the
+    local cache directory.
+    """
+
+    def __init__(self, s3_client, bucket_name: str, prefix: str = "stage-cache", part_size_mb: float = 8,
+                 max_workers: int = 8):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip("/")
+        self.part_size = max(int(part_size_mb * MB), 1)
+        self.max_workers = max_workers
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}.tar"
+
+    def _get_range(self, s3_key: str, path: Path, start: int, end: int) -> None:
+        body = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key, Range=f"bytes={start}-{end}")["Body"]
+        with open(path, "r+b") as file:
+            file.seek(start)
+            shutil.copyfileobj(body, file, MB)
+
+    def fetch(self, key: str, entry: Path) -> bool:
+        """Download an entry into the local cache.
+
+        Args:
+            key (str): Cache key of the stage.
+            entry (Path): Local directory of the entry, created from the object.
+
+        Returns:
+            bool: Whether the bucket had the entry.
+        """
+        s3_key = self._key(key)
+        try:
+            size = self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)["ContentLength"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        start = time.perf_counter()
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        # Staged next to the entry, with the suffix eviction skips
+        with tempfile.TemporaryDirectory(dir=entry.parent, suffix=".tmp") as staging:
+            archive = Path(staging) / "entry.tar"
+            with open(archive, "wb") as file:
+                file.truncate(size)
+            ranges = [(offset, min(offset + self.part_size, size) - 1) for offset in range(0, size, self.part_size)]
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(ranges), 1))) as pool:
+                # Parts are written at their offset, so they land in any order
+                for future in [pool.submit(self._get_range, s3_key, archive, *part) for part in ranges]:
+                    future.result()
+            with tarfile.open(archive) as tar:
+                tar.extractall(Path(staging) / "entry", filter="data")
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(Path(staging) / "entry", entry)
+        logger.info(
+            "Stage cache entry %s fetched from s3://%s/%s (%d bytes in %d parts, %.3fs)",
+            key[:12], self.bucket_name, s3_key, size, len(ranges), time.perf_counter() - start,
+        )
+        return True
+
+    def push(self, key: str, entry: Path) -> None:
+        """Upload a local entry, unless the bucket already has it.
+
+        Args:
+            key (str): Cache key of the stage.
+            entry (Path): Local directory of the entry.
+        """
+        from src.aws_utils import upload_file
+        from boto3.s3.transfer import TransferConfig
+
+        transfer = TransferConfig(multipart_threshold=self.part_size, multipart_chunksize=self.part_size,
+                                  max_concurrency=self.max_workers)
+        with tempfile.TemporaryDirectory(dir=entry.parent, suffix=".tmp") as staging:
+            archive = Path(staging) / "entry.tar"
+            with tarfile.open(archive, "w") as tar:
+                for path in sorted(entry.rglob("*")):
+                    tar.add(path, arcname=path.relative_to(entry).as_posix(), recursive=False)
+            # Entries are keyed by their inputs, so an existing object holds the same outputs
+            report = upload_file(self.s3_client, archive, self.bucket_name, self._key(key), transfer, content_addressed=True)
+        if not report["skipped"]:
+            logger.info("Stage cache entry %s pushed to %s (%d bytes)", key[:12], report["uri"], report["bytes"])
+
+
+def create_remote(config: dict, aws_config: dict, s3_client=None) -> Optional[RemoteStageCache]:
+    """Remote tier of the `stage_cache.remote` configuration, in the bucket of the AWS configuration.
+
+    Args:
+        config (dict): Remote settings: enabled, prefix, part_size_mb and max_workers.
+        aws_config (dict): AWS configuration, with the bucket name and prefix.
+        s3_client: Client of the remote tier. Defaults to a new pooled client.
+
+    Returns:
+        Optional[RemoteStageCache]: The remote tier, None when it is disabled.
+    """
+    if not config.get("enabled", False):
+        return None
+    if s3_client is None:
+        from src.aws_utils import create_client
+
+        s3_client = create_client(aws_config)
+    prefix = f"{aws_config.get('prefix', '')}/{config.get('prefix', 'stage-cache')}"
+    return RemoteStageCache(
+        s3_client, aws_config["bucket_name"], prefix, config.get("part_size_mb", 8), config.get("max_workers", 8)
+    )
@@ -0,0 +1,312 @@
+import datetime
+import hashlib
+import json
+import logging
+import numbers
+import shutil
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+logger = logging.getLogger("clouds")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    run_dir TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT NOT NULL,
+    config_hash TEXT,
+    model_type TEXT,
+    hyperparam TEXT,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    detail TEXT,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    wall_seconds REAL,
+    cpu_seconds REAL,
+    peak_rss_mb REAL,
+    cached INTEGER,
+    PRIMARY KEY (run_id, stage)
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    bytes INTEGER,
+    digest TEXT,
+    PRIMARY KEY (run_id, path)
+);
+CREATE INDEX IF NOT EXISTS runs_by_time ON runs (finished_at);
+CREATE INDEX IF NOT EXISTS runs_by_model ON runs (model_type, finished_at);
+CREATE INDEX IF NOT EXISTS runs_by_config ON runs (config_hash);
+CREATE INDEX IF NOT EXISTS metrics_by_value ON metrics (name, value);
+"""
+
+
+def config_hash(config: dict) -> str:
+    """Hash a configuration, to find the runs made with the same one."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _read_yaml(path: Path) -> dict:
+    try:
+        with open(path) as file:
+            return yaml.safe_load(file) or {}
+    except OSError:
+        return {}
+
+
+def _started_at(run_dir: Path) -> Optional[str]:
+    """Start time of a run, from the name of its directory."""
+    try:
+        return datetime.datetime.strptime(run_dir.name, "run_%Y%m%d_%H%M%S").isoformat()
+    except ValueError:
+        return None
+
+
+class RunCatalog:
+    """SQLite catalog of the runs of the pipeline, their metrics, stage timings and artifacts.
+
+    Every run is recorded once it finished, so runs are compared with indexed
+    queries instead of parsing the files of every run directory. The catalog is
+    opened in WAL mode, so it is read while a run is being recorded.
+    """
+
+    def __init__(self, path: str = ".cache/catalog.sqlite"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> "RunCatalog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def record_run(self, run_dir: Path, config: Optional[dict] = None, finished_at: Optional[str] = None) -> str:
+        """Record a finished run, replacing an earlier record of the same run.
+
+        The metrics and timings are read from `performance/metrics.yaml` and
+        `performance/timings.yaml` of the run, and the artifacts from its
+        `manifest.json` when it was added to the blob store, or from its files.
+
+        Args:
+            run_dir (Path): Run directory.
+            config (Optional[dict]): Configuration the run was made with, unknown for runs indexed afterwards.
+            finished_at (Optional[str]): ISO time the run finished. Defaults to now.
+
+        Returns:
+            str: Identifier of the run, the name of its directory.
+        """
+        run_dir = Path(run_dir)
+        run_id = run_dir.name
+        model_config = (config or {}).get("train_model", {}).get("model_config", {})
+        metrics = _read_yaml(run_dir / "performance" / "metrics.yaml")
+        timings = _read_yaml(run_dir / "performance" / "timings.yaml").get("stages", {})
+        try:
+            files = json.loads((run_dir / "manifest.json").read_text())["files"]
+        except OSError:
+            files = {
+                path.relative_to(run_dir).as_posix(): {"bytes": path.stat().st_size, "digest": None}
+                for path in run_dir.rglob("*") if path.is_file()
+            }
+
+        with self.connection:
+            self.connection.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            self.connection.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id, str(run_dir.resolve()), _started_at(run_dir),
+                    finished_at or datetime.datetime.now().isoformat(timespec="seconds"),
+                    config_hash(config) if config else None, model_config.get("type"),
+                    json.dumps(model_config.get("hyperparam"), sort_keys=True) if model_config else None,
+                    json.dumps(config, sort_keys=True, default=str) if config else None,
+                ),
+            )
+            self.connection.executemany("INSERT INTO metrics VALUES (?, ?, ?, ?)", [
+                # Scalar metrics are queried by value, the others kept as JSON
+                (run_id, name, float(value), None) if isinstance(value, numbers.Real)
+                else (run_id, name, None, json.dumps(value, default=str))
+                for name, value in metrics.items()
+            ])
+            self.connection.executemany("INSERT INTO timings VALUES (?, ?, ?, ?, ?, ?)", [
+                (run_id, stage, record.get("wall_seconds"), record.get("cpu_seconds"),
+                 record.get("peak_rss_mb"), int(bool(record.get("cached"))))
+                for stage, record in timings.items()
+            ])
+            self.connection.executemany("INSERT INTO artifacts VALUES (?, ?, ?, ?)", [
+                (run_id, path, entry["bytes"], entry["digest"]) for path, entry in files.items()
+            ])
+        logger.info("Run %s recorded in the catalog %s", run_id, self.path)
+        return run_id
+
+    def index(self, runs_dir: Path) -> list[str]:
+        """Record the runs of a directory that are not in the catalog yet, without their configuration.
+
+        Args:
+            runs_dir (Path): Directory of the run directories.
+
+        Returns:
+            list[str]: Identifiers of the runs recorded.
+        """
+        known = {row[0] for row in self.connection.execute("SELECT run_id FROM runs")}
+        recorded = []
+        for run_dir in sorted(Path(runs_dir).glob("run_*")):
+            if run_dir.is_dir() and run_dir.name not in known:
+                finished = datetime.datetime.fromtimestamp(run_dir.stat().st_mtime).isoformat(timespec="seconds")
+                recorded.append(self.record_run(run_dir, finished_at=finished))
+        return recorded
+
+    @staticmethod
+    def _filters(model_type: Optional[str], days: Optional[float]) -> tuple[str, list]:
+        clauses, params = [], []
+        if model_type:
+            clauses.append("runs.model_type = ?")
+            params.append(model_type)
+        if days is not None:
+            since = datetime.datetime.now() - datetime.timedelta(days=days)
+            clauses.append("runs.finished_at >= ?")
+            params.append(since.isoformat(timespec="seconds"))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def list_runs(self, model_type: Optional[str] = None, days: Optional[float] = None, limit: int = 20) -> list[dict]:
+        """Most recent runs, with their scalar metrics.
+
+        Args:
+            model_type (Optional[str]): Only runs of this model type.
+            days (Optional[float]): Only runs finished in the last `days` days.
+            limit (int): Number of runs.
+
+        Returns:
+            list[dict]: Run id, finish time, model type, configuration hash and metrics of every run, latest first.
+        """
+        where, params = self._filters(model_type, days)
+        runs = [dict(row) for row in self.connection.execute(
+            "SELECT run_id, finished_at, model_type, config_hash FROM runs"
+            f"{where} ORDER BY finished_at DESC LIMIT ?", params + [limit]
+        )]
+        for run in runs:
+            run.update(self.connection.execute(
+                "SELECT name, value FROM metrics WHERE run_id = ? AND value IS NOT NULL", (run["run_id"],)
+            ).fetchall())
+        return runs
+
+    def best(self, metric: str, model_type: Optional[str] = None, days: Optional[float] = None,
+             lowest: bool = False) -> Optional[dict]:
+        """Run with the best value of a metric.
+
+        Args:
+            metric (str): Name of a scalar metric, such as roc_auc_score.
+            model_type (Optional[str]): Only runs of this model type.
+            days (Optional[float]): Only runs finished in the last `days` days.
+            lowest (bool): Whether lower values are better.
+
+        Returns:
+            Optional[dict]: Run id, finish time, model type, hyperparameters and metric value, None without runs.
+        """
+        where, params = self._filters(model_type, days)
+        where = (where + " AND" if where else " WHERE") + " metrics.name = ? AND metrics.value IS NOT NULL"
+        row = self.connection.execute(
+            "SELECT runs.run_id, runs.finished_at, runs.model_type, runs.hyperparam, metrics.value"
+            f" FROM runs JOIN metrics ON metrics.run_id = runs.run_id{where}"
+            f" ORDER BY metrics.value {'ASC' if lowest else 'DESC'}, runs.finished_at DESC LIMIT 1",
+            params + [metric],
+        ).fetchone()
+        return dict(row) if row else None
+
+    def diff(self, run_a: str, run_b: str) -> dict:
+        """Differences between two runs.
+
+        Args:
+            run_a (str): Identifier of the first run.
+            run_b (str): Identifier of the second run.
+
+        Returns:
+            dict: The configuration keys, metrics, stage wall times and artifacts that differ,
+                as (first run, second run) pairs.
+
+        Raises:
+            KeyError: If a run is not in the catalog.
+        """
+        runs = {}
+        for run_id in (run_a, run_b):
+            row = self.connection.execute("SELECT config FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                logger.error("Run %s is not in the catalog", run_id)
+                raise KeyError(run_id)
+            runs[run_id] = {
+                "config": _flatten(json.loads(row["config"])) if row["config"] else {},
+                "metrics": {r["name"]: r["value"] if r["value"] is not None else r["detail"] for r in self.connection.execute(
+                    "SELECT name, value, detail FROM metrics WHERE run_id = ?", (run_id,))},
+                "wall_seconds": dict(self.connection.execute(
+                    "SELECT stage, wall_seconds FROM timings WHERE run_id = ?", (run_id,)).fetchall()),
+                "artifacts": dict(self.connection.execute(
+                    "SELECT path, COALESCE(digest, bytes) FROM artifacts WHERE run_id = ?", (run_id,)).fetchall()),
+            }
+        a, b = runs[run_a], runs[run_b]
+        return {
+            section: {
+                key: (a[section].get(key), b[section].get(key))
+                for key in sorted(set(a[section]) | set(b[section]))
+                if a[section].get(key) != b[section].get(key)
+            }
+            for section in a
+        }
+
+    def prune(self, keep: Optional[int] = None, older_than_days: Optional[float] = None,
+              delete_files: bool = False) -> list[str]:
+        """Remove runs from the catalog: all but the `keep` latest, or the ones older than `older_than_days`.
+
+        Args:
+            keep (Optional[int]): Number of latest runs kept.
+            older_than_days (Optional[float]): Age in days past which runs are removed.
+            delete_files (bool): Whether to also delete the run directories.
+
+        Returns:
+            list[str]: Identifiers of the runs removed.
+        """
+        pruned = set()
+        if keep is not None:
+            pruned.update(row[0] for row in self.connection.execute(
+                "SELECT run_id FROM runs ORDER BY finished_at DESC LIMIT -1 OFFSET ?", (keep,)))
+        if older_than_days is not None:
+            since = datetime.datetime.now() - datetime.timedelta(days=older_than_days)
+            pruned.update(row[0] for row in self.connection.execute(
+                "SELECT run_id FROM runs WHERE finished_at < ?", (since.isoformat(timespec="seconds"),)))
+        pruned = sorted(pruned)
+        if delete_files:
+            for run_id in pruned:
+                run_dir = self.connection.execute("SELECT run_dir FROM runs WHERE run_id = ?", (run_id,)).fetchone()[0]
+                shutil.rmtree(run_dir, ignore_errors=True)
+        with self.connection:
+            self.connection.executemany("DELETE FROM runs WHERE run_id = ?", [(run_id,) for run_id in pruned])
+        logger.info("Pruned %d runs from the catalog %s", len(pruned), self.path)
+        return pruned
+
+
+def _flatten(config: dict, prefix: str = "") -> dict:
+    """Configuration as a flat mapping of dotted keys, to compare two configurations key by key."""
+    flat = {}
+    for key, value in config.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
@@ -0,0 +1,190 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Sequence
+
+import yaml
+
+logger = logging.getLogger("clouds")
+
+KINDS = ("cpu", "io")
+
+# Modules of the functions run in worker processes, imported once by the forkserver
+WORKER_MODULES = ["src.analysis", "src.tune_model", "src.sweep"]
+
+
+def process_context() -> multiprocessing.context.BaseContext:
+    """Start method of the worker process pools of the stages.
+
+    Stages run on the threads of the scheduler while other threads may hold locks
+    (logging, BLAS and OpenMP pools, tracemalloc), and a process forked in that
+    state can deadlock on them. Workers are started from a fresh forkserver
+    process instead, or spawned where there is none. The forkserver imports the
+    modules of the workers once, so the pools of later stages start quickly.
+
+    Returns:
+        multiprocessing.context.BaseContext: Context to pass as `mp_context` to a ProcessPoolExecutor.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(WORKER_MODULES)
+    return context
+
+
+class Scheduler:
+    """Runs a dependency graph of tasks on a thread pool.
+
+    A task starts as soon as all its dependencies finished, and is called with
+    their results as arguments, in the order of its dependencies. At most
+    `cpu_slots` tasks of kind "cpu" run at once, so CPU-bound stages do not
+    compete for the cores, while tasks of kind "io" (saving, plotting in worker
+    processes, uploading) fill the remaining workers and overlap with them. With
+    `max_workers=1`, tasks run one after another in the order they were added.
+    """
+
+    def __init__(self, max_workers: int = 4, cpu_slots: int = 1):
+        self.max_workers = max(1, max_workers)
+        self.cpu_slots = max(1, cpu_slots)
+        self.tasks: dict[str, dict] = {}
+        self.timings: dict[str, dict] = {}
+        self._start = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, fn: Callable, deps: Sequence[str] = (), kind: str = "cpu") -> None:
+        """Add a task to the graph.
+
+        Args:
+            name (str): Unique name of the task.
+            fn (Callable): Function called with the results of the dependencies.
+            deps (Sequence[str]): Names of the tasks that must finish first, added before this one.
+            kind (str): "cpu" for CPU-bound tasks, "io" for the others.
+
+        Raises:
+            NotImplementedError: If the name is taken, a dependency is unknown or the kind is not supported.
+        """
+        if name in self.tasks:
+            logger.error("Task %s is already scheduled", name)
+            raise NotImplementedError(f"Task {name} is already scheduled")
+        unknown = [dep for dep in deps if dep not in self.tasks]
+        if unknown:
+            logger.error("Task %s depends on unknown tasks %s", name, unknown)
+            raise NotImplementedError(f"Task {name} depends on unknown tasks {unknown}")
+        if kind not in KINDS:
+            logger.error("Unsupported task kind %s, expected one of %s", kind, KINDS)
+            raise NotImplementedError(f"Unsupported task kind {kind}")
+        self.tasks[name] = {"fn": fn, "deps": list(deps), "kind": kind}
+
+    def _call(self, name: str, args: list) -> object:
+        started = time.perf_counter()
+        try:
+            return self.tasks[name]["fn"](*args)
+        finally:
+            ended = time.perf_counter()
+            with self._lock:
+                self.timings[name] = {
+                    "kind": self.tasks[name]["kind"],
+                    "start_seconds": round(started - self._start, 6),
+                    "end_seconds": round(ended - self._start, 6),
+                    "seconds": round(ended - started, 6),
+                }
+
+    def run(self) -> dict:
+        """Run every task once its dependencies finished.
+
+        When a task fails, no further task is started and, once the running tasks
+        finished, the error of the first failed task is raised.
+
+        Returns:
+            dict: Result of every task, by name.
+        """
+        results: dict[str, object] = {}
+        pending = list(self.tasks)
+        running = {}
+        self._start = time.perf_counter()
+        error = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                if error is None:
+                    cpu_running = sum(self.tasks[name]["kind"] == "cpu" for name in running.values())
+                    for name in list(pending):
+                        if len(running) >= self.max_workers:
+                            break
+                        task = self.tasks[name]
+                        if any(dep not in results for dep in task["deps"]):
+                            continue
+                        if task["kind"] == "cpu":
+                            if cpu_running >= self.cpu_slots:
+                                continue
+                            cpu_running += 1
+                        pending.remove(name)
+                        future = pool.submit(self._call, name, [results[dep] for dep in task["deps"]])
+                        running[future] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except BaseException as exc:
+                        logger.error("Task %s failed: %s", name, exc)
+                        error = error or exc
+        if error is not None:
+            raise error
+        return results
+
+    def critical_path(self) -> tuple[list[str], float]:
+        """Find the chain of dependent tasks with the longest total duration in the last run.
+
+        It bounds the duration of the run however many workers are used.
+
+        Returns:
+            tuple[list[str], float]: Names of the tasks on the path and its duration in seconds.
+        """
+        best: dict[str, tuple[float, list[str]]] = {}
+        for name, task in self.tasks.items():  # Tasks are added after their dependencies
+            if name not in self.timings:
+                continue
+            before = max((best[dep] for dep in task["deps"] if dep in best), default=(0.0, []))
+            best[name] = (before[0] + self.timings[name]["seconds"], before[1] + [name])
+        seconds, path = max(best.values(), default=(0.0, []))
+        return path, round(seconds, 6)
+
+    def report(self) -> dict:
+        """Summarize the last run.
+
+        Returns:
+            dict: Wall time, summed task time, critical path and timing of every task.
+        """
+        path, seconds = self.critical_path()
+        wall = max((timing["end_seconds"] for timing in self.timings.values()), default=0.0)
+        return {
+            "max_workers": self.max_workers,
+            "cpu_slots": self.cpu_slots,
+            "wall_seconds": wall,
+            "task_seconds": round(sum(timing["seconds"] for timing in self.timings.values()), 6),
+            "critical_path": path,
+            "critical_path_seconds": seconds,
+            "tasks": {name: {**self.timings[name], "deps": self.tasks[name]["deps"]}
+                      for name in self.tasks if name in self.timings},
+        }
+
+    def save_report(self, path: Path) -> None:
+        """Write the report of the last run to a YAML file.
+
+        Args:
+            path (Path): Path of the schedule report.
+        """
+        report = self.report()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as file:
+            yaml.safe_dump(report, file, sort_keys=False)
+        logger.info(
+            "Critical path %s took %.3fs of %.3fs wall",
+            " -> ".join(report["critical_path"]), report["critical_path_seconds"], report["wall_seconds"],
+        )
@@ -1,11 +1,86 @@
 from pathlib import Path
 from typing import Tuple
 import logging
+import os
+import pickle
+import time
+import numpy as np
 import pandas as pd
 
+from src.artifact_io import iter_frame, save_frame
+
 logger = logging.getLogger("clouds")
 
 
+def load_model(path: Path, mmap: bool = True) -> object:
+    """
+    Load a trained model binary once, to score any number of inputs with it.
+
+    Binaries saved in the pickle or joblib format are both loaded. The numpy
+    arrays of an uncompressed joblib binary are memory-mapped read-only, but
+    sklearn trees copy their node arrays into buffers of their own when they are
+    unpickled, so the nodes of a forest are never shared between processes. A
+    directory is loaded as a forest flattened by `FlatForest`, whose memory-mapped
+    node arrays are shared through the page cache by the processes loading them.
+
+    Args:
+        path (Path): Path of the model binary, or of the directory of a flattened forest.
+        mmap (bool): Whether to memory-map the arrays of an uncompressed joblib binary or a flattened forest.
+
+    Returns:
+        object: Trained model.
+
+    Raises:
+        NotImplementedError: If the model cannot be loaded.
+    """
+    import joblib
+
+    start = time.perf_counter()
+    if Path(path).is_dir():
+        from src.flat_forest import FlatForest
+
+        model = FlatForest.load(path, mmap)
+        logger.info("Flattened forest loaded from %s in %.3fs", path, time.perf_counter() - start)
+        return model
+    try:
+        with open(path, "rb") as file:
+            # Pickle streams start with the PROTO opcode, compressed joblib binaries with their codec magic
+            compressed = file.read(1) != pickle.PROTO
+        # Compressed binaries cannot be memory-mapped
+        model = joblib.load(path, mmap_mode="r" if mmap and not compressed else None)
+    except (OSError, pickle.UnpicklingError, ValueError, EOFError) as e:
+        logger.error("Failed to load model from %s due to %s", path, e)
+        raise NotImplementedError from e
+    logger.info("Model loaded from %s (%d bytes in %.3fs)", path, os.path.getsize(path), time.perf_counter() - start)
+    return model
+
+
+def predict(model: object, x: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Predict the positive class probability and the class of every row in one pass.
+
+    The class is the one with the highest probability, which is what `predict` of
+    probabilistic classifiers such as random forests returns, so the model is only
+    evaluated once. Single rows are scored with `predict_row` when the model has
+    one, as flattened forests do.
+
+    Args:
+        model (object): Trained classifier with `predict_proba` and `classes_`.
+        x (pd.DataFrame): Features of the rows to score, or an array of them in the order of the model.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Probabilities of the positive class and predicted classes.
+    """
+    if len(x) == 1 and hasattr(model, "predict_row"):
+        proba = np.asarray([model.predict_row(np.asarray(x, dtype=np.float64)[0])])
+    else:
+        if isinstance(x, np.ndarray) and hasattr(model, "feature_names_in_"):
+            # Arrays, such as the ones of a feature transform, are in the order of the model features
+            x = pd.DataFrame(x, columns=model.feature_names_in_, copy=False)
+        proba = model.predict_proba(x)
+    return proba[:, 1], model.classes_.take(np.argmax(proba, axis=1))
+
+
 def score_model(test: pd.DataFrame, model: object, config: dict) -> Tuple[list, list]:
     """
     Score a saved model using test data.
@@ -21,30 +96,67 @@ def score_model(test: pd.DataFrame, model: object, config: dict) -> Tuple[list,
     initial_features = config["initial_features"]
     x_test = test[initial_features]
 
-    ypred_proba_test = model.predict_proba(x_test)[:, 1]  # Probabilities of the positive class
-    ypred_bin_test = model.predict(x_test)               # Binary predictions
+    ypred_proba_test, ypred_bin_test = predict(model, x_test)
     logger.info("Model predictions (probability and class) created.")
 
     return ypred_proba_test, ypred_bin_test  # Parentheses are optional
 
 
-def save_scores(scores: Tuple[list, list], path: Path) -> None:
+def score_file(model: object, input_path: Path, output_path: Path, config: dict, transform=None) -> int:
     """
-    Save the output of the model to a CSV file.
+    Score a file of any size in fixed-size blocks and stream the scores to a CSV file.
+
+    Only one block of rows and its predictions are held in memory at a time.
+
+    Args:
+        model (object): Trained model to score.
+        input_path (Path): CSV, Parquet, Feather or npy file holding the model features,
+            or the raw columns of `transform`.
+        output_path (Path): Path to save model outputs.
+        config (dict): Configurations for scoring the model including feature selection.
+        transform (Optional[FeatureTransform]): Feature transform saved with the model, to score raw rows.
+
+    Returns:
+        int: Number of rows scored.
+    """
+    chunksize = config.get("chunksize", 100_000)
+    rows = 0
+    with open(output_path, "w", newline="") as output:
+        pd.DataFrame(columns=["Probability", "Class"]).to_csv(output, index=False)
+        columns = transform.columns if transform is not None else config["initial_features"]
+        for x in iter_frame(input_path, columns, chunksize):
+            if transform is not None:
+                x = transform.transform(x.to_numpy(dtype=np.float64))
+            pred_prob, pred_class = predict(model, x)
+            pd.DataFrame({"Probability": pred_prob, "Class": pred_class}).to_csv(
+                output, header=False, index=False
+            )
+            rows += len(x)
+    logger.info("%d rows of %s scored to %s", rows, input_path, output_path)
+    return rows
+
+
+def save_scores(scores: Tuple[list, list], path: Path, fmt: str = "csv") -> Path:
+    """
+    Save the output of the model to a file.
 
     Args:
         scores (Tuple[list, list]): Predicted scores of the model, including probabilities and classes.
-        path (Path): Path to save model outputs.
+        path (Path): Path to save model outputs, its suffix is set by `fmt`.
+        fmt (str): csv, or parquet, feather or npy for fast binary artifacts.
+
+    Returns:
+        Path: Path the predictions were saved to.
 
     Raises:
-        Exception: Raises an exception if saving the predictions to CSV fails.
+        Exception: Raises an exception if saving the predictions fails.
     """
     pred_prob, pred_class = scores  # Unpacking for clarity
     out = pd.DataFrame({"Probability": pred_prob, "Class": pred_class})
     try:
-        out.to_csv(path, index=False)  # Optionally avoid saving DataFrame index if not required
+        path = save_frame(out, path, fmt)
         logger.info("Model predictions saved to %s", path)
     except Exception as e:
         logger.error("Model predictions failed to save to %s due to %s", path, e)
         raise Exception("Error saving model predictions: {}".format(e)) from e
-
+    return path
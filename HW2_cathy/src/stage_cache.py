@@ -0,0 +1,210 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("clouds")
+
+# Bumped when the object a stage returns changes shape, so older entries are not loaded
+CACHE_VERSION = 2
+
+
+def file_digest(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Compute the SHA-256 digest of a file without loading it in memory.
+
+    Args:
+        path (Path): File to hash.
+        chunk_size (int): Number of bytes read at once.
+
+    Returns:
+        str: Hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StageCache:
+    """Local content-addressed cache of pipeline stage outputs.
+
+    An entry is keyed by the stage name, its slice of the configuration and the
+    digests of its inputs. It holds the pickled object returned by the stage, the
+    files the stage wrote in the run directory, and the digest of the object,
+    which is the input digest of the downstream stages. As the files are written
+    from the object, the digest is known before they are, so downstream stages
+    can start while the files are being saved. Entries are evicted least recently
+    used first once the cache grows past `max_size_mb`.
+
+    With a `remote` tier, such as `RemoteStageCache`, entries are also stored
+    remotely, and local misses are fetched from it before the stage is computed.
+    """
+
+    def __init__(self, cache_dir: str = ".cache/stages", max_size_mb: float = 2048, enabled: bool = True,
+                 remote=None):
+        self.root = Path(cache_dir)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.enabled = enabled
+        self.remote = remote
+
+    @staticmethod
+    def stage_key(stage: str, config: object, upstream: list[str]) -> str:
+        """Compute the cache key of a stage.
+
+        Args:
+            stage (str): Name of the stage.
+            config (object): Configuration read by the stage.
+            upstream (list[str]): Digests of the stage inputs.
+
+        Returns:
+            str: Hex key of the stage.
+        """
+        identity = json.dumps(
+            {"version": CACHE_VERSION, "stage": stage, "config": config, "upstream": upstream}, sort_keys=True, default=str
+        )
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def serialize(self, payload: object) -> Optional[bytes]:
+        """Pickle a stage output once, for both `digest` and `store`.
+
+        Args:
+            payload (object): Object returned by the stage.
+
+        Returns:
+            Optional[bytes]: The pickled output, or None when the cache is disabled.
+        """
+        if not self.enabled:
+            return None
+        return pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def digest(self, key: str, payload: object, data: Optional[bytes] = None) -> str:
+        """Compute the digest of a stage output.
+
+        Args:
+            key (str): Cache key of the stage.
+            payload (object): Object returned by the stage.
+            data (Optional[bytes]): The output pickled by `serialize`, to not pickle it again.
+
+        Returns:
+            str: Digest of the stage output, or the stage key when the cache is disabled.
+        """
+        if not self.enabled:
+            return key
+        return hashlib.sha256(self.serialize(payload) if data is None else data).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def load(self, key: str, destination: Path) -> Optional[tuple[object, str]]:
+        """Restore a cached stage output.
+
+        Args:
+            key (str): Cache key of the stage.
+            destination (Path): Run directory the cached files are copied into.
+
+        Returns:
+            Optional[tuple[object, str]]: The stage output and its digest, or None on a miss.
+        """
+        entry = self._entry(key)
+        if not self.enabled:
+            return None
+        if not (entry / "digest").exists() and not self._fetch(key, entry):
+            return None
+        try:
+            files = entry / "files"
+            for root, _, names in os.walk(files):
+                for name in names:
+                    cached = Path(root) / name
+                    target = destination / cached.relative_to(files)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(cached, target)
+            with open(entry / "payload.pkl", "rb") as file:
+                payload = pickle.load(file)
+            digest = (entry / "digest").read_text()
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning("Ignoring unreadable cache entry %s: %s", entry, e)
+            return None
+        # Mark the entry as recently used
+        os.utime(entry)
+        return payload, digest
+
+    def store(self, key: str, payload: object, files: list[Path], base: Path, data: Optional[bytes] = None) -> str:
+        """Cache the output of a stage.
+
+        Args:
+            key (str): Cache key of the stage.
+            payload (object): Object returned by the stage, passed to the downstream stages.
+            files (list[Path]): Files written by the stage.
+            base (Path): Run directory the files are stored relative to.
+            data (Optional[bytes]): The output pickled by `serialize`, to not pickle it again.
+
+        Returns:
+            str: Digest of the stage output, or the stage key when the cache is disabled.
+        """
+        if not self.enabled:
+            return key
+        if data is None:
+            data = self.serialize(payload)
+        digest = hashlib.sha256(data).hexdigest()
+
+        entry = self._entry(key)
+        staging = entry.with_name(f"{key}.{os.getpid()}.tmp")
+        try:
+            shutil.rmtree(staging, ignore_errors=True)
+            for path in files:
+                target = staging / "files" / Path(path).relative_to(base)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(path, target)
+            staging.mkdir(parents=True, exist_ok=True)
+            (staging / "payload.pkl").write_bytes(data)
+            (staging / "digest").write_text(digest)
+            shutil.rmtree(entry, ignore_errors=True)
+            staging.rename(entry)
+        except OSError as e:
+            logger.warning("Failed to cache stage output %s: %s", key, e)
+            shutil.rmtree(staging, ignore_errors=True)
+            return digest
+        if self.remote is not None:
+            try:
+                self.remote.push(key, entry)
+            except Exception as e:
+                logger.warning("Failed to push stage output %s to the remote cache: %s", key, e)
+        self.evict()
+        return digest
+
+    def _fetch(self, key: str, entry: Path) -> bool:
+        """Fetch a missing entry from the remote tier into the local cache."""
+        if self.remote is None:
+            return False
+        try:
+            fetched = self.remote.fetch(key, entry)
+        except Exception as e:
+            logger.warning("Failed to fetch stage output %s from the remote cache: %s", key, e)
+            return False
+        if fetched:
+            self.evict()
+        return fetched and (entry / "digest").exists()
+
+    def evict(self) -> None:
+        """Delete the least recently used entries until the cache fits in its size limit."""
+        entries = []
+        for entry in self.root.glob("*/*"):
+            if entry.suffix == ".tmp" or not entry.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except OSError:  # Removed by a concurrent eviction
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.info("Evicted stage cache entry %s", entry.name)
@@ -0,0 +1,254 @@
+import copy
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+import src.acquire_data as ad
+import src.create_dataset as cd
+import src.evaluate_performance as ep
+import src.generate_features as gf
+import src.score_model as sm
+import src.train_model as tm
+from src.artifact_io import load_frame, save_frame
+from src.scheduler import process_context
+
+logger = logging.getLogger("clouds")
+
+
+def deep_merge(base: dict, override: dict) -> dict:
+    """Merge an override into a copy of a configuration.
+
+    Mappings are merged key by key; any other value of the override, lists
+    included, replaces the one of the base.
+
+    Args:
+        base (dict): Base configuration.
+        override (dict): Values to change.
+
+    Returns:
+        dict: The merged configuration.
+    """
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def config_hash(config: object) -> str:
+    """Hash a slice of the configuration, independently of the order of its keys."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def build_variants(base: dict, overrides: list) -> dict[str, dict]:
+    """Apply every override to the base configuration.
+
+    Args:
+        base (dict): Base configuration.
+        overrides (list): Entries with a unique `name` and the `overrides` to merge.
+
+    Returns:
+        dict[str, dict]: Configuration of every variant, by name.
+
+    Raises:
+        NotImplementedError: If two variants have the same name.
+    """
+    variants = {}
+    for entry in overrides:
+        name = str(entry["name"])
+        if name in variants:
+            logger.error("Variant %s is defined twice", name)
+            raise NotImplementedError(f"Variant {name} is defined twice")
+        variants[name] = deep_merge(base, entry.get("overrides", {}))
+    return variants
+
+
+def shared_features(
+    data: pd.DataFrame, configs: dict[str, dict], fit_rows: Optional[np.ndarray] = None
+) -> dict[str, pd.DataFrame]:
+    """Generate the features of several generate_features configurations in one pass.
+
+    Every feature_eng entry of every configuration is compiled into one plan,
+    so a column (or subexpression) defined the same way by several variants is
+    only computed once, even if its target name differs.
+
+    Args:
+        data (pd.DataFrame): Clean dataset shared by the configurations.
+        configs (dict[str, dict]): generate_features configuration, by key.
+        fit_rows (Optional[np.ndarray]): Positions of the rows fitted operations are fitted on,
+            the train rows shared by the configurations. Defaults to every row.
+
+    Returns:
+        dict[str, pd.DataFrame]: Features of every configuration, by key, as `gf.generate_features` builds them.
+    """
+    plan = gf.FeaturePlan()
+    targets = {}
+    for key, config in configs.items():
+        # Target names only resolve within their own configuration
+        plan.targets = {}
+        for operation in config["feature_eng"]:
+            plan.add_target(operation)
+        targets.update({(key, target): node for target, node in plan.targets.items()})
+    plan.targets = targets
+    logger.info(
+        "%d feature columns of %d configurations computed with %d operations",
+        len(targets), len(configs), sum(function is not None for function, _ in plan.nodes),
+    )
+    values = plan.fit(data, fit_rows).evaluate(data, max(config.get("block_size", 65536) for config in configs.values()))
+
+    return {
+        key: gf.assemble_features(
+            data, config, {operation["target"]: values[(key, operation["target"])] for operation in config["feature_eng"]}
+        )
+        for key, config in configs.items()
+    }
+
+
+def run_variant(task: tuple) -> dict:
+    """Train, score and evaluate one variant on its shared features, in a worker process.
+
+    Args:
+        task (tuple): Variant name, configuration, path of the features and run directory.
+
+    Returns:
+        dict: Metrics of the variant.
+    """
+    name, config, features_path, run_dir = task
+    start = time.perf_counter()
+    features = load_frame(features_path)
+    model_dir = run_dir / config["train_model"]["model_dir"]
+    model_dir.mkdir(parents=True, exist_ok=True)
+
+    train_config = config["train_model"]
+    if train_config.get("search", {}).get("enabled", False):
+        import src.tune_model as tune
+
+        hyperparam, leaderboard = tune.search_hyperparameters(features, train_config)
+        tune.save_leaderboard(leaderboard, model_dir / "leaderboard.csv")
+        train_config = {**train_config, "model_config": {**train_config["model_config"], "hyperparam": hyperparam}}
+    model, train, test = tm.train_model(features, train_config)
+    tm.save_model(model, model_dir / "trained_model_object.pkl", train_config.get("serialization"))
+
+    scores = sm.score_model(test, model, config["score_model"])
+    score_dir = run_dir / config["score_model"]["score_dir"]
+    score_dir.mkdir(parents=True, exist_ok=True)
+    sm.save_scores(scores, score_dir / "scores", config["score_model"].get("artifact_format", "csv"))
+
+    metrics = ep.evaluate_performance(test, scores, config["evaluate_performance"])
+    metric_dir = run_dir / config["evaluate_performance"]["metric_dir"]
+    metric_dir.mkdir(parents=True, exist_ok=True)
+    ep.save_metrics(metrics, metric_dir / "metrics.yaml")
+    logger.info("Variant %s done in %.2fs", name, time.perf_counter() - start)
+    return metrics
+
+
+def comparison_table(metrics: dict[str, dict]) -> pd.DataFrame:
+    """Tabulate the scalar metrics of every variant.
+
+    Args:
+        metrics (dict[str, dict]): Metrics of every variant, by name.
+
+    Returns:
+        pd.DataFrame: One row per variant, one column per scalar metric.
+    """
+    rows = {
+        name: {metric: value for metric, value in values.items() if isinstance(value, (int, float))}
+        for name, values in metrics.items()
+    }
+    return pd.DataFrame.from_dict(rows, orient="index").rename_axis("variant")
+
+
+def run_sweep(base: dict, overrides: list, sweep_dir: Path, n_jobs: Optional[int] = None) -> pd.DataFrame:
+    """Run every variant, computing the stages they share once.
+
+    The source is downloaded once per data source, cleaned once per
+    create_dataset configuration, and the features of all variants built from
+    the same dataset are generated in one pass. Each distinct feature frame is
+    saved once as a Feather file, which the worker processes memory-map to
+    train, score and evaluate their variants in parallel.
+
+    Args:
+        base (dict): Base configuration.
+        overrides (list): Entries with a unique `name` and the `overrides` to merge.
+        sweep_dir (Path): Directory of the shared artifacts and of the variant runs.
+        n_jobs (Optional[int]): Number of worker processes. Defaults to one per CPU.
+
+    Returns:
+        pd.DataFrame: Comparison table of the metrics, also saved to `comparison.csv`.
+
+    Raises:
+        NotImplementedError: If a variant fails.
+    """
+    variants = build_variants(base, overrides)
+    shared_dir = sweep_dir / "shared"
+    shared_dir.mkdir(parents=True, exist_ok=True)
+
+    raw_paths = {}
+    for config in variants.values():
+        source = config["run_config"]["data_source"]
+        if source not in raw_paths:
+            download_config = config["run_config"].get("download", {})
+            raw_paths[source] = shared_dir / "raw" / config_hash(source) / "clouds.data"
+            ad.acquire_data(source, raw_paths[source], download_config.get("cache_dir"), download_config)
+
+    # Variants are grouped by their dataset, then by their train/test split, whose train rows
+    # the fitted operations are fitted on, then by their features
+    datasets = {}
+    for name, config in variants.items():
+        dataset_key = config_hash([config["run_config"]["data_source"], config["create_dataset"]])
+        split_key = config_hash(config["train_model"]["train_test_split"])
+        datasets.setdefault(dataset_key, {}).setdefault(split_key, {}).setdefault(
+            config_hash(config["generate_features"]), []
+        ).append(name)
+    logger.info(
+        "%d variants share %d datasets and %d feature sets",
+        len(variants), len(datasets),
+        sum(len(groups) for splits in datasets.values() for groups in splits.values()),
+    )
+
+    tasks = []
+    for dataset_key, splits in datasets.items():
+        config = variants[next(iter(next(iter(splits.values())).values()))[0]]
+        data = cd.create_dataset(raw_paths[config["run_config"]["data_source"]], config["create_dataset"])
+        for split_key, groups in splits.items():
+            fitted = all(
+                gf.compile_features(variants[names[0]]["generate_features"]["feature_eng"]).fitted
+                for names in groups.values()
+            )
+            train_config = variants[next(iter(groups.values()))[0]]["train_model"]
+            train_rows = None if fitted else tm.fit_rows(len(data), train_config)
+            features = shared_features(
+                data, {key: variants[names[0]]["generate_features"] for key, names in groups.items()}, train_rows
+            )
+            for key, names in groups.items():
+                features_path = save_frame(
+                    features[key], shared_dir / f"features_{dataset_key}_{split_key}_{key}", "feather"
+                )
+                for name in names:
+                    tasks.append((name, variants[name], features_path, sweep_dir / "variants" / name))
+            del features
+        del data
+
+    metrics = {}
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=process_context()) as pool:
+        futures = {task[0]: pool.submit(run_variant, task) for task in tasks}
+        for name, future in futures.items():
+            try:
+                metrics[name] = future.result()
+            except Exception as e:
+                logger.error("Variant %s failed: %s", name, e)
+                raise NotImplementedError from e
+
+    table = comparison_table({name: metrics[name] for name in variants})
+    table.to_csv(sweep_dir / "comparison.csv")
+    logger.info("Comparison of %d variants saved to %s", len(table), sweep_dir / "comparison.csv")
+    return table
@@ -1,36 +1,119 @@
 from importlib import import_module
 from pathlib import Path
+from typing import Optional
 import os
 import pickle
 import logging
+import time
+import numpy as np
 import pandas as pd
-import sklearn
+import sklearn.model_selection
+
+from src.artifact_io import save_frame
 
 logger = logging.getLogger("clouds")
 
 
-def train_model(data: pd.DataFrame, config: dict) -> tuple[object, pd.DataFrame, pd.DataFrame]:
-    """Train a model based on configuration settings.
+def split_data(data: pd.DataFrame, config: dict) -> tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
+    """Split the features and target into train and test sets.
 
     Args:
         data (pd.DataFrame): Data for the model to be trained on.
-        config (dict): Configuration for model training including feature selection and hyperparameters.
+        config (dict): Configuration for model training including the train/test split.
 
     Returns:
-        A tuple containing the trained model, and the train and test dataframes.
+        A tuple containing the train features, test features, train target and test target.
     """
     features = data[config["initial_features"]]
     target = data[config["target"]]
-    model_config = config["model_config"]
+    split_config = config["train_test_split"]
+    return sklearn.model_selection.train_test_split(
+        features,
+        target,
+        test_size=split_config["test_size"],
+        random_state=split_config.get("random_state"),
+    )
+
+
+def split_rows(n_rows: int, config: dict) -> tuple[np.ndarray, np.ndarray]:
+    """Positions of the train and test rows, the same rows `split_data` selects.
+
+    Args:
+        n_rows (int): Number of rows of the data.
+        config (dict): Configuration for model training including the train/test split.
+
+    Returns:
+        A tuple containing the positions of the train rows and of the test rows.
+    """
+    split_config = config["train_test_split"]
+    return sklearn.model_selection.train_test_split(
+        np.arange(n_rows),
+        test_size=split_config["test_size"],
+        random_state=split_config.get("random_state"),
+    )
+
+
+def fit_rows(n_rows: int, config: dict) -> np.ndarray:
+    """Positions of the train rows that the fitted feature operations are fitted on.
+
+    The features are generated before the model is trained, which draws its
+    split again, so both only select the same rows with a fixed `random_state`.
+
+    Args:
+        n_rows (int): Number of rows of the data.
+        config (dict): Configuration for model training including the train/test split.
+
+    Returns:
+        np.ndarray: Positions of the train rows.
+
+    Raises:
+        NotImplementedError: If the train/test split has no random_state.
+    """
+    if config["train_test_split"].get("random_state") is None:
+        logger.error("Fitted feature operations need a train_test_split.random_state, or test rows leak into them")
+        raise NotImplementedError("Fitted feature operations need a train_test_split.random_state")
+    return split_rows(n_rows, config)[0]
+
+
+def build_model(model_config: dict) -> object:
+    """Instantiate the configured, unfitted model.
 
+    Args:
+        model_config (dict): Library, class name and hyperparameters of the model.
+
+    Returns:
+        object: Unfitted model.
+    """
     # Dynamic library and model import based on config
     model_lib = import_module(model_config["model_lib"])
     model_class = getattr(model_lib, model_config["type"])
-    model = model_class(**model_config["hyperparam"])
+    return model_class(**model_config["hyperparam"])
 
-    x_train, x_test, y_train, y_test = sklearn.model_selection.train_test_split(
-        features, target, test_size=config["train_test_split"]["test_size"]
-    )
+
+def train_model(data: pd.DataFrame, config: dict) -> tuple[object, pd.DataFrame, pd.DataFrame]:
+    """Train a model based on configuration settings.
+
+    Args:
+        data (pd.DataFrame): Data for the model to be trained on.
+        config (dict): Configuration for model training including feature selection and hyperparameters.
+
+    Returns:
+        A tuple containing the trained model, and the train and test dataframes.
+    """
+    model = build_model(config["model_config"])
+
+    if config.get("low_memory", False):
+        # The rows of the model columns are taken once, into one train and one test
+        # frame; taking the features of the train frame for the fit copies them again
+        train_rows, test_rows = split_rows(len(data), config)
+        columns = [data.columns.get_loc(name) for name in config["initial_features"] + [config["target"]]]
+        train = data.iloc[train_rows, columns]
+        test = data.iloc[test_rows, columns]
+        model.fit(train.iloc[:, :-1], train.iloc[:, -1])
+        logger.info("Model successfully trained")
+        return model, train, test
+
+    x_train, x_test, y_train, y_test = split_data(data, config)
 
     model.fit(x_train, y_train)
     logger.info("Model successfully trained")
@@ -45,31 +128,66 @@ def train_model(data: pd.DataFrame, config: dict) -> tuple[object, pd.DataFrame,
     return model, train, test
 
 
-def save_data(train: pd.DataFrame, test: pd.DataFrame, path: Path) -> None:
+def save_data(train: pd.DataFrame, test: pd.DataFrame, path: Path, fmt: str = "csv") -> list[Path]:
     """Save train and test datasets to specified directory.
 
     Args:
         train (pd.DataFrame): Training dataset.
         test (pd.DataFrame): Testing dataset.
         path (Path): Path to save datasets.
-    """
-    train_path = path / "train.csv"
-    test_path = path / "test.csv"
+        fmt (str): csv, or parquet, feather or npy for fast binary artifacts.
 
-    train.to_csv(train_path, index=False)
+    Returns:
+        list[Path]: Paths of the train and test datasets.
+    """
+    train_path = save_frame(train, path / "train", fmt)
     logger.info("Train dataset successfully saved to %s", train_path)
 
-    test.to_csv(test_path, index=False)
+    test_path = save_frame(test, path / "test", fmt)
     logger.info("Test dataset successfully saved to %s", test_path)
+    return [train_path, test_path]
 
 
-def save_model(model: object, path: Path) -> None:
+def save_model(model: object, path: Path, config: Optional[dict] = None) -> dict:
     """Save a trained model to a specified path.
 
+    By default the model is pickled with the highest protocol, whose framing
+    makes the binary fastest to load. The joblib format stores the numpy arrays
+    of the model apart from the pickle stream, so they can be memory-mapped when
+    the model is loaded, or compressed (at the cost of the memory-mapping). The
+    node arrays of sklearn trees are copied when unpickled whatever the format.
+
     Args:
         model (object): Trained model.
         path (Path): Path to save the model binary.
+        config (Optional[dict]): Serialization settings: format (pickle or joblib)
+            and compress (joblib compression level, 0 to 9). Defaults to pickle.
+
+    Returns:
+        dict: Format, compression, size in bytes and seconds taken to save the model.
+
+    Raises:
+        NotImplementedError: If the format is not supported.
     """
-    with open(path, "wb") as file:
-        pickle.dump(model, file)
-        logger.info("Model binary successfully saved to %s", path)
+    config = config or {}
+    fmt = config.get("format", "pickle")
+    compress = config.get("compress", 0)
+    start = time.perf_counter()
+    if fmt == "pickle":
+        with open(path, "wb") as file:
+            pickle.dump(model, file, protocol=pickle.HIGHEST_PROTOCOL)
+    elif fmt == "joblib":
+        import joblib
+
+        joblib.dump(model, path, compress=compress, protocol=pickle.HIGHEST_PROTOCOL)
+    else:
+        logger.error("Unsupported model format %s, expected pickle or joblib", fmt)
+        raise NotImplementedError(f"Unsupported model format {fmt}")
+    report = {
+        "format": fmt,
+        "compress": compress if fmt == "joblib" else 0,
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - start, 6),
+    }
+    logger.info("Model binary successfully saved to %s (%d bytes in %.3fs)", path, report["bytes"], report["seconds"])
+    return report
@@ -0,0 +1,165 @@
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+from pathlib import Path
+import logging
+import math
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterGrid, ParameterSampler, StratifiedKFold
+
+from src.scheduler import process_context
+from src.train_model import split_data
+
+logger = logging.getLogger("clouds")
+
+
+def _evaluate(task: tuple) -> tuple:
+    """Fit and score one candidate on one fold, in a worker process.
+
+    The features, target, fold assignment and subsampling order are memory-mapped
+    from `data_dir`, so only the candidate parameters are sent to the worker.
+
+    Args:
+        task (tuple): Data directory, model library, model type, candidate id,
+            parameters, fold, number of rows to use and scoring name.
+
+    Returns:
+        tuple: Candidate id, fold, validation score, fit time and score time.
+    """
+    data_dir, model_lib, model_type, candidate, params, fold, n_rows, scoring = task
+    x = np.load(Path(data_dir) / "x.npy", mmap_mode="r")
+    y = np.load(Path(data_dir) / "y.npy", mmap_mode="r")
+    folds = np.load(Path(data_dir) / "folds.npy", mmap_mode="r")
+    order = np.load(Path(data_dir) / "order.npy", mmap_mode="r")
+
+    used = order < n_rows
+    train_rows = np.flatnonzero(used & (folds != fold))
+    val_rows = np.flatnonzero(used & (folds == fold))
+
+    model = getattr(import_module(model_lib), model_type)(**params)
+    start = time.perf_counter()
+    model.fit(x[train_rows], y[train_rows])
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    score = get_scorer(scoring)(model, x[val_rows], y[val_rows])
+    return candidate, fold, score, fit_time, time.perf_counter() - start
+
+
+def _candidates(search_config: dict, hyperparam: dict) -> list[dict]:
+    """List the hyperparameters of every candidate of the search.
+
+    Args:
+        search_config (dict): Search configuration with the values to try for every parameter.
+        hyperparam (dict): Hyperparameters of the model that are not searched.
+
+    Returns:
+        list[dict]: Full hyperparameters of every candidate.
+    """
+    space = search_config["param_grid"]
+    if search_config.get("method", "grid") == "random":
+        sampled = ParameterSampler(
+            space, n_iter=search_config.get("n_iter", 10), random_state=search_config.get("random_state")
+        )
+    else:
+        sampled = ParameterGrid(space)
+    return [{**hyperparam, **params} for params in sampled]
+
+
+def search_hyperparameters(data: pd.DataFrame, config: dict) -> tuple[dict, pd.DataFrame]:
+    """Search the model hyperparameters by cross-validation on the train set.
+
+    Every candidate is scored on every fold in a pool of `search.n_jobs` processes
+    sharing the train set through memory-mapped arrays. With the `halving` method,
+    candidates are first scored on a subsample of the train set and only the best
+    1/`factor` of them are scored again on `factor` times more rows.
+
+    Args:
+        data (pd.DataFrame): Data for the model to be trained on.
+        config (dict): Configuration for model training, including the `search` settings.
+
+    Returns:
+        tuple[dict, pd.DataFrame]: Hyperparameters of the best candidate and the leaderboard of every candidate.
+    """
+    search_config = config["search"]
+    model_config = config["model_config"]
+    method = search_config.get("method", "grid")
+    n_folds = search_config.get("cv", 5)
+    factor = search_config.get("factor", 3)
+    scoring = search_config.get("scoring", "roc_auc")
+    candidates = _candidates(search_config, model_config["hyperparam"])
+
+    # Tune on the train set only, so the test set stays unseen
+    x_train, _, y_train, _ = split_data(data, config)
+    n_train = len(x_train)
+    rng = np.random.default_rng(search_config.get("random_state"))
+    folds = np.empty(n_train, dtype=np.int16)
+    splitter = StratifiedKFold(n_folds, shuffle=True, random_state=search_config.get("random_state"))
+    for fold, (_, val_rows) in enumerate(splitter.split(x_train, y_train)):
+        folds[val_rows] = fold
+
+    if method == "halving":
+        n_rounds = math.ceil(math.log(max(len(candidates), 1), factor)) + 1
+        min_rows = max(n_train // factor ** (n_rounds - 1), 2 * n_folds)
+    else:
+        n_rounds, min_rows = 1, n_train
+
+    records = []
+    alive = list(range(len(candidates)))
+    n_jobs = search_config.get("n_jobs", 1)
+    with tempfile.TemporaryDirectory(dir=search_config.get("tmp_dir")) as data_dir:
+        np.save(Path(data_dir) / "x.npy", np.ascontiguousarray(x_train.to_numpy()))
+        np.save(Path(data_dir) / "y.npy", y_train.to_numpy())
+        np.save(Path(data_dir) / "folds.npy", folds)
+        np.save(Path(data_dir) / "order.npy", rng.permutation(n_train))
+
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=process_context()) as pool:
+            for round_ in range(n_rounds):
+                n_rows = min(min_rows * factor ** round_, n_train)
+                tasks = [
+                    (data_dir, model_config["model_lib"], model_config["type"], candidate,
+                     candidates[candidate], fold, n_rows, scoring)
+                    for candidate in alive
+                    for fold in range(n_folds)
+                ]
+                start = time.perf_counter()
+                results = pd.DataFrame(
+                    pool.map(_evaluate, tasks),
+                    columns=["candidate", "fold", "score", "fit_time", "score_time"],
+                )
+                logger.info(
+                    "Search round %d: %d candidates x %d folds on %d rows in %.2fs",
+                    round_, len(alive), n_folds, n_rows, time.perf_counter() - start,
+                )
+                summary = results.groupby("candidate").agg(
+                    mean_score=("score", "mean"),
+                    std_score=("score", "std"),
+                    mean_fit_time=("fit_time", "mean"),
+                    mean_score_time=("score_time", "mean"),
+                )
+                summary["round"] = round_
+                summary["n_rows"] = n_rows
+                records.append(summary)
+                ranked = summary.sort_values("mean_score", ascending=False).index
+                alive = list(ranked[: max(math.ceil(len(ranked) / factor), 1)])
+
+    leaderboard = pd.concat(records).reset_index()
+    leaderboard["params"] = [str(candidates[candidate]) for candidate in leaderboard["candidate"]]
+    leaderboard = leaderboard.sort_values(["round", "mean_score"], ascending=[False, False], ignore_index=True)
+    leaderboard["rank"] = np.arange(1, len(leaderboard) + 1)
+    best = candidates[leaderboard["candidate"].iloc[0]]
+    logger.info("Best hyperparameters %s with mean %s %.4f", best, scoring, leaderboard["mean_score"].iloc[0])
+    return best, leaderboard
+
+
+def save_leaderboard(leaderboard: pd.DataFrame, path: Path) -> None:
+    """Save the search leaderboard to a CSV file.
+
+    Args:
+        leaderboard (pd.DataFrame): Score and timing of every candidate.
+        path (Path): Path to save the leaderboard.
+    """
+    leaderboard.to_csv(path, index=False)
+    logger.info("Search leaderboard successfully saved to %s", path)
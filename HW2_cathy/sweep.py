@@ -0,0 +1,32 @@
+import argparse
+import datetime
+import logging.config
+from pathlib import Path
+import yaml
+
+from src.sweep import run_sweep
+
+logging.config.fileConfig("config/logging/local.conf", disable_existing_loggers=False)
+logger = logging.getLogger("clouds")
+
+
+def main(args):
+    """ Run every variant of the base configuration, sharing the stages they have in common. """
+    with open(args.config, "r") as f:
+        base = yaml.load(f, Loader=yaml.FullLoader)
+    with open(args.variants, "r") as f:
+        overrides = yaml.load(f, Loader=yaml.FullLoader)["variants"]
+
+    now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    sweep_dir = Path(base["run_config"]["output"]["runs"]) / f"sweep_{now}"
+    table = run_sweep(base, overrides, sweep_dir, args.n_jobs)
+    print(table.to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline for many variants of a configuration.")
+    parser.add_argument("--config", default="config/config.yaml", help="Path to the base configuration file")
+    parser.add_argument("--variants", default="config/sweep.yaml", help="YAML file listing the variant overrides")
+    parser.add_argument("--n-jobs", type=int, help="Variants trained at once (defaults to one per CPU)")
+
+    main(parser.parse_args())
@@ -0,0 +1,83 @@
+"""Filesystem-backed stand-in for the subset of the boto3 S3 client used by src."""
+import hashlib
+import io
+import re
+import shutil
+from pathlib import Path
+from botocore.exceptions import ClientError
+
+# Smallest part S3 accepts in a multipart upload, but the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def s3_etag(data: bytes, part_size=None) -> str:
+    """The ETag S3 gives to an object received whole, or in parts of `part_size` bytes."""
+    if part_size is None:
+        return f'"{hashlib.md5(data).hexdigest()}"'
+    digests = b"".join(hashlib.md5(data[i:i + part_size]).digest() for i in range(0, max(len(data), 1), part_size))
+    return f'"{hashlib.md5(digests).hexdigest()}-{-(-max(len(data), 1) // part_size)}"'
+
+
+class FakeS3Client:
+    """Stores every object of every bucket as a file under `root/<bucket>/<key>`."""
+
+    def __init__(self, root: Path, buckets=("bucket",)):
+        self.root = Path(root)
+        self.etags = {}
+        self.calls = []
+        for bucket in buckets:
+            (self.root / bucket).mkdir(parents=True, exist_ok=True)
+
+    def _path(self, bucket: str, key: str) -> Path:
+        if not (self.root / bucket).is_dir():
+            raise self._error("NoSuchBucket", "Object")
+        return self.root / bucket / key
+
+    def _etag(self, bucket: str, key: str) -> str:
+        # Objects left by another client, such as an earlier process, are tagged as single part uploads
+        return self.etags.get((bucket, key)) or s3_etag(self._path(bucket, key).read_bytes())
+
+    @staticmethod
+    def _error(code: str, operation: str) -> ClientError:
+        return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+    def head_bucket(self, Bucket):
+        self.calls.append(("head_bucket", Bucket))
+        if not (self.root / Bucket).is_dir():
+            raise self._error("404", "HeadBucket")
+        return {}
+
+    def head_object(self, Bucket, Key):
+        self.calls.append(("head_object", Key))
+        path = self._path(Bucket, Key)
+        if not path.is_file():
+            raise self._error("404", "HeadObject")
+        return {"ETag": self._etag(Bucket, Key), "ContentLength": path.stat().st_size}
+
+    def upload_file(self, Filename, Bucket, Key, Config=None):
+        self.calls.append(("upload_file", Key))
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(Filename, path)
+        data = path.read_bytes()
+        # The transfer manager sends files from the multipart threshold on in parts
+        multipart = Config is not None and len(data) >= Config.multipart_threshold
+        self.etags[(Bucket, Key)] = s3_etag(data, max(Config.multipart_chunksize, MIN_PART_SIZE) if multipart else None)
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.calls.append(("get_object", Key, Range))
+        path = self._path(Bucket, Key)
+        if not path.is_file():
+            raise self._error("NoSuchKey", "GetObject")
+        data = path.read_bytes()
+        if Range is not None:
+            start, end = map(int, re.fullmatch(r"bytes=(\d+)-(\d+)", Range).groups())
+            data = data[start:end + 1]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data), "ETag": self._etag(Bucket, Key)}
+
+    def put_object(self, Bucket, Key, Body):
+        self.calls.append(("put_object", Key))
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(Body if isinstance(Body, bytes) else Body.read())
+        self.etags[(Bucket, Key)] = s3_etag(path.read_bytes())
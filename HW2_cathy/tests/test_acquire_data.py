@@ -0,0 +1,128 @@
+import gzip
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from src.acquire_data import acquire_data, create_session, download
+
+BODY = b"".join(b"%5d %5d\n" % (i, i * i) for i in range(5000))
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serves BODY with an ETag and byte ranges, and can drop the connection mid-body."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        # Ranges count the bytes of the encoded body
+        full = gzip.compress(server.body, mtime=0) if server.gzip else server.body
+        start = 0
+        if self.headers.get("Range") and self.headers.get("If-Range") == server.etag:
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+        body = full[start:]
+        self.send_response(206 if start else 200)
+        self.send_header("ETag", server.etag)
+        self.send_header("Content-Length", str(len(body)))
+        if server.gzip:
+            self.send_header("Content-Encoding", "gzip")
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(full) - 1}/{len(full)}")
+        self.end_headers()
+        if server.drop_after is not None:
+            # Send part of the body, then close the connection
+            self.wfile.write(body[:server.drop_after])
+            server.drop_after = None
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Fixture to provide a local HTTP server, stopped after the test."""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.body, httpd.etag, httpd.drop_after, httpd.requests, httpd.gzip = BODY, '"v1"', None, [], False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/clouds.data"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+# Happy Path Tests
+def test_download_streams_to_file(server, tmp_path):
+    destination = tmp_path / "raw" / "clouds.data"
+    assert download(server.url, destination, create_session(), chunk_size=1000)
+    assert destination.read_bytes() == BODY
+    assert not destination.with_name("clouds.data.part").exists()
+
+def test_unchanged_source_is_not_downloaded(server, tmp_path):
+    destination = tmp_path / "clouds.data"
+    session = create_session()
+    assert download(server.url, destination, session)
+    assert not download(server.url, destination, session)
+    assert server.requests[-1]["If-None-Match"] == '"v1"'
+    server.etag, server.body = '"v2"', BODY[::-1]
+    assert download(server.url, destination, session)
+    assert destination.read_bytes() == BODY[::-1]
+
+def test_resume_after_partial_failure(server, tmp_path):
+    destination = tmp_path / "clouds.data"
+    server.drop_after = 10000
+    assert download(server.url, destination, create_session(), base_delay=0)
+    assert destination.read_bytes() == BODY
+    assert server.requests[-1]["Range"] == "bytes=10000-"
+
+def test_resume_gzip_encoded_body(server, tmp_path):
+    # The server encodes the body although identity was asked for
+    destination = tmp_path / "clouds.data"
+    server.gzip, server.drop_after = True, 1000
+    assert download(server.url, destination, create_session(), base_delay=0, chunk_size=100)
+    assert server.requests[0]["Accept-Encoding"] == "identity"
+    assert server.requests[-1]["Range"] == "bytes=1000-"
+    assert destination.read_bytes() == BODY
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["clouds.data", "clouds.data.meta.json"]
+
+def test_acquire_data_with_cache(server, tmp_path):
+    cache_dir = tmp_path / "cache"
+    assert acquire_data(server.url, tmp_path / "run1" / "clouds.data", cache_dir)
+    assert not acquire_data(server.url, tmp_path / "run2" / "clouds.data", cache_dir)
+    assert (tmp_path / "run2" / "clouds.data").read_bytes() == BODY
+    assert acquire_data(server.url, tmp_path / "run3" / "clouds.data", cache_dir, force=True)
+
+# Unhappy Path Tests
+def test_download_fails_after_retries(tmp_path):
+    with pytest.raises(NotImplementedError):
+        download("http://127.0.0.1:9/clouds.data", tmp_path / "clouds.data", retries=2, base_delay=0, timeout=1)
+    assert not (tmp_path / "clouds.data").exists()
+
+def test_interrupted_rename_is_downloaded_again(server, tmp_path, monkeypatch):
+    destination = tmp_path / "clouds.data"
+    session = create_session()
+    assert download(server.url, destination, session)
+    server.etag, server.body = '"v2"', BODY[::-1]
+    replace = os.replace
+
+    def fail_on_destination(src, dst):
+        if dst == destination:
+            raise OSError("interrupted")
+        replace(src, dst)
+
+    with monkeypatch.context() as patch:
+        patch.setattr("src.acquire_data.os.replace", fail_on_destination)
+        with pytest.raises(OSError):
+            download(server.url, destination, session)
+    assert destination.read_bytes() == BODY
+    assert download(server.url, destination, session)
+    assert destination.read_bytes() == BODY[::-1]
+
+def test_acquire_data_exits_on_failure(tmp_path):
+    with pytest.raises(SystemExit):
+        acquire_data("http://127.0.0.1:9/clouds.data", tmp_path / "clouds.data", config={"retries": 1})
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.analysis import histograms, save_figures
+
+@pytest.fixture
+def data():
+    """Fixture to provide features of both classes, one of them constant."""
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({"a": rng.normal(size=500), "b": rng.exponential(size=500), "c": 2.0})
+    data["class"] = rng.integers(0, 2, size=500).astype(float)
+    return data
+
+@pytest.fixture
+def config(tmp_path):
+    """Fixture to provide the configuration of the figures of `data`."""
+    return {
+        "generate_features": {"feature_col": ["a", "b", "c"], "target_col": "class"},
+        "eda": {"render": {"bins": 10, "n_jobs": 1, "cache_dir": str(tmp_path / "cache")}},
+    }
+
+# Happy Path Tests
+def test_histograms_match_numpy(data):
+    edges, counts = histograms(data[["a", "b", "c"]], data["class"])
+    for i, feature in enumerate(["a", "b", "c"]):
+        expected_edges = np.histogram_bin_edges(data[feature], 10)
+        np.testing.assert_allclose(edges[i], expected_edges)
+        for label in (0, 1):
+            expected, _ = np.histogram(data.loc[data["class"] == label, feature], expected_edges)
+            np.testing.assert_array_equal(counts[label, i], expected)
+
+def test_unchanged_figures_are_copied(data, config, tmp_path):
+    (tmp_path / "first").mkdir()
+    (tmp_path / "second").mkdir()
+    first = save_figures(data, tmp_path / "first", config)
+    assert len(list((tmp_path / "cache").iterdir())) == 3
+    second = save_figures(data, tmp_path / "second", config)
+    assert [path.read_bytes() for path in first] == [path.read_bytes() for path in second]
+
+# Unhappy Path Tests
+def test_missing_feature(data, config, tmp_path):
+    config["generate_features"]["feature_col"].append("missing")
+    with pytest.raises(KeyError):
+        save_figures(data, tmp_path, config)
+
+def test_missing_figure_dir(data, config, tmp_path):
+    with pytest.raises(NotImplementedError):
+        save_figures(data, tmp_path / "missing", config)
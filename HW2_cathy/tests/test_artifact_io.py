@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.artifact_io import FORMATS, FrameWriter, iter_frame, load_frame, save_frame
+
+@pytest.fixture
+def data():
+    """Fixture to provide a dataframe with the duplicated index left by pd.concat."""
+    frame = pd.DataFrame({
+        "visible_mean": np.linspace(0.0, 1.0, 10),
+        "IR_max": np.arange(10, dtype=np.float64) * 1.5,
+        "class": np.repeat([0.0, 1.0], 5),
+    })
+    frame.index = np.concatenate([np.arange(5), np.arange(5)])
+    return frame
+
+# Happy Path Tests
+@pytest.mark.parametrize("fmt", list(FORMATS))
+def test_round_trip(data, tmp_path, fmt):
+    path = save_frame(data, tmp_path / "clouds", fmt)
+    assert path.suffix == FORMATS[fmt]
+    loaded = load_frame(path)
+    pd.testing.assert_frame_equal(loaded, data.reset_index(drop=True))
+
+@pytest.mark.parametrize("fmt", ["parquet", "feather", "npy"])
+def test_dtypes_preserved(tmp_path, fmt):
+    data = pd.DataFrame({"probability": np.array([0.25, 0.75]), "class": np.array([0, 1], dtype=np.int8)})
+    loaded = load_frame(save_frame(data, tmp_path / "scores", fmt))
+    assert loaded.dtypes.to_dict() == data.dtypes.to_dict()
+
+def test_npy_is_memory_mapped(data, tmp_path):
+    loaded = load_frame(save_frame(data, tmp_path / "clouds", "npy"), mmap=True)
+    # The frame wraps the read-only memory map instead of a copy of the file
+    assert not loaded.to_numpy().flags.writeable
+
+@pytest.mark.parametrize("fmt", list(FORMATS))
+def test_iter_frame(data, tmp_path, fmt):
+    path = save_frame(data, tmp_path / "clouds", fmt)
+    blocks = list(iter_frame(path, ["IR_max", "visible_mean"], chunksize=4))
+    assert [len(block) for block in blocks] == [4, 4, 2]
+    combined = pd.concat(blocks, ignore_index=True)
+    pd.testing.assert_frame_equal(combined, data[["IR_max", "visible_mean"]].reset_index(drop=True))
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "feather"])
+def test_frame_writer(data, tmp_path, fmt):
+    with FrameWriter(tmp_path / "clouds", fmt) as writer:
+        for start in range(0, len(data), 4):
+            writer.write(data.iloc[start : start + 4])
+    assert writer.rows == len(data)
+    pd.testing.assert_frame_equal(load_frame(writer.path), data.reset_index(drop=True))
+    assert [len(block) for block in iter_frame(writer.path, None, chunksize=3)][0] == 3
+
+# Unhappy Path Tests
+def test_unsupported_format(data, tmp_path):
+    with pytest.raises(NotImplementedError):
+        save_frame(data, tmp_path / "clouds", "xlsx")
+
+def test_unsupported_file(tmp_path):
+    with pytest.raises(NotImplementedError):
+        load_frame(tmp_path / "clouds.json")
+
+def test_frame_writer_npy(tmp_path):
+    with pytest.raises(NotImplementedError):
+        FrameWriter(tmp_path / "clouds", "npy")
@@ -0,0 +1,68 @@
+import pytest
+from src.aws_utils import local_etag, transfer_config, upload_artifacts
+from tests.fake_s3 import FakeS3Client
+
+@pytest.fixture
+def artifacts(tmp_path):
+    """Fixture to provide a run directory with a small and a multipart sized artifact."""
+    path = tmp_path / "run"
+    (path / "figures").mkdir(parents=True)
+    (path / "figures" / "plot.png").write_bytes(b"png" * 100)
+    (path / "model.pkl").write_bytes(bytes(range(256)) * 5000)
+    return path
+
+@pytest.fixture
+def config():
+    """Fixture to provide an AWS configuration where model.pkl is uploaded in parts."""
+    return {
+        "bucket_name": "bucket",
+        "prefix": "runs",
+        "max_workers": 4,
+        "multipart_threshold_mb": 0.5,
+        "multipart_chunksize_mb": 0.25,
+    }
+
+# Happy Path Tests
+def test_upload_artifacts(artifacts, config, tmp_path):
+    client = FakeS3Client(tmp_path / "s3")
+    uris = upload_artifacts(artifacts, config, s3_client=client)
+    assert sorted(uris) == ["s3://bucket/runs/figures/plot.png", "s3://bucket/runs/model.pkl"]
+    assert (tmp_path / "s3" / "bucket" / "runs" / "model.pkl").read_bytes() == (artifacts / "model.pkl").read_bytes()
+    # Parts are never smaller than the 5 MB S3 minimum, whatever multipart_chunksize_mb says
+    assert client.etags[("bucket", "runs/model.pkl")].endswith('-1"')
+
+def test_unchanged_artifacts_are_skipped(artifacts, config, tmp_path):
+    client = FakeS3Client(tmp_path / "s3")
+    upload_artifacts(artifacts, config, s3_client=client)
+    # ETags S3 gives to these uploads, model.pkl being sent as one part of 5 MB
+    assert client.etags[("bucket", "runs/figures/plot.png")] == '"c78ccec498fabae0229ecce8fab8bce2"'
+    assert client.etags[("bucket", "runs/model.pkl")] == '"334b663ea9ac3ed963967a53de6b0be8-1"'
+    (artifacts / "figures" / "plot.png").write_bytes(b"new plot")
+    client.calls.clear()
+    upload_artifacts(artifacts, config, s3_client=client)
+    assert [call for call in client.calls if call[0] == "upload_file"] == [("upload_file", "runs/figures/plot.png")]
+
+def test_single_part_etag(artifacts, config):
+    # MD5 of the file, below the multipart threshold
+    assert local_etag(artifacts / "figures" / "plot.png", transfer_config(config)) == '"c78ccec498fabae0229ecce8fab8bce2"'
+
+def test_multipart_etag(tmp_path):
+    # 12 MB sent in parts of 5 MB: MD5 of the three part MD5s, and the number of parts
+    path = tmp_path / "large.bin"
+    path.write_bytes(bytes(range(256)) * (12 * 1024 * 1024 // 256))
+    transfer = transfer_config({"multipart_threshold_mb": 8, "multipart_chunksize_mb": 5})
+    assert local_etag(path, transfer) == '"19019d16dd0f439825c39a2c5b9178fd-3"'
+
+# Unhappy Path Tests
+def test_missing_bucket(artifacts, config, tmp_path):
+    client = FakeS3Client(tmp_path / "s3", buckets=())
+    with pytest.raises(NotImplementedError):
+        upload_artifacts(artifacts, config, s3_client=client)
+
+def test_failed_upload(artifacts, config, tmp_path):
+    client = FakeS3Client(tmp_path / "s3")
+    def fail(*args, **kwargs):
+        raise OSError("connection reset")
+    client.upload_file = fail
+    with pytest.raises(NotImplementedError):
+        upload_artifacts(artifacts, config, s3_client=client)
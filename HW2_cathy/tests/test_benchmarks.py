@@ -0,0 +1,32 @@
+import pytest
+from benchmarks.run_benchmarks import compare
+from benchmarks.synthetic import COLUMNS, generate_clouds
+from src.create_dataset import create_dataset
+
+def results(seconds, memory):
+    return {"benchmarks": {"create_dataset@1000": {"seconds_min": seconds, "tracemalloc_peak_mb": memory}}}
+
+# Happy Path Tests
+def test_synthetic_file_is_parsed_by_create_dataset(tmp_path):
+    data_prep = generate_clouds(tmp_path / "clouds.data", 1001, chunk_rows=100)
+    data = create_dataset(tmp_path / "clouds.data", {
+        "data": {"columns": COLUMNS, "import": {"chunksize": 64}}, "data_prep": data_prep,
+    })
+    assert len(data) == 1001
+    assert data["class"].sum() == 501
+    assert (data["visible_entropy"] > 0).all()
+
+def test_synthetic_file_is_reproducible(tmp_path):
+    generate_clouds(tmp_path / "a.data", 500, seed=1)
+    generate_clouds(tmp_path / "b.data", 500, seed=1)
+    assert (tmp_path / "a.data").read_bytes() == (tmp_path / "b.data").read_bytes()
+
+def test_compare_within_threshold():
+    rows = compare(results(1.1, 10.0), results(1.0, 10.0), threshold=0.2)
+    assert rows[0]["time_ratio"] == pytest.approx(1.1)
+    assert not rows[0]["regression"]
+
+# Unhappy Path Tests
+def test_compare_flags_regressions():
+    assert compare(results(1.5, 10.0), results(1.0, 10.0), threshold=0.2)[0]["regression"]
+    assert compare(results(1.0, 15.0), results(1.0, 10.0), threshold=0.2)[0]["regression"]
@@ -0,0 +1,67 @@
+import json
+import pytest
+from src.aws_utils import upload_run
+from src.blob_store import BlobStore
+from tests.fake_s3 import FakeS3Client
+
+def write_run(path, model=b"model"):
+    """Write a run directory whose data is the same in every run."""
+    (path / "data").mkdir(parents=True)
+    (path / "data" / "clouds.data").write_bytes(b"1 2 3\n" * 1000)
+    (path / "model.pkl").write_bytes(model)
+    return path
+
+@pytest.fixture
+def store(tmp_path):
+    """Fixture to provide an empty blob store."""
+    return BlobStore(tmp_path / "blobs")
+
+# Happy Path Tests
+def test_runs_share_blobs(store, tmp_path):
+    first = write_run(tmp_path / "run_1")
+    second = write_run(tmp_path / "run_2", b"new model")
+    store.ingest(first)
+    manifest = store.ingest(second)
+    assert (first / "data" / "clouds.data").samefile(second / "data" / "clouds.data")
+    assert not (first / "model.pkl").samefile(second / "model.pkl")
+    assert len(list(store.root.glob("*/*"))) == 3
+    assert manifest == json.loads((second / "manifest.json").read_text())
+    assert manifest["files"]["model.pkl"]["bytes"] == len(b"new model")
+
+def test_detach_copies_files_out_of_the_store(store, tmp_path):
+    run = write_run(tmp_path / "run_1")
+    manifest = store.ingest(run)
+    assert store.detach(run) == 2
+    (run / "model.pkl").write_bytes(b"retrained")
+    assert store.path(manifest["files"]["model.pkl"]["digest"]).read_bytes() == b"model"
+    assert not (run / "manifest.json").exists()
+
+def test_materialize_and_prune(store, tmp_path):
+    first = write_run(tmp_path / "runs" / "run_1")
+    second = write_run(tmp_path / "runs" / "run_2", b"new model")
+    manifest = store.ingest(first)
+    store.ingest(second)
+    paths = store.materialize(manifest, tmp_path / "restored")
+    assert sorted(path.name for path in paths) == ["clouds.data", "model.pkl"]
+    assert (tmp_path / "restored" / "model.pkl").read_bytes() == b"model"
+
+    (first / "manifest.json").unlink()
+    assert store.prune(tmp_path / "runs") == len(b"model")
+    assert (first / "model.pkl").read_bytes() == b"model"
+
+def test_upload_sends_only_new_blobs(store, tmp_path):
+    config = {"bucket_name": "bucket", "prefix": "runs", "max_workers": 2}
+    client = FakeS3Client(tmp_path / "s3")
+    upload_run(store.ingest(write_run(tmp_path / "run_1")), store, config, client)
+    client.calls.clear()
+    uris = upload_run(store.ingest(write_run(tmp_path / "run_2", b"new model")), store, config, client)
+    uploads = [call[1] for call in client.calls if call[0] in ("upload_file", "put_object")]
+    digest = store.put(tmp_path / "run_2" / "model.pkl")
+    assert uploads == [f"runs/blobs/{digest[:2]}/{digest}", "runs/manifests/run_2.json"]
+    assert uris[-1] == "s3://bucket/runs/manifests/run_2.json"
+
+# Unhappy Path Tests
+def test_materialize_missing_blob(store, tmp_path):
+    manifest = {"run": "run_1", "files": {"model.pkl": {"digest": "ab" * 32, "bytes": 5}}}
+    with pytest.raises(NotImplementedError):
+        store.materialize(manifest, tmp_path / "restored")
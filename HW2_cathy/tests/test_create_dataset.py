@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.create_dataset import create_dataset, iter_dataset
+
+RAW = """header line
+;;; "quoted" header
+
+ 1.0000  2.5000  3.0000
+ 4.0000  5.0000  6.1250
+;;; separator
+ 7.0000  8.0000  9.0000
+10.0000 11.0000 12.0000
+13.0000 14.0000 15.0000
+"""
+
+@pytest.fixture
+def raw_path(tmp_path):
+    """Fixture to provide a raw file in the clouds.data layout."""
+    path = tmp_path / "clouds.data"
+    path.write_text(RAW)
+    return path
+
+@pytest.fixture
+def dataset_config():
+    """Fixture to provide the dataset configuration matching RAW."""
+    return {
+        "data": {"import": {"line_split": " ", "chunksize": 2}, "columns": ["a", "b", "c"]},
+        "data_prep": {
+            "first_cloud": {"left": 3, "right": 5},
+            "second_cloud": {"left": 6, "right": 9},
+        },
+    }
+
+# Happy Path Tests
+def test_create_dataset(raw_path, dataset_config):
+    result = create_dataset(raw_path, dataset_config)
+    first = pd.DataFrame([[1.0, 2.5, 3.0], [4.0, 5.0, 6.125]], columns=["a", "b", "c"])
+    first["class"] = np.zeros(len(first))
+    second = pd.DataFrame([[7.0, 8.0, 9.0], [10.0, 11.0, 12.0], [13.0, 14.0, 15.0]], columns=["a", "b", "c"])
+    second["class"] = np.ones(len(second))
+    pd.testing.assert_frame_equal(result, pd.concat([first, second]), check_exact=True)
+
+def test_iter_dataset(raw_path, dataset_config):
+    blocks = list(iter_dataset(raw_path, dataset_config))
+    assert [len(block) for block in blocks] == [2, 2, 1]
+    pd.testing.assert_frame_equal(
+        pd.concat(blocks).reset_index(drop=True),
+        create_dataset(raw_path, dataset_config).reset_index(drop=True),
+    )
+
+def test_create_dataset_low_memory(raw_path, dataset_config):
+    result = create_dataset(raw_path, {**dataset_config, "low_memory": True})
+    default = create_dataset(raw_path, dataset_config)
+    assert result.dtypes.tolist() == [np.float32] * 3 + [np.int8]
+    assert isinstance(result.index, pd.RangeIndex)
+    pd.testing.assert_frame_equal(result, default.reset_index(drop=True), check_dtype=False)
+
+def test_iter_dataset_low_memory(raw_path, dataset_config):
+    config = {**dataset_config, "low_memory": True}
+    blocks = list(iter_dataset(raw_path, config))
+    assert all(block["class"].dtype == np.int8 and block["a"].dtype == np.float32 for block in blocks)
+    pd.testing.assert_frame_equal(pd.concat(blocks, ignore_index=True), create_dataset(raw_path, config))
+
+# Unhappy Path Tests
+def test_non_numeric_rows(raw_path, dataset_config):
+    dataset_config["data_prep"]["first_cloud"]["left"] = 1
+    with pytest.raises(NotImplementedError):
+        create_dataset(raw_path, dataset_config)
+
+def test_blank_row_in_range(raw_path, dataset_config):
+    dataset_config["data_prep"]["first_cloud"]["left"] = 2
+    with pytest.raises(NotImplementedError):
+        create_dataset(raw_path, dataset_config)
+
+def test_low_memory_value_out_of_float32_range(raw_path, dataset_config):
+    raw_path.write_text(RAW.replace("8.0000", "1e39"))
+    create_dataset(raw_path, dataset_config)
+    with pytest.raises(NotImplementedError):
+        create_dataset(raw_path, {**dataset_config, "low_memory": True})
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+import sklearn.metrics
+from src.artifact_io import save_frame
+from src.evaluate_performance import evaluate_files, evaluate_performance
+
+CONFIG = {
+    "target": "class",
+    "metrics_lib": "sklearn.metrics",
+    "metrics": ["roc_auc_score", "confusion_matrix", "accuracy_score", "classification_report"],
+}
+
+@pytest.fixture
+def scored():
+    """Fixture to provide a test set and its scores."""
+    rng = np.random.default_rng(0)
+    test = pd.DataFrame({"class": rng.integers(0, 2, 300).astype(float)})
+    proba = np.round(rng.random(300), 1)
+    return test, (proba, (proba > 0.5).astype(float))
+
+# Happy Path Tests
+def test_evaluate_performance_matches_sklearn(scored):
+    test, scores = scored
+    metrics = evaluate_performance(test, scores, {**CONFIG, "metrics": CONFIG["metrics"] + ["log_loss"]})
+    assert metrics["roc_auc_score"] == sklearn.metrics.roc_auc_score(test["class"], scores[0])
+    assert metrics["confusion_matrix"] == sklearn.metrics.confusion_matrix(test["class"], scores[1]).tolist()
+    assert metrics["classification_report"] == sklearn.metrics.classification_report(test["class"], scores[1])
+    # Metrics the engine does not compute are called from the metrics library
+    assert metrics["log_loss"] == sklearn.metrics.log_loss(test["class"], scores[1])
+
+def test_evaluate_files_in_blocks(scored, tmp_path):
+    test, scores = scored
+    test_path = save_frame(test, tmp_path / "test", "feather")
+    scores_path = save_frame(pd.DataFrame({"Probability": scores[0], "Class": scores[1]}), tmp_path / "scores", "csv")
+    assert evaluate_files(test_path, scores_path, CONFIG, chunksize=47) == evaluate_performance(test, scores, CONFIG)
+
+# Unhappy Path Tests
+def test_evaluate_files_unsupported_metric(scored, tmp_path):
+    with pytest.raises(NotImplementedError):
+        evaluate_files(tmp_path / "test.csv", tmp_path / "scores.csv", {**CONFIG, "metrics": ["log_loss"]})
+
+def test_evaluate_files_row_mismatch(scored, tmp_path):
+    test, scores = scored
+    test_path = save_frame(test.iloc[:100], tmp_path / "test", "csv")
+    scores_path = save_frame(pd.DataFrame({"Probability": scores[0], "Class": scores[1]}), tmp_path / "scores", "csv")
+    with pytest.raises(NotImplementedError):
+        evaluate_files(test_path, scores_path, CONFIG, chunksize=64)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from src.feature_transform import FeatureTransform, load_transform, save_transform
+from src.generate_features import compile_features, generate_features
+from src.model_server import MicroBatcher
+from src.score_model import score_file
+
+FEATURE_ENG = [
+    {"operation": "multiply", "source1": "a", "source2": "b", "target": "a_times_b"},
+    {"operation": "apply", "source1": {"operation": "subtract", "source1": "c", "source2": "a"},
+     "function": "abs", "target": "c_minus_a"},
+    {"operation": "standardize", "source1": "b", "target": "b_scaled"},
+    {"operation": "clip", "source1": "c", "lower": 0, "upper": 1, "target": "c_clipped"},
+]
+FEATURES = ["b", "a_times_b", "c_minus_a", "b_scaled"]
+
+@pytest.fixture
+def data():
+    """Fixture to provide a raw dataset with a learnable class."""
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(200, 3)), columns=["a", "b", "c"])
+    data["class"] = (data["a"] * data["b"] > 0).astype(float)
+    return data
+
+@pytest.fixture
+def config():
+    """Fixture to provide the feature engineering configuration."""
+    return {"feature_col": ["a", "b", "c"], "target_col": "class", "feature_eng": FEATURE_ENG}
+
+@pytest.fixture
+def plan(data):
+    """Fixture to provide the plan of the configuration, fitted on the dataset."""
+    return compile_features(FEATURE_ENG).fit(data)
+
+# Happy Path Tests
+def test_transform_matches_generate_features(data, config, plan):
+    features = generate_features(data, config, compile_features(FEATURE_ENG))
+    transform = FeatureTransform(plan, FEATURES)
+    np.testing.assert_array_equal(transform.transform(data[transform.columns].to_numpy()), features[FEATURES].to_numpy())
+
+def test_transform_row(data, plan):
+    transform = FeatureTransform(plan, FEATURES)
+    rows = data[transform.columns].to_numpy()
+    np.testing.assert_array_equal(transform.transform_row(rows[5]), transform.transform(rows)[5:6])
+
+def test_transform_is_pruned(plan):
+    transform = FeatureTransform(plan, ["a_times_b"])
+    assert transform.columns == ["a", "b"]
+    assert len(transform.steps) == 1
+
+def test_save_and_load(data, plan, tmp_path):
+    transform = FeatureTransform(plan, FEATURES)
+    path = save_transform(transform, tmp_path / "feature_transform.pkl")
+    rows = data[transform.columns].to_numpy()
+    np.testing.assert_array_equal(load_transform(path).transform(rows), transform.transform(rows))
+
+def test_score_raw_rows(data, config, plan, tmp_path):
+    features = generate_features(data, config, compile_features(FEATURE_ENG))
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(features[FEATURES], features["class"])
+    transform = FeatureTransform(plan, FEATURES)
+    data.to_csv(tmp_path / "raw.csv", index=False)
+    score_file(model, tmp_path / "raw.csv", tmp_path / "scores.csv", {"initial_features": FEATURES}, transform)
+    scores = pd.read_csv(tmp_path / "scores.csv")
+    np.testing.assert_allclose(scores["Probability"], model.predict_proba(features[FEATURES])[:, 1])
+
+    batcher = MicroBatcher(model, FEATURES, max_batch_size=8, max_wait_ms=5, transform=transform)
+    futures = [batcher.submit(row) for row in data[batcher.features].to_numpy()[:10]]
+    proba = np.concatenate([future.result(timeout=5)[0] for future in futures])
+    batcher.close()
+    np.testing.assert_allclose(proba, model.predict_proba(features[FEATURES].iloc[:10])[:, 1])
+
+# Unhappy Path Tests
+def test_unfitted_plan():
+    with pytest.raises(NotImplementedError):
+        FeatureTransform(compile_features(FEATURE_ENG), FEATURES)
+
+def test_load_missing_transform(tmp_path):
+    with pytest.raises(NotImplementedError):
+        load_transform(tmp_path / "feature_transform.pkl")
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+from src.flat_forest import FlatForest
+from src.score_model import load_model, predict
+
+FEATURES = ["a", "b", "c"]
+
+@pytest.fixture
+def data():
+    """Fixture to provide a dataset with a class that is not a threshold of one feature."""
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(2000, 3)), columns=FEATURES)
+    data["class"] = (data["a"] * data["b"] + 0.3 * rng.normal(size=2000) > 0).astype(float)
+    return data
+
+@pytest.fixture
+def rows():
+    """Fixture to provide rows the models were not fitted on."""
+    return pd.DataFrame(np.random.default_rng(1).normal(size=(500, 3)), columns=FEATURES)
+
+# Happy Path Tests
+@pytest.mark.parametrize("model", [
+    RandomForestClassifier(n_estimators=10, max_depth=10, random_state=0),
+    ExtraTreesClassifier(n_estimators=5, random_state=0),
+    DecisionTreeClassifier(max_depth=4, random_state=0),
+])
+def test_probabilities_match_sklearn(data, rows, model):
+    model.fit(data[FEATURES], data["class"])
+    forest = FlatForest.from_model(model)
+    np.testing.assert_array_equal(forest.predict_proba(rows), model.predict_proba(rows))
+    np.testing.assert_array_equal(forest.predict(rows), model.predict(rows))
+    for row, expected in zip(rows.to_numpy()[:50], model.predict_proba(rows.iloc[:50])):
+        assert forest.predict_row(row) == expected.tolist()
+
+def test_blocks_match_one_pass(data, rows):
+    forest = FlatForest.from_model(RandomForestClassifier(n_estimators=4, random_state=0).fit(data[FEATURES], data["class"]))
+    np.testing.assert_array_equal(forest.predict_proba(rows, block_size=64), forest.predict_proba(rows))
+
+def test_save_and_memory_map(data, rows, tmp_path):
+    model = RandomForestClassifier(n_estimators=4, random_state=0).fit(data[FEATURES], data["class"])
+    paths = FlatForest.from_model(model).save(tmp_path / "flat_forest")
+    assert len(paths) == len(list((tmp_path / "flat_forest").iterdir()))
+    loaded = load_model(tmp_path / "flat_forest")
+    assert isinstance(loaded.feature, np.memmap)
+    np.testing.assert_array_equal(loaded.predict_proba(rows), model.predict_proba(rows))
+
+def test_predict_uses_single_row_path(data, rows):
+    model = RandomForestClassifier(n_estimators=4, random_state=0).fit(data[FEATURES], data["class"])
+    proba, classes = predict(FlatForest.from_model(model), rows.iloc[:1])
+    np.testing.assert_array_equal(proba, model.predict_proba(rows.iloc[:1])[:, 1])
+    np.testing.assert_array_equal(classes, model.predict(rows.iloc[:1]))
+
+# Unhappy Path Tests
+def test_model_without_trees(data):
+    with pytest.raises(NotImplementedError):
+        FlatForest.from_model(LogisticRegression().fit(data[FEATURES], data["class"]))
+
+def test_unfitted_forest():
+    with pytest.raises(NotImplementedError):
+        FlatForest.from_model(RandomForestClassifier())
+
+def test_load_missing_arrays(tmp_path):
+    with pytest.raises(NotImplementedError):
+        FlatForest.load(tmp_path)
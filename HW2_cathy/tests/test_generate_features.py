@@ -1,6 +1,11 @@
+import pickle
+import numpy as np
 import pandas as pd
 import pytest
-from src.generate_features import generate_features
+import src.generate_features as gf
+from src.artifact_io import load_frame
+from src.generate_features import compile_features, generate_features, iter_features, register_operation, write_features
+from src.train_model import split_rows
 
 @pytest.fixture
 def sample_data():
@@ -51,6 +56,150 @@ def test_apply_operation(sample_data):
     expected_result = pd.DataFrame({"A": [1, 2, 3], "B": [4, 5, 6], "C": [7, 8, 9], "D": [1, 4, 9]}).astype(float)
     pd.testing.assert_frame_equal(result, expected_result)
 
+def test_shared_subexpressions():
+    plan = compile_features([
+        {"operation": "subtract", "source1": "A", "source2": "B", "target": "D"},
+        {
+            "operation": "divide",
+            "source1": {"operation": "subtract", "source1": "A", "source2": "B"},
+            "source2": "A",
+            "target": "E",
+        },
+    ])
+    # A, B, A - B and (A - B) / A
+    assert len(plan.nodes) == 4
+    assert plan.columns == ["A", "B"]
+
+def test_target_as_source(sample_data):
+    config = {
+        "feature_col": ["A", "B"],
+        "target_col": "C",
+        "feature_eng": [
+            {"operation": "add", "source1": "A", "source2": "B", "target": "D"},
+            {"operation": "multiply", "source1": "D", "source2": "A", "target": "E"},
+        ],
+    }
+    result = generate_features(sample_data, {**config, "block_size": 2})
+    expected_result = pd.DataFrame(
+        {"A": [1, 2, 3], "B": [4, 5, 6], "C": [7, 8, 9], "D": [5, 7, 9], "E": [5, 14, 27]}
+    ).astype(float)
+    pd.testing.assert_frame_equal(result, expected_result)
+
+def test_write_features_block_by_block(sample_data, basic_config, tmp_path):
+    blocks = [sample_data.iloc[:2], sample_data.iloc[2:]]
+    path = write_features(blocks, basic_config, tmp_path / "features", "feather")
+    pd.testing.assert_frame_equal(load_frame(path), generate_features(sample_data, basic_config))
+
+@pytest.mark.parametrize("chunksize", [7, 16])
+def test_streamed_fitted_operations_match_in_memory(chunksize, tmp_path):
+    config = {
+        "feature_col": ["A"],
+        "target_col": "C",
+        "feature_eng": [
+            {"target": "Z", "operation": "standardize", "source1": {"operation": "multiply", "source1": "A", "source2": "B"}},
+            {"target": "Q", "operation": "quantile_bin", "source1": "B", "bins": 4},
+            # Fitted on the output of another fitted operation, in a second pass
+            {"target": "S", "operation": "standardize", "source1": "Q"},
+        ],
+    }
+    rng = np.random.default_rng(1)
+    data = pd.DataFrame(rng.normal(size=(50, 3)), columns=["A", "B", "C"])
+    split = {"train_test_split": {"test_size": 0.4, "random_state": 423}}
+    expected = generate_features(data, config, compile_features(config["feature_eng"]), split_rows(len(data), split)[0])
+
+    plan = compile_features(config["feature_eng"])
+    blocks = lambda: (data.iloc[start:start + chunksize] for start in range(0, len(data), chunksize))
+    plan.fit_blocks(blocks, lambda n_rows: split_rows(n_rows, split)[0])
+    path = write_features(blocks(), config, tmp_path / "features", "feather", plan)
+    pd.testing.assert_frame_equal(load_frame(path), expected, check_exact=True)
+
+def test_features_do_not_share_memory(sample_data, basic_config):
+    result = generate_features(sample_data, basic_config)
+    result["A"] = 0.0
+    assert sample_data["A"].tolist() == [1.0, 2.0, 3.0]
+
+def test_parameterized_operations(sample_data):
+    config = {
+        "feature_col": ["A"],
+        "target_col": "C",
+        "feature_eng": [
+            {"target": "D", "operation": "clip", "source1": "B", "lower": 4.5, "upper": 5.5},
+            {"target": "E", "operation": "rolling_mean", "source1": "A", "window": 2},
+        ],
+    }
+    result = generate_features(sample_data, config)
+    assert result["D"].tolist() == [4.5, 5.0, 5.5]
+    assert result["E"].tolist() == [1.0, 1.5, 2.5]
+
+def test_fitted_operations_reuse_statistics(sample_data):
+    config = {
+        "feature_col": ["A"],
+        "target_col": "C",
+        "feature_eng": [
+            {"target": "Z", "operation": "standardize", "source1": "A"},
+            {"target": "Q", "operation": "quantile_bin", "source1": "B", "bins": 3},
+        ],
+    }
+    plan = compile_features(config["feature_eng"])
+    result = generate_features(sample_data, config, plan)
+    np.testing.assert_allclose(result["Z"], (sample_data["A"] - 2) / np.std([1, 2, 3]))
+    assert result["Q"].tolist() == [0, 1, 2] and result["Q"].dtype == np.int64
+    # New rows are transformed with the statistics of the fitted ones
+    restored = pickle.loads(pickle.dumps(plan))
+    later = generate_features(sample_data * 2, config, restored)
+    np.testing.assert_allclose(later["Z"], (sample_data["A"] * 2 - 2) / np.std([1, 2, 3]))
+
+def test_fitted_statistics_ignore_test_rows():
+    config = {
+        "feature_col": ["A"],
+        "target_col": "C",
+        "feature_eng": [
+            {"target": "Z", "operation": "standardize", "source1": "A"},
+            {"target": "Q", "operation": "quantile_bin", "source1": "B", "bins": 4},
+        ],
+    }
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(50, 3)), columns=["A", "B", "C"])
+    train_rows, test_rows = split_rows(len(data), {"train_test_split": {"test_size": 0.4, "random_state": 423}})
+    plan = compile_features(config["feature_eng"])
+    features = generate_features(data, config, plan, train_rows)
+    changed = data.copy()
+    changed.iloc[test_rows] = changed.iloc[test_rows] * 100 + 7
+    changed_plan = compile_features(config["feature_eng"])
+    changed_features = generate_features(changed, config, changed_plan, train_rows)
+    assert changed_plan.state == plan.state
+    pd.testing.assert_frame_equal(changed_features.iloc[train_rows], features.iloc[train_rows])
+    assert plan.state != compile_features(config["feature_eng"]).fit(data).state
+
+def test_operations_are_memoized_with_their_parameters():
+    plan = compile_features([
+        {"target": "D", "operation": "clip", "source1": "A", "lower": 0},
+        {"target": "E", "operation": "clip", "source1": "A", "lower": 0},
+        {"target": "F", "operation": "clip", "source1": "A", "lower": 1},
+    ])
+    # A and two distinct clips
+    assert len(plan.nodes) == 3
+
+def test_register_operation(sample_data, monkeypatch):
+    monkeypatch.setattr(gf, "OPERATIONS", dict(gf.OPERATIONS))
+
+    @register_operation("hypot", 2, dtype=np.float64)
+    def hypot(x, y):
+        return np.hypot(x, y)
+
+    config = {"feature_col": ["A"], "target_col": "C",
+              "feature_eng": [{"target": "D", "operation": "hypot", "source1": "A", "source2": "B"}]}
+    result = generate_features(sample_data, config)
+    np.testing.assert_allclose(result["D"], np.hypot(sample_data["A"], sample_data["B"]))
+
+def test_compact_target_keeps_column_order(sample_data, basic_config):
+    data = sample_data.astype(np.float32).astype({"C": np.int8})
+    result = generate_features(data, basic_config)
+    assert result.columns.tolist() == ["A", "B", "C", "D"]
+    assert result.dtypes.tolist() == [np.float32, np.float32, np.int8, np.float32]
+    # The float32 columns are stacked once, into a single block
+    assert result._mgr.nblocks == 2
+
 # Unhappy Path Tests
 def test_missing_feature_col(sample_data):
     config = {
@@ -78,3 +227,39 @@ def test_invalid_function(sample_data):
     }
     with pytest.raises(AttributeError):
         generate_features(sample_data, config)
+
+def test_rows_combined_block_by_block(sample_data):
+    config = {
+        "feature_col": ["A"],
+        "target_col": "C",
+        "feature_eng": [{"target": "D", "operation": "apply", "source1": "A", "function": "cumsum"}]
+    }
+    with pytest.raises(NotImplementedError):
+        list(iter_features([sample_data], config))
+
+def test_unfitted_plan_not_streamed(sample_data):
+    config = {
+        "feature_col": ["A"],
+        "target_col": "C",
+        "feature_eng": [{"target": "Z", "operation": "standardize", "source1": "A"}],
+    }
+    with pytest.raises(NotImplementedError):
+        list(iter_features([sample_data.iloc[:2], sample_data.iloc[2:]], config))
+
+def test_unknown_operation_rejected_when_compiled():
+    with pytest.raises(NotImplementedError):
+        compile_features([{"target": "D", "operation": "zscore", "source1": "A"}])
+
+@pytest.mark.parametrize("entry", [
+    {"target": "D", "operation": "rolling_mean", "source1": "A"},
+    {"target": "D", "operation": "clip", "source1": "A", "minimum": 0},
+    {"target": "D", "operation": "add", "source1": "A"},
+])
+def test_invalid_parameters_rejected_when_compiled(entry):
+    with pytest.raises(NotImplementedError):
+        compile_features([entry])
+
+def test_unfitted_plan(sample_data):
+    plan = compile_features([{"target": "Z", "operation": "standardize", "source1": "A"}])
+    with pytest.raises(NotImplementedError):
+        plan.evaluate(sample_data)
@@ -0,0 +1,164 @@
+import numpy as np
+import pytest
+import yaml
+import src.generate_features as gf
+import src.incremental as inc
+from src.incremental import RunningStats, incremental_update, read_new_rows, update_model
+
+ROWS = 40
+
+def write_raw(path, rows):
+    """Write a raw file with two header lines and a separator line before the second cloud."""
+    rng = np.random.default_rng(0)
+    first = rng.normal(0, 1, size=(ROWS, 3))
+    second = rng.normal(2, 1, size=(ROWS, 3))
+    lines = ["header", "header"]
+    lines += [" ".join(f"{value:.6f}" for value in row) for row in first[:rows]]
+    lines += ["separator"]
+    lines += [" ".join(f"{value:.6f}" for value in row) for row in second[:rows]]
+    path.write_text("\n".join(lines) + "\n")
+    return first, second
+
+def make_config(rows, trees=3):
+    """Configuration of a file whose clouds have `rows` rows each."""
+    return {
+        "create_dataset": {
+            "data": {"import": {"chunksize": 16}, "columns": ["a", "b", "c"]},
+            "data_prep": {
+                "first_cloud": {"left": 2, "right": 2 + rows},
+                "second_cloud": {"left": 3 + rows, "right": 3 + 2 * rows},
+            },
+        },
+        "generate_features": {
+            "feature_col": ["a", "b", "c"],
+            "target_col": "class",
+            "feature_eng": [
+                {"operation": "add", "source1": "a", "source2": "b", "target": "a_plus_b"},
+                {"operation": "standardize", "source1": "c", "target": "c_std"},
+            ],
+        },
+        "train_model": {
+            "initial_features": ["a", "a_plus_b", "c_std"],
+            "target": "class",
+            "model_config": {
+                "model_lib": "sklearn.ensemble", "type": "RandomForestClassifier",
+                "hyperparam": {"n_estimators": 4, "max_depth": 3, "random_state": 0},
+            },
+            "incremental": {"trees_per_update": trees, "min_rows": 2},
+        },
+    }
+
+# Happy Path Tests
+def test_running_stats_match_numpy():
+    values = np.random.default_rng(1).normal(5, 2, size=(1000, 2))
+    stats = RunningStats(["x", "y"])
+    for block in np.array_split(values, 7):
+        stats.update(block)
+    np.testing.assert_allclose(stats.mean, values.mean(axis=0))
+    np.testing.assert_allclose(stats.variance(), values.var(axis=0, ddof=1))
+    np.testing.assert_array_equal(stats.maximum, values.max(axis=0))
+    restored = RunningStats.from_dict(stats.to_dict())
+    np.testing.assert_array_equal(restored.m2, stats.m2)
+
+def test_running_stats_skip_non_finite_values():
+    stats = RunningStats(["x"]).update([[1.0], [-np.inf], [3.0], [np.nan]])
+    assert stats.count.tolist() == [2]
+    assert stats.mean.tolist() == [2.0]
+
+def test_read_new_rows_past_watermark(tmp_path):
+    first, second = write_raw(tmp_path / "clouds.data", 30)
+    data, watermark = read_new_rows(tmp_path / "clouds.data", make_config(30)["create_dataset"],
+                                    {"first_cloud": 25, "second_cloud": 10})
+    assert watermark == {"first_cloud": 30, "second_cloud": 30}
+    assert len(data) == 5 + 20
+    np.testing.assert_allclose(data[["a", "b", "c"]].to_numpy()[:5], first[25:30], atol=1e-6)
+    assert data["class"].tolist() == [0.0] * 5 + [1.0] * 20
+
+def test_updates_add_trees_on_new_rows(tmp_path):
+    state_dir = tmp_path / "state"
+    write_raw(tmp_path / "clouds.data", 20)
+    model, report = incremental_update(tmp_path / "clouds.data", make_config(20), state_dir)
+    assert report == {"new_rows": 40, "updated": True, "updates": 1, "rows": 40, "n_estimators": 4,
+                      "drift": {"c_std": pytest.approx(0.0, abs=1e-12)}}
+
+    write_raw(tmp_path / "clouds.data", ROWS)
+    model, report = incremental_update(tmp_path / "clouds.data", make_config(ROWS), state_dir)
+    assert report["new_rows"] == 40 and report["rows"] == 80
+    assert len(model.estimators_) == 7
+    version = state_dir / (state_dir / "CURRENT").read_text()
+    assert sorted(path.name for path in state_dir.glob("update-*")) == [version.name]
+    state = yaml.safe_load((version / "state.yaml").read_text())
+    assert state["watermark"] == {"first_cloud": ROWS, "second_cloud": ROWS}
+    assert state["stats"]["columns"] == ["c_std"] and state["stats"]["count"] == [80]
+
+def test_updates_keep_the_scaling_of_earlier_trees(tmp_path):
+    first, second = write_raw(tmp_path / "clouds.data", 20)
+    config = make_config(20)
+    before, _ = incremental_update(tmp_path / "clouds.data", config, tmp_path / "state")
+    _, _, plan = inc.load_state(tmp_path / "state", inc.state_key(config))
+    data, _ = read_new_rows(tmp_path / "clouds.data", config["create_dataset"], {})
+    x = gf.generate_features(data, config["generate_features"], plan)[config["train_model"]["initial_features"]]
+    expected = before.predict_proba(x)
+
+    write_raw(tmp_path / "clouds.data", ROWS)
+    after, report = incremental_update(tmp_path / "clouds.data", make_config(ROWS), tmp_path / "state")
+    _, _, plan = inc.load_state(tmp_path / "state", inc.state_key(config))
+    x = gf.generate_features(data, config["generate_features"], plan)[config["train_model"]["initial_features"]]
+    old_trees = np.mean([tree.predict_proba(x.to_numpy()) for tree in after.estimators_[:4]], axis=0)
+    np.testing.assert_allclose(old_trees, expected)
+    values = np.round(np.concatenate([first[:, 2], second[:, 2]]), 6)
+    frozen = plan.state[plan.targets["c_std"]]
+    assert report["drift"]["c_std"] == pytest.approx((values.mean() - frozen["mean"]) / frozen["scale"])
+
+def test_no_new_rows_keep_model(tmp_path):
+    write_raw(tmp_path / "clouds.data", 20)
+    incremental_update(tmp_path / "clouds.data", make_config(20), tmp_path / "state")
+    model, report = incremental_update(tmp_path / "clouds.data", make_config(20), tmp_path / "state")
+    assert not report["updated"] and report["new_rows"] == 0
+    assert len(model.estimators_) == 4
+
+def test_partial_fit_model(tmp_path):
+    from sklearn.linear_model import SGDClassifier
+    x = np.random.default_rng(2).normal(size=(20, 2))
+    y = (x[:, 0] > 0).astype(float)
+    model = update_model(SGDClassifier(random_state=0), x[:10], y[:10], {})
+    model = update_model(model, x[10:], y[10:], {})
+    assert model.classes_.tolist() == [0.0, 1.0]
+
+def test_config_change_resets_state(tmp_path):
+    write_raw(tmp_path / "clouds.data", 20)
+    incremental_update(tmp_path / "clouds.data", make_config(20), tmp_path / "state")
+    config = make_config(20)
+    config["train_model"]["initial_features"] = ["a", "b"]
+    _, report = incremental_update(tmp_path / "clouds.data", config, tmp_path / "state")
+    assert report["new_rows"] == 40 and report["updates"] == 1
+
+# Unhappy Path Tests
+def test_interrupted_update_keeps_previous_state(tmp_path, monkeypatch):
+    state_dir = tmp_path / "state"
+    write_raw(tmp_path / "clouds.data", 20)
+    incremental_update(tmp_path / "clouds.data", make_config(20), state_dir)
+    write_raw(tmp_path / "clouds.data", ROWS)
+    with monkeypatch.context() as patch:
+        # Fails after the model of the second update is written, before its plan and state
+        patch.setattr(inc.pickle, "dumps", lambda *args, **kwargs: (_ for _ in ()).throw(OSError("disk full")))
+        with pytest.raises(OSError):
+            incremental_update(tmp_path / "clouds.data", make_config(ROWS), state_dir)
+    assert (state_dir / "update-000002" / "model.pkl").exists()
+    state, model, _ = inc.load_state(state_dir, inc.state_key(make_config(ROWS)))
+    assert state["updates"] == 1 and len(model.estimators_) == 4
+
+    model, report = incremental_update(tmp_path / "clouds.data", make_config(ROWS), state_dir)
+    assert report["new_rows"] == 40 and report["updates"] == 2
+    assert len(model.estimators_) == 7
+    assert (state_dir / "CURRENT").read_text() == "update-000002"
+
+def test_shrunk_cloud(tmp_path):
+    write_raw(tmp_path / "clouds.data", 20)
+    with pytest.raises(NotImplementedError):
+        read_new_rows(tmp_path / "clouds.data", make_config(20)["create_dataset"], {"first_cloud": 30})
+
+def test_model_without_incremental_fit():
+    from sklearn.svm import SVC
+    with pytest.raises(NotImplementedError):
+        update_model(SVC(), np.zeros((4, 1)), np.array([0.0, 1.0, 0.0, 1.0]), {})
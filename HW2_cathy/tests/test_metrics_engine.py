@@ -0,0 +1,76 @@
+import warnings
+import numpy as np
+import pytest
+import sklearn.metrics
+from src.metrics_engine import MetricsAccumulator
+
+@pytest.fixture
+def predictions():
+    """Fixture to provide actual classes, scores with ties and predicted classes."""
+    rng = np.random.default_rng(42)
+    y_true = rng.integers(0, 2, 500).astype(float)
+    proba = np.round(np.clip(y_true * 0.3 + rng.random(500) * 0.7, 0, 1), 2)
+    return y_true, proba, (proba > 0.5).astype(float)
+
+def accumulate(y_true, proba, pred, chunksize):
+    engine = MetricsAccumulator()
+    for start in range(0, len(y_true), chunksize):
+        block = slice(start, start + chunksize)
+        engine.update(y_true[block], proba[block], pred[block])
+    return engine
+
+# Happy Path Tests
+@pytest.mark.parametrize("chunksize", [500, 64, 7])
+def test_matches_sklearn(predictions, chunksize):
+    y_true, proba, pred = predictions
+    engine = accumulate(y_true, proba, pred, chunksize)
+    assert engine.roc_auc() == sklearn.metrics.roc_auc_score(y_true, proba)
+    assert engine.average_precision() == sklearn.metrics.average_precision_score(y_true, proba)
+    assert engine.accuracy() == sklearn.metrics.accuracy_score(y_true, pred)
+    np.testing.assert_array_equal(engine.confusion_matrix(), sklearn.metrics.confusion_matrix(y_true, pred))
+    assert engine.classification_report() == sklearn.metrics.classification_report(y_true, pred)
+    assert engine.metric("f1_score") == sklearn.metrics.f1_score(y_true, pred)
+
+def test_curves_match_sklearn(predictions):
+    y_true, proba, pred = predictions
+    engine = accumulate(y_true, proba, pred, 100)
+    for ours, theirs in zip(engine.roc_curve(), sklearn.metrics.roc_curve(y_true, proba)):
+        np.testing.assert_array_equal(ours, theirs)
+    for ours, theirs in zip(engine.precision_recall_curve(), sklearn.metrics.precision_recall_curve(y_true, proba)):
+        np.testing.assert_array_equal(ours, theirs)
+
+def test_distinct_scores_match_sklearn():
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(0, 2, 5000).astype(float)
+    proba = np.clip(y_true * 0.2 + rng.random(5000) * 0.8, 0, 1)
+    engine = accumulate(y_true, proba, (proba > 0.5).astype(float), 100)
+    assert engine.roc_auc() == pytest.approx(sklearn.metrics.roc_auc_score(y_true, proba), abs=1e-12)
+    assert engine.average_precision() == pytest.approx(sklearn.metrics.average_precision_score(y_true, proba), abs=1e-12)
+
+def test_rounded_scores_bound_the_counts():
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(0, 2, 20000).astype(float)
+    proba = np.clip(y_true * 0.2 + rng.random(20000) * 0.8, 0, 1)
+    engine = MetricsAccumulator(score_decimals=2)
+    for block in np.array_split(np.arange(20000), 50):
+        engine.update(y_true[block], proba[block])
+    assert all(len(values) <= 101 for values, _ in engine._scores.values())
+    assert engine.roc_auc() == pytest.approx(sklearn.metrics.roc_auc_score(y_true, proba), abs=1e-3)
+
+def test_integer_classes_and_empty_class():
+    y_true, pred = np.array([0, 0, 1, 1]), np.array([0, 0, 0, 0])
+    engine = MetricsAccumulator().update(y_true, pred=pred)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert engine.classification_report(digits=3) == sklearn.metrics.classification_report(y_true, pred, digits=3)
+
+# Unhappy Path Tests
+def test_roc_auc_single_class():
+    engine = MetricsAccumulator().update(np.ones(4), np.linspace(0, 1, 4), np.ones(4))
+    with pytest.raises(NotImplementedError):
+        engine.roc_auc()
+
+def test_binary_average_of_multiclass():
+    engine = MetricsAccumulator().update(np.array([0, 1, 2]), pred=np.array([0, 1, 1]))
+    with pytest.raises(NotImplementedError):
+        engine.metric("precision_score")
@@ -0,0 +1,85 @@
+import http.client
+import json
+import socket
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from src.model_server import create_server
+from src.score_model import score_model
+
+FEATURES = ["a", "b"]
+CONFIG = {"initial_features": FEATURES, "server": {"port": 0, "max_wait_ms": 1}}
+
+
+class UnixConnection(http.client.HTTPConnection):
+    """HTTP connection to a Unix domain socket."""
+
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+@pytest.fixture
+def data():
+    """Fixture to provide a small dataset with a learnable class."""
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(200, 2)), columns=FEATURES)
+    data["class"] = (data["a"] + data["b"] > 0).astype(float)
+    return data
+
+@pytest.fixture
+def model(data):
+    """Fixture to provide a forest fitted on the dataset."""
+    return RandomForestClassifier(n_estimators=5, max_depth=4, random_state=0).fit(data[FEATURES], data["class"])
+
+@pytest.fixture
+def serve(model):
+    """Fixture to start the scoring server in a thread, on a free port or a Unix socket."""
+    servers = []
+
+    def start(socket_path=None):
+        server = create_server(model, CONFIG, socket_path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        if socket_path:
+            return UnixConnection(socket_path)
+        return http.client.HTTPConnection(*server.server_address[:2], timeout=5)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+        server.batcher.close()
+
+def post(connection, body):
+    connection.request("POST", "/score", json.dumps(body), {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+# Happy Path Tests
+def test_http_scores_match_score_model(data, model, serve):
+    rows = data.iloc[:10]
+    status, body = post(serve(), {"instances": rows[FEATURES].to_numpy().tolist()})
+    proba, classes = score_model(rows, model, CONFIG)
+    assert status == 200
+    np.testing.assert_array_equal(body["probability"], proba)
+    np.testing.assert_array_equal(body["class"], classes)
+
+def test_unix_socket_scores_records(data, model, serve, tmp_path):
+    rows = data.iloc[10:15]
+    status, body = post(serve(str(tmp_path / "clouds.sock")), {"instances": rows[FEATURES].to_dict("records")})
+    proba, classes = score_model(rows, model, CONFIG)
+    assert status == 200
+    np.testing.assert_array_equal(body["probability"], proba)
+    np.testing.assert_array_equal(body["class"], classes)
+
+# Unhappy Path Tests
+def test_invalid_request(serve):
+    status, body = post(serve(), {"rows": [[1.0, 2.0]]})
+    assert status == 400 and "invalid request" in body["error"]
@@ -0,0 +1,100 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+import pipeline
+
+ROOT = Path(__file__).parents[1]
+HEAVY_MODULES = ["matplotlib", "boto3", "botocore", "sklearn", "pandas", "requests"]
+# Seconds to import pipeline.py, which only imports the stage modules when their stage runs
+IMPORT_BUDGET = 0.5
+
+IMPORT_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import pipeline
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {HEAVY_MODULES!r} if name in sys.modules]}}))
+"""
+
+CONFIG = {
+    "run_config": {"data_dir": {"raw": "data/raw", "processed": "data/processed"}, "figure_dir": "figures",
+                   "output": {"runs": None}},
+    "train_model": {"data_dir": "data_for_model", "model_dir": "model_artifacts"},
+    "score_model": {"score_dir": "model_output"},
+    "evaluate_performance": {"metric_dir": "performance"},
+}
+
+@pytest.fixture
+def config(tmp_path):
+    return {**CONFIG, "run_config": {**CONFIG["run_config"], "output": {"runs": str(tmp_path)}}}
+
+# Happy Path Tests
+def test_import_is_within_budget():
+    # A fresh interpreter, so modules imported by other tests do not count
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, capture_output=True, text=True, check=True)
+    measured = json.loads(result.stdout)
+    assert measured["loaded"] == []
+    assert measured["seconds"] < IMPORT_BUDGET
+
+def test_help_lists_subcommands():
+    result = subprocess.run([sys.executable, "pipeline.py", "--help"], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0
+    for command in ["run", *pipeline.COMMANDS]:
+        assert command in result.stdout
+
+def test_open_run_uses_latest_run(config, tmp_path):
+    (tmp_path / "run_20240101_000000").mkdir()
+    (tmp_path / "run_20240102_000000").mkdir()
+    *_, artifacts_path = pipeline.open_run(config)
+    assert artifacts_path == tmp_path / "run_20240102_000000"
+    assert (artifacts_path / "model_artifacts").is_dir()
+
+def test_open_run_creates_new_run(config, tmp_path):
+    raw_data_dir, *_, artifacts_path = pipeline.open_run(config, new=True)
+    assert artifacts_path.parent == tmp_path
+    assert raw_data_dir == artifacts_path / "data/raw"
+
+def test_update_keeps_batch_artifacts(config, tmp_path):
+    from src.feature_transform import load_transform
+    from tests.test_incremental import make_config, write_raw
+
+    raw_data_dir, *_, model_dir, _, _, artifacts_path = pipeline.open_run(config, new=True)
+    write_raw(raw_data_dir / "clouds.data", 20)
+    (model_dir / "trained_model_object.pkl").write_bytes(b"batch model")
+    update_config = make_config(20)
+    update_config["train_model"] = {**config["train_model"], **update_config["train_model"]}
+    update_config["train_model"]["incremental"]["state_dir"] = str(tmp_path / "state")
+    report = pipeline.run_update({**config, **update_config}, artifacts_path)
+    assert report["updated"]
+    assert (model_dir / "trained_model_object.pkl").read_bytes() == b"batch model"
+    assert (model_dir / "incremental_model.pkl").exists()
+    assert load_transform(model_dir / "incremental_transform.pkl").features == ["a", "a_plus_b", "c_std"]
+
+class Pickles:
+    """Stage output counting how often it is pickled."""
+    count = 0
+
+    def __reduce__(self):
+        Pickles.count += 1
+        return Pickles, ()
+
+def test_stage_output_is_pickled_once(tmp_path):
+    from src.profiling import StageProfiler
+    from src.stage_cache import StageCache
+
+    runner = pipeline.StageRunner(StageCache(cache_dir=tmp_path / "cache"), StageProfiler(), tmp_path)
+    computed = runner.compute("stage", {}, [], Pickles)
+    runner.save("stage", computed, lambda payload: [])
+    assert Pickles.count == 1
+    assert runner.cache.load(computed[2], tmp_path)[1] == computed[1]
+
+# Unhappy Path Tests
+def test_open_run_without_runs(config):
+    with pytest.raises(SystemExit):
+        pipeline.open_run(config)
+
+def test_unknown_subcommand():
+    result = subprocess.run([sys.executable, "pipeline.py", "deploy"], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode != 0
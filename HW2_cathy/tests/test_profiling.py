@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from src.profiling import StageProfiler, describe
+
+# Happy Path Tests
+def test_stage_record(tmp_path):
+    profiler = StageProfiler(profile_dir=tmp_path / "profiles", trace_memory=True)
+    data = pd.DataFrame({"a": np.arange(1000.0)})
+    with profiler.stage("double", data) as record:
+        record["outputs"] = data * 2
+    profiler.close()
+    stats = profiler.records["double"]
+    assert stats["rows_in"] == stats["rows_out"] == 1000
+    assert stats["bytes_out"] >= 8000
+    assert stats["tracemalloc_peak_mb"] > 0
+    assert stats["wall_seconds"] >= 0
+    assert (tmp_path / "profiles" / "double.prof").exists()
+
+def test_save_yaml_and_json(tmp_path):
+    profiler = StageProfiler(trace_memory=False)
+    with profiler.stage("noop"):
+        pass
+    profiler.save(tmp_path / "timings.yaml")
+    profiler.save(tmp_path / "timings.json")
+    assert list(yaml.safe_load((tmp_path / "timings.yaml").read_text())["stages"]) == ["noop"]
+    assert list(json.loads((tmp_path / "timings.json").read_text())["stages"]) == ["noop"]
+
+def test_overlapping_stages_are_process_level(tmp_path):
+    profiler = StageProfiler(trace_memory=False)
+    barrier = threading.Barrier(2)
+
+    def run(name):
+        with profiler.stage(name):
+            barrier.wait()
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with profiler.stage("c"):
+        pass
+    assert profiler.records["a"]["overlapped_with"] == ["b"] and profiler.records["a"]["process_level"]
+    assert not profiler.records["c"]["process_level"] and profiler.records["c"]["overlapped_with"] == []
+    profiler.save(tmp_path / "timings.yaml")
+    report = yaml.safe_load((tmp_path / "timings.yaml").read_text())
+    # The elapsed time, not the sum of the overlapping wall times
+    assert report["total_wall_seconds"] < report["stage_wall_seconds"]
+
+def test_describe_nested(tmp_path):
+    (tmp_path / "file.bin").write_bytes(b"x" * 10)
+    assert describe((np.zeros((3, 2)), [tmp_path / "file.bin"], "text")) == {"rows": 3, "bytes": 58}
+
+def test_memory_is_only_traced_on_request(monkeypatch):
+    resets = []
+    monkeypatch.setattr("src.profiling._reset_peak_rss", lambda: resets.append(True) or True)
+    profiler = StageProfiler()
+    with profiler.stage("noop"):
+        assert not tracemalloc.is_tracing()
+    assert resets == [] and "tracemalloc_peak_mb" not in profiler.records["noop"]
+    assert not profiler.records["noop"]["peak_rss_is_stage_peak"]
+
+# Unhappy Path Tests
+def test_failing_stage_is_recorded():
+    profiler = StageProfiler(trace_memory=False)
+    with pytest.raises(ValueError):
+        with profiler.stage("fails"):
+            raise ValueError("stage failed")
+    assert "fails" in profiler.records
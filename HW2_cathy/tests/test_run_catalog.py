@@ -0,0 +1,74 @@
+import datetime
+import pytest
+import yaml
+from src.run_catalog import RunCatalog
+
+def write_run(runs_dir, name, roc_auc, wall_seconds=1.0):
+    """Write a finished run directory with its metrics and timings."""
+    run_dir = runs_dir / name
+    (run_dir / "performance").mkdir(parents=True)
+    metrics = {"roc_auc_score": roc_auc, "confusion_matrix": [[4, 1], [0, 5]]}
+    (run_dir / "performance" / "metrics.yaml").write_text(yaml.safe_dump(metrics))
+    timings = {"stages": {"train": {"wall_seconds": wall_seconds, "cpu_seconds": 0.5, "cached": False}}}
+    (run_dir / "performance" / "timings.yaml").write_text(yaml.safe_dump(timings))
+    (run_dir / "model.pkl").write_bytes(b"model")
+    return run_dir
+
+def make_config(model_type="RandomForestClassifier", max_depth=10):
+    return {"train_model": {"model_config": {"type": model_type, "hyperparam": {"max_depth": max_depth}}}}
+
+def days_ago(days):
+    return (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat(timespec="seconds")
+
+@pytest.fixture
+def catalog(tmp_path):
+    """Fixture to provide an empty catalog."""
+    with RunCatalog(tmp_path / "catalog.sqlite") as catalog:
+        yield catalog
+
+# Happy Path Tests
+def test_best_run_by_model_and_age(catalog, tmp_path):
+    catalog.record_run(write_run(tmp_path, "run_1", 0.99), make_config(), days_ago(40))
+    catalog.record_run(write_run(tmp_path, "run_2", 0.95), make_config(), days_ago(2))
+    catalog.record_run(write_run(tmp_path, "run_3", 0.97), make_config("LogisticRegression"), days_ago(1))
+    assert catalog.best("roc_auc_score")["run_id"] == "run_1"
+    assert catalog.best("roc_auc_score", "RandomForestClassifier", days=30)["run_id"] == "run_2"
+    assert catalog.best("roc_auc_score", lowest=True)["value"] == 0.95
+    assert catalog.best("accuracy_score") is None
+
+def test_list_runs_latest_first(catalog, tmp_path):
+    catalog.record_run(write_run(tmp_path, "run_1", 0.9), make_config(), days_ago(2))
+    catalog.record_run(write_run(tmp_path, "run_2", 0.8), make_config(), days_ago(1))
+    runs = catalog.list_runs(limit=1)
+    assert runs == [{"run_id": "run_2", "finished_at": runs[0]["finished_at"], "model_type": "RandomForestClassifier",
+                     "config_hash": runs[0]["config_hash"], "roc_auc_score": 0.8}]
+
+def test_diff_runs(catalog, tmp_path):
+    catalog.record_run(write_run(tmp_path, "run_1", 0.9, wall_seconds=2.0), make_config(max_depth=5))
+    catalog.record_run(write_run(tmp_path, "run_2", 0.9), make_config(max_depth=10))
+    diff = catalog.diff("run_1", "run_2")
+    assert diff["config"] == {"train_model.model_config.hyperparam.max_depth": (5, 10)}
+    assert diff["metrics"] == {}
+    assert diff["wall_seconds"] == {"train": (2.0, 1.0)}
+
+def test_index_and_prune(catalog, tmp_path):
+    for i in range(3):
+        write_run(tmp_path / "runs", f"run_2024010{i + 1}_000000", 0.9)
+    assert len(catalog.index(tmp_path / "runs")) == 3
+    assert catalog.index(tmp_path / "runs") == []
+    catalog.record_run(tmp_path / "runs" / "run_20240101_000000", finished_at=days_ago(10))
+    assert catalog.prune(keep=2, delete_files=True) == ["run_20240101_000000"]
+    assert not (tmp_path / "runs" / "run_20240101_000000").exists()
+    assert catalog.connection.execute("SELECT COUNT(*) FROM metrics").fetchone()[0] == 4
+
+def test_rerecording_replaces_run(catalog, tmp_path):
+    run_dir = write_run(tmp_path, "run_1", 0.9)
+    catalog.record_run(run_dir, make_config())
+    catalog.record_run(run_dir, make_config())
+    assert catalog.connection.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0] == 3
+
+# Unhappy Path Tests
+def test_diff_unknown_run(catalog, tmp_path):
+    catalog.record_run(write_run(tmp_path, "run_1", 0.9), make_config())
+    with pytest.raises(KeyError):
+        catalog.diff("run_1", "run_2")
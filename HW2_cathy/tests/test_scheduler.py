@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from src.scheduler import Scheduler, process_context
+
+def sleeper(seconds, value=None, log=None):
+    """Build a task that sleeps and returns a value."""
+    def task(*args):
+        if log is not None:
+            log.append(("start", value))
+        time.sleep(seconds)
+        if log is not None:
+            log.append(("end", value))
+        return value
+    return task
+
+# Happy Path Tests
+def test_results_follow_dependencies():
+    scheduler = Scheduler(max_workers=4)
+    scheduler.add("a", lambda: 2)
+    scheduler.add("b", lambda a: a * 3, ["a"])
+    scheduler.add("c", lambda a, b: a + b, ["a", "b"])
+    assert scheduler.run() == {"a": 2, "b": 6, "c": 8}
+
+def test_io_tasks_overlap_cpu_tasks():
+    log = []
+    scheduler = Scheduler(max_workers=4, cpu_slots=1)
+    scheduler.add("compute", sleeper(0.05, "compute", log))
+    scheduler.add("save", sleeper(0.3, "save", log), ["compute"], kind="io")
+    scheduler.add("next", sleeper(0.05, "next", log), ["compute"])
+    scheduler.run()
+    # The next compute step does not wait for the save
+    assert log.index(("end", "next")) < log.index(("end", "save"))
+
+def test_cpu_slots_limit_concurrency():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def task(*_):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    scheduler = Scheduler(max_workers=4, cpu_slots=1)
+    for name in "abcd":
+        scheduler.add(name, task)
+    scheduler.run()
+    assert peak[0] == 1
+
+def test_sequential_order():
+    log = []
+    scheduler = Scheduler(max_workers=1)
+    scheduler.add("a", sleeper(0, "a", log))
+    scheduler.add("b", sleeper(0, "b", log), kind="io")
+    scheduler.add("c", sleeper(0, "c", log), ["a"])
+    scheduler.run()
+    assert [value for event, value in log if event == "start"] == ["a", "b", "c"]
+
+def test_critical_path():
+    scheduler = Scheduler(max_workers=4)
+    scheduler.add("a", sleeper(0.01))
+    scheduler.add("slow", sleeper(0.2), ["a"], kind="io")
+    scheduler.add("fast", sleeper(0.01), ["a"])
+    scheduler.add("end", sleeper(0.01), ["fast"])
+    scheduler.run()
+    path, seconds = scheduler.critical_path()
+    assert path == ["a", "slow"]
+    assert seconds >= 0.2
+    report = scheduler.report()
+    assert report["critical_path"] == path and set(report["tasks"]) == {"a", "slow", "fast", "end"}
+
+def test_worker_processes_are_not_forked_from_tasks():
+    assert process_context().get_start_method() != "fork"
+
+    def pool_task():
+        with ProcessPoolExecutor(max_workers=2, mp_context=process_context()) as pool:
+            return list(pool.map(abs, [-1, -2, -3]))
+
+    scheduler = Scheduler(max_workers=2)
+    scheduler.add("pool", pool_task)
+    scheduler.add("other", sleeper(0.2, "done"), kind="io")
+    assert scheduler.run()["pool"] == [1, 2, 3]
+
+# Unhappy Path Tests
+def test_failure_stops_downstream_tasks():
+    ran = []
+    scheduler = Scheduler(max_workers=2)
+    scheduler.add("a", lambda: 1 / 0)
+    scheduler.add("b", lambda a: ran.append("b"), ["a"])
+    with pytest.raises(ZeroDivisionError):
+        scheduler.run()
+    assert ran == []
+
+def test_unknown_dependency():
+    scheduler = Scheduler()
+    with pytest.raises(NotImplementedError):
+        scheduler.add("b", lambda a: a, ["a"])
+
+def test_unsupported_kind():
+    scheduler = Scheduler()
+    with pytest.raises(NotImplementedError):
+        scheduler.add("a", lambda: 1, kind="gpu")
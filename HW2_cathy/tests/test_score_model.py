@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from src.model_server import MicroBatcher
+from src.score_model import load_model, score_file, score_model
+from src.train_model import save_model
+
+FEATURES = ["a", "b"]
+
+@pytest.fixture
+def data():
+    """Fixture to provide a small dataset with a learnable class."""
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(200, 2)), columns=FEATURES)
+    data["class"] = (data["a"] + data["b"] > 0).astype(float)
+    return data
+
+@pytest.fixture
+def model(data):
+    """Fixture to provide a forest fitted on the dataset."""
+    return RandomForestClassifier(n_estimators=5, max_depth=4, random_state=0).fit(data[FEATURES], data["class"])
+
+# Happy Path Tests
+def test_score_model(data, model):
+    proba, classes = score_model(data, model, {"initial_features": FEATURES})
+    np.testing.assert_array_equal(proba, model.predict_proba(data[FEATURES])[:, 1])
+    np.testing.assert_array_equal(classes, model.predict(data[FEATURES]))
+
+def test_score_file(data, model, tmp_path):
+    data.to_csv(tmp_path / "input.csv", index=False)
+    rows = score_file(model, tmp_path / "input.csv", tmp_path / "scores.csv", {"initial_features": FEATURES, "chunksize": 64})
+    scores = pd.read_csv(tmp_path / "scores.csv")
+    assert rows == len(data) == len(scores)
+    np.testing.assert_allclose(scores["Probability"], model.predict_proba(data[FEATURES])[:, 1])
+
+def test_micro_batcher(data, model):
+    batcher = MicroBatcher(model, FEATURES, max_batch_size=64, max_wait_ms=5)
+    futures = [batcher.submit(row) for row in data[FEATURES].to_numpy()[:20]]
+    proba = np.concatenate([future.result(timeout=5)[0] for future in futures])
+    batcher.close()
+    np.testing.assert_array_equal(proba, model.predict_proba(data[FEATURES].iloc[:20])[:, 1])
+
+@pytest.mark.parametrize("serialization", [None, {"format": "joblib"}, {"format": "joblib", "compress": 3}])
+def test_model_round_trip(data, model, serialization, tmp_path):
+    report = save_model(model, tmp_path / "model.pkl", serialization)
+    assert report["bytes"] == (tmp_path / "model.pkl").stat().st_size
+    loaded = load_model(tmp_path / "model.pkl")
+    np.testing.assert_array_equal(loaded.predict_proba(data[FEATURES]), model.predict_proba(data[FEATURES]))
+
+def test_compressed_model_is_smaller(model, tmp_path):
+    plain = save_model(model, tmp_path / "plain.pkl", {"format": "joblib"})
+    compressed = save_model(model, tmp_path / "compressed.pkl", {"format": "joblib", "compress": 3})
+    assert compressed["bytes"] < plain["bytes"]
+
+# Unhappy Path Tests
+def test_unsupported_model_format(model, tmp_path):
+    with pytest.raises(NotImplementedError):
+        save_model(model, tmp_path / "model.onnx", {"format": "onnx"})
+
+def test_load_missing_model(tmp_path):
+    with pytest.raises(NotImplementedError):
+        load_model(tmp_path / "model.pkl")
+
+def test_unsupported_input(model, tmp_path):
+    with pytest.raises(NotImplementedError):
+        score_file(model, tmp_path / "input.json", tmp_path / "scores.csv", {"initial_features": FEATURES})
+
+def test_missing_feature(data, model):
+    with pytest.raises(KeyError):
+        score_model(data.drop(columns="b"), model, {"initial_features": FEATURES})
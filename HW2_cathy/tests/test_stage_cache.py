@@ -0,0 +1,87 @@
+import pytest
+from src.remote_cache import RemoteStageCache
+from src.stage_cache import StageCache
+from tests.fake_s3 import FakeS3Client
+
+@pytest.fixture
+def cache(tmp_path):
+    """Fixture to provide an empty stage cache."""
+    return StageCache(cache_dir=tmp_path / "cache", max_size_mb=1)
+
+@pytest.fixture
+def run_dir(tmp_path):
+    """Fixture to provide a run directory holding one stage output file."""
+    path = tmp_path / "run"
+    (path / "data").mkdir(parents=True)
+    (path / "data" / "out.csv").write_text("a,b\n1,2\n")
+    return path
+
+# Happy Path Tests
+def test_store_and_load(cache, run_dir, tmp_path):
+    key = cache.stage_key("stage", {"option": 1}, ["upstream"])
+    digest = cache.store(key, {"rows": 1}, [run_dir / "data" / "out.csv"], run_dir)
+    restored = tmp_path / "restored"
+    assert cache.load(key, restored) == ({"rows": 1}, digest)
+    assert (restored / "data" / "out.csv").read_text() == "a,b\n1,2\n"
+
+def test_key_depends_on_config_and_upstream(cache):
+    key = cache.stage_key("stage", {"option": 1}, ["upstream"])
+    assert key == cache.stage_key("stage", {"option": 1}, ["upstream"])
+    assert key != cache.stage_key("stage", {"option": 2}, ["upstream"])
+    assert key != cache.stage_key("stage", {"option": 1}, ["other"])
+
+def test_eviction_keeps_recent_entries(cache, run_dir):
+    cache.max_bytes = 1500
+    for i in range(3):
+        cache.store(str(i) * 64, b"x" * 600, [], run_dir)
+    assert cache.load("0" * 64, run_dir) is None
+    assert cache.load("2" * 64, run_dir) is not None
+
+def test_digest_known_before_files_are_saved(cache, run_dir):
+    key = cache.stage_key("stage", {}, [])
+    digest = cache.digest(key, {"rows": 1})
+    assert cache.store(key, {"rows": 1}, [run_dir / "data" / "out.csv"], run_dir) == digest
+    assert digest == cache.digest(cache.stage_key("other", {}, []), {"rows": 1})
+
+def test_remote_tier_restores_on_fresh_machine(run_dir, tmp_path):
+    client = FakeS3Client(tmp_path / "s3")
+    remote = RemoteStageCache(client, "bucket", "runs/stage-cache", part_size_mb=16 / 1024 / 1024, max_workers=4)
+    first = StageCache(cache_dir=tmp_path / "first", remote=remote)
+    key = first.stage_key("stage", {}, [])
+    digest = first.store(key, {"rows": 1}, [run_dir / "data" / "out.csv"], run_dir)
+    assert ("upload_file", f"runs/stage-cache/{key}.tar") in client.calls
+
+    client.calls.clear()
+    fresh = StageCache(cache_dir=tmp_path / "fresh", remote=remote)
+    assert fresh.load(key, tmp_path / "restored") == ({"rows": 1}, digest)
+    assert (tmp_path / "restored" / "data" / "out.csv").read_text() == "a,b\n1,2\n"
+    ranges = [call[2] for call in client.calls if call[0] == "get_object"]
+    assert len(ranges) > 1 and ranges[0] == "bytes=0-15"
+    # The entry is now in the local tier
+    client.calls.clear()
+    assert fresh.load(key, tmp_path / "again") is not None
+    assert client.calls == []
+
+# Unhappy Path Tests
+def test_remote_miss(tmp_path, run_dir):
+    remote = RemoteStageCache(FakeS3Client(tmp_path / "s3"), "bucket")
+    cache = StageCache(cache_dir=tmp_path / "cache", remote=remote)
+    assert cache.load(cache.stage_key("stage", {}, []), run_dir) is None
+
+def test_unreachable_remote_is_a_miss(tmp_path, run_dir):
+    remote = RemoteStageCache(FakeS3Client(tmp_path / "s3", buckets=()), "missing")
+    cache = StageCache(cache_dir=tmp_path / "cache", remote=remote)
+    key = cache.stage_key("stage", {}, [])
+    # The local entry is stored even though the push fails
+    digest = cache.store(key, 1, [], run_dir)
+    assert cache.load(key, run_dir) == (1, digest)
+    assert StageCache(cache_dir=tmp_path / "other", remote=remote).load(key, run_dir) is None
+
+def test_miss(cache, run_dir):
+    assert cache.load(cache.stage_key("stage", {}, []), run_dir) is None
+
+def test_disabled_cache(tmp_path, run_dir):
+    cache = StageCache(cache_dir=tmp_path / "cache", enabled=False)
+    key = cache.stage_key("stage", {}, [])
+    assert cache.store(key, 1, [], run_dir) == key
+    assert cache.load(key, run_dir) is None
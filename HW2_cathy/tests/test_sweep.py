@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+import src.generate_features as gf
+from src.sweep import build_variants, comparison_table, deep_merge, shared_features
+
+@pytest.fixture
+def data():
+    """Fixture to provide a clean dataset."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "IR_max": rng.uniform(10, 20, 50),
+        "IR_min": rng.uniform(0, 10, 50),
+        "IR_mean": rng.uniform(5, 15, 50),
+        "class": rng.integers(0, 2, 50).astype(float),
+    })
+
+def feature_config(feature_eng):
+    return {"feature_col": ["IR_max", "IR_min", "IR_mean"], "target_col": "class", "feature_eng": feature_eng}
+
+RANGE = {"operation": "subtract", "source1": "IR_max", "source2": "IR_min", "target": "IR_range"}
+
+# Happy Path Tests
+def test_deep_merge():
+    base = {"train_model": {"model_config": {"hyperparam": {"n_estimators": 10, "max_depth": 10}}, "features": ["a", "b"]}}
+    merged = deep_merge(base, {"train_model": {"model_config": {"hyperparam": {"max_depth": 4}}, "features": ["c"]}})
+    assert merged["train_model"]["model_config"]["hyperparam"] == {"n_estimators": 10, "max_depth": 4}
+    assert merged["train_model"]["features"] == ["c"]
+    assert base["train_model"]["model_config"]["hyperparam"]["max_depth"] == 10
+
+def test_build_variants():
+    variants = build_variants({"a": {"b": 1}}, [{"name": "base"}, {"name": "other", "overrides": {"a": {"b": 2}}}])
+    assert variants == {"base": {"a": {"b": 1}}, "other": {"a": {"b": 2}}}
+
+def test_shared_features_match_generate_features(data):
+    configs = {
+        "range": feature_config([RANGE]),
+        "normalized": feature_config([
+            {**RANGE, "target": "spread"},
+            {"operation": "divide", "source1": "spread", "source2": "IR_mean", "target": "IR_range"},
+        ]),
+    }
+    features = shared_features(data, configs)
+    for key, config in configs.items():
+        pd.testing.assert_frame_equal(features[key], gf.generate_features(data, config))
+
+def test_comparison_table_keeps_scalar_metrics():
+    table = comparison_table({
+        "a": {"accuracy_score": 0.9, "confusion_matrix": [[1, 0], [0, 1]]},
+        "b": {"accuracy_score": 0.8, "confusion_matrix": [[1, 0], [1, 0]]},
+    })
+    assert list(table.columns) == ["accuracy_score"]
+    assert table.loc["b", "accuracy_score"] == 0.8
+
+# Unhappy Path Tests
+def test_duplicate_variant_names():
+    with pytest.raises(NotImplementedError):
+        build_variants({}, [{"name": "a"}, {"name": "a"}])
+
+def test_invalid_operation(data):
+    with pytest.raises(NotImplementedError):
+        shared_features(data, {"bad": feature_config([{"operation": "power", "source1": "IR_max", "target": "x"}])})
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import accuracy_score, roc_auc_score
+from benchmarks.synthetic import COLUMNS, generate_clouds
+from src.create_dataset import create_dataset
+from src.generate_features import generate_features
+from src.score_model import predict
+from src.train_model import fit_rows, split_data, train_model
+
+FEATURE_ENG = [
+    {"operation": "apply", "source1": "visible_entropy", "target": "log_entropy", "function": "log"},
+    {"operation": "multiply", "source1": "visible_contrast", "source2": "visible_entropy", "target": "entropy_x_contrast"},
+    {
+        "operation": "divide", "target": "IR_norm_range", "source2": "IR_mean",
+        "source1": {"operation": "subtract", "source1": "IR_max", "source2": "IR_min"},
+    },
+]
+FEATURES = ["log_entropy", "IR_norm_range", "entropy_x_contrast"]
+
+@pytest.fixture
+def train_config():
+    """Fixture to provide the training configuration of the pipeline."""
+    return {
+        "initial_features": FEATURES,
+        "target": "class",
+        "train_test_split": {"test_size": 0.4, "random_state": 423},
+        "model_config": {
+            "type": "RandomForestClassifier",
+            "model_lib": "sklearn.ensemble",
+            "hyperparam": {"n_estimators": 10, "max_depth": 10, "random_state": 0},
+        },
+    }
+
+@pytest.fixture
+def raw_clouds(tmp_path):
+    """Fixture to provide a synthetic clouds file and its data_prep config."""
+    return tmp_path / "clouds.data", generate_clouds(tmp_path / "clouds.data", 4000, seed=2)
+
+def features(raw_clouds, low_memory):
+    path, data_prep = raw_clouds
+    data = create_dataset(path, {
+        "data": {"columns": COLUMNS, "import": {"chunksize": 1000}}, "data_prep": data_prep, "low_memory": low_memory,
+    })
+    return generate_features(data, {"feature_col": COLUMNS, "target_col": "class", "feature_eng": FEATURE_ENG})
+
+# Happy Path Tests
+def test_low_memory_split_selects_the_same_rows(train_config):
+    data = pd.DataFrame(np.arange(40, dtype=float).reshape(10, 4), columns=FEATURES + ["class"])
+    data["class"] = data["class"] % 2
+    _, default_train, default_test = train_model(data, train_config)
+    _, train, test = train_model(data, {**train_config, "low_memory": True})
+    pd.testing.assert_frame_equal(train, default_train)
+    pd.testing.assert_frame_equal(test, default_test)
+    x_train, x_test, _, _ = split_data(data, train_config)
+    assert train.index.equals(x_train.index) and test.index.equals(x_test.index)
+
+def test_low_memory_metrics_within_tolerance(raw_clouds, train_config):
+    scores = {}
+    for low_memory in (False, True):
+        model, _, test = train_model(features(raw_clouds, low_memory), {**train_config, "low_memory": low_memory})
+        proba, classes = predict(model, test[FEATURES])
+        scores[low_memory] = roc_auc_score(test["class"], proba), accuracy_score(test["class"], classes)
+        assert test[FEATURES].dtypes.eq(np.float32 if low_memory else np.float64).all()
+    np.testing.assert_allclose(scores[True], scores[False], atol=0.01)
+
+def test_fit_rows_are_the_train_rows(train_config):
+    data = pd.DataFrame(np.arange(40, dtype=float).reshape(10, 4), columns=FEATURES + ["class"])
+    x_train, _, _, _ = split_data(data, train_config)
+    assert fit_rows(len(data), train_config).tolist() == x_train.index.tolist()
+
+# Unhappy Path Tests
+def test_fit_rows_without_random_state(train_config):
+    with pytest.raises(NotImplementedError):
+        fit_rows(10, {**train_config, "train_test_split": {"test_size": 0.4}})
+
+def test_low_memory_missing_feature(train_config):
+    data = pd.DataFrame(np.zeros((10, 2)), columns=["log_entropy", "class"])
+    with pytest.raises(KeyError):
+        train_model(data, {**train_config, "low_memory": True})
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.tune_model import search_hyperparameters
+
+@pytest.fixture
+def data():
+    """Fixture to provide a small dataset with a learnable class."""
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(300, 2)), columns=["a", "b"])
+    data["class"] = (data["a"] - data["b"] > 0).astype(float)
+    return data
+
+@pytest.fixture
+def config():
+    """Fixture to provide a training configuration with a small search."""
+    return {
+        "initial_features": ["a", "b"],
+        "target": "class",
+        "train_test_split": {"test_size": 0.3, "random_state": 0},
+        "model_config": {
+            "type": "RandomForestClassifier",
+            "model_lib": "sklearn.ensemble",
+            "hyperparam": {"n_estimators": 5, "random_state": 0},
+        },
+        "search": {
+            "enabled": True,
+            "param_grid": {"max_depth": [1, 2, 4, 8]},
+            "cv": 3,
+            "n_jobs": 2,
+            "random_state": 0,
+        },
+    }
+
+# Happy Path Tests
+def test_grid_search(data, config):
+    best, leaderboard = search_hyperparameters(data, config)
+    assert len(leaderboard) == 4
+    assert best["n_estimators"] == 5
+    assert leaderboard["mean_score"].iloc[0] == leaderboard["mean_score"].max()
+    assert {"mean_fit_time", "mean_score_time", "params", "rank"} <= set(leaderboard.columns)
+
+def test_halving_search(data, config):
+    config["search"].update({"method": "halving", "factor": 2})
+    _, leaderboard = search_hyperparameters(data, config)
+    assert leaderboard.groupby("round").size().tolist() == [4, 2, 1]
+    assert leaderboard.groupby("round")["n_rows"].first().is_monotonic_increasing
+
+# Unhappy Path Tests
+def test_invalid_hyperparameter(data, config):
+    config["search"]["param_grid"] = {"not_a_parameter": [1]}
+    with pytest.raises(TypeError):
+        search_hyperparameters(data, config)